@@ -0,0 +1,146 @@
+"""
+Persistent map from requested titles to canonical Wikipedia titles.
+
+`WikipediaExtractor.get_page_info` asks for the exact title first and falls
+back to an auto-suggested lookup when there is no such page. A redirect
+("WW2") or a loose spelling ("World war 2") therefore reaches its article
+("World War II") only after one or two full fetches, and an ambiguous title
+costs a fetch just to learn its options. Each outcome is stored here, in an
+`aliases` table of the article archive's database, and looked up before
+fetching anything:
+
+- a redirect or suggestion maps the requested title to the canonical one, so
+  the archived article and the comics already generated for it are found;
+- a disambiguation page keeps its options, which are returned without a fetch.
+
+Entries older than COMIC_ALIAS_MAX_AGE seconds are ignored (0 disables the
+map), in case Wikipedia retargets a redirect.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .archive import ARCHIVE_FILENAME
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_title(title: str) -> str:
+    """Title as Wikipedia treats it: underscores as spaces, single spaces, first letter upper-case"""
+    title = re.sub(r'[\s_]+', ' ', title).strip()
+    return title[:1].upper() + title[1:]
+
+
+class TitleAliases:
+    def __init__(self, path: str, max_age: float = 30 * 86400):
+        """
+        Open (and create if needed) the alias table
+
+        Args:
+            path: SQLite database file, shared with the article archive
+            max_age: Seconds an entry is trusted; 0 ignores every entry
+        """
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS aliases ('
+                ' alias TEXT PRIMARY KEY,'
+                ' canonical TEXT,'
+                ' options TEXT,'
+                ' stored_at REAL NOT NULL'
+                ')'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def resolve(self, title: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up what a requested title resolved to before
+
+        Args:
+            title: Title as requested
+
+        Returns:
+            {'title': canonical title} for a redirect or suggestion, {'options': [...]} for a
+            disambiguation page, or None if the title is unknown or its entry expired
+        """
+        if self.max_age <= 0:
+            return None
+        try:
+            row = self._connection().execute(
+                'SELECT canonical, options, stored_at FROM aliases WHERE alias = ?', (normalize_title(title),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Alias lookup failed for {title}: {str(e)}")
+            return None
+        if row is None or time.time() - row[2] > self.max_age:
+            return None
+        canonical, options, _ = row
+        if options is not None:
+            return {'options': json.loads(options)}
+        return {'title': canonical}
+
+    def canonical(self, title: str) -> str:
+        """The canonical title a requested title redirects to, or the title itself"""
+        alias = self.resolve(title)
+        return alias['title'] if alias and 'title' in alias else title
+
+    def add(self, title: str, canonical: str) -> None:
+        """Record that a requested title led to the article `canonical`"""
+        alias = normalize_title(title)
+        if alias == normalize_title(canonical):
+            return
+        self._store(alias, canonical, None)
+        logger.info(f"Title alias recorded: {title} -> {canonical}")
+
+    def add_disambiguation(self, title: str, options: List[str]) -> None:
+        """Record that a requested title is a disambiguation page with these options"""
+        self._store(normalize_title(title), None, json.dumps(options, ensure_ascii=False))
+
+    def forget(self, title: str) -> None:
+        """Drop the entry of a requested title, e.g. when its canonical article no longer exists"""
+        try:
+            with self._connection() as conn:
+                conn.execute('DELETE FROM aliases WHERE alias = ?', (normalize_title(title),))
+        except sqlite3.Error as e:
+            logger.error(f"Alias removal failed for {title}: {str(e)}")
+
+    def _store(self, alias: str, canonical: Optional[str], options: Optional[str]) -> None:
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO aliases (alias, canonical, options, stored_at) VALUES (?, ?, ?, ?)',
+                    (alias, canonical, options, time.time())
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Alias write failed for {alias}: {str(e)}")
+
+
+_aliases: Dict[str, TitleAliases] = {}
+_aliases_lock = threading.Lock()
+
+
+def get_aliases(data_dir: str = 'data') -> TitleAliases:
+    """Process-wide alias map stored with the article archive in `data_dir`, trusted for COMIC_ALIAS_MAX_AGE seconds"""
+    path = os.path.abspath(os.path.join(data_dir, ARCHIVE_FILENAME))
+    with _aliases_lock:
+        if path not in _aliases:
+            from django.conf import settings
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _aliases[path] = TitleAliases(path, getattr(settings, 'COMIC_ALIAS_MAX_AGE', 30 * 86400))
+        return _aliases[path]
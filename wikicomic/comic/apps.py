@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ComicConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'comic'
+
+    def ready(self):
+        # Periodic garbage collection (COMIC_GC_INTERVAL) runs in every process that loads the app
+        from . import storage_gc
+
+        storage_gc.ensure_sweeper()
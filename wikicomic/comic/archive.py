@@ -0,0 +1,218 @@
+"""
+Indexed archive of extracted Wikipedia articles.
+
+Articles live in a single SQLite database keyed by their canonical Wikipedia
+title, replacing the one-pretty-printed-JSON-file-per-title layout whose
+`sanitize_filename` mapping was lossy ("A/B" and "A?B" both became
+"A_B_data.json"). Each text field is zlib-compressed on its own, so a lookup
+that only needs the summary never inflates the full article body.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILENAME = 'articles.sqlite3'
+
+# Blob prefixes: fields too small to gain from compression are stored raw
+_RAW = b'r'
+_ZLIB = b'z'
+_MIN_COMPRESS_BYTES = 256
+
+
+def _pack(value: Optional[str]) -> Optional[bytes]:
+    if value is None:
+        return None
+    raw = value.encode('utf-8')
+    if len(raw) < _MIN_COMPRESS_BYTES:
+        return _RAW + raw
+    return _ZLIB + zlib.compress(raw, 6)
+
+
+def _unpack(blob: Optional[bytes]) -> Optional[str]:
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    if blob[:1] == _ZLIB:
+        return zlib.decompress(blob[1:]).decode('utf-8')
+    return blob[1:].decode('utf-8')
+
+
+class ArticleArchive:
+    FIELDS = ('title', 'url', 'revision_id', 'timestamp', 'summary', 'content', 'categories')
+
+    def __init__(self, path: str):
+        """
+        Open (and create if needed) an article archive
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS articles ('
+                ' title TEXT PRIMARY KEY,'
+                ' url TEXT,'
+                ' revision_id INTEGER,'
+                ' fetched_at TEXT,'
+                ' stored_at REAL NOT NULL,'
+                ' summary BLOB,'
+                ' content BLOB,'
+                ' categories BLOB,'
+                ' size INTEGER NOT NULL DEFAULT 0'
+                ')'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS articles_stored_at ON articles (stored_at)')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(articles)')}
+            if 'accessed_at' not in columns:
+                conn.execute('ALTER TABLE articles ADD COLUMN accessed_at REAL')
+            if 'changed_at' not in columns:
+                # When the row's content was last written; `touch` leaves it alone, unlike stored_at
+                conn.execute('ALTER TABLE articles ADD COLUMN changed_at REAL')
+                conn.execute('UPDATE articles SET changed_at = stored_at')
+            conn.execute('CREATE INDEX IF NOT EXISTS articles_changed_at ON articles (changed_at)')
+        # title -> monotonic time of the last recorded access, to throttle access writes
+        self._accessed: Dict[str, float] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def put(self, record: Dict[str, Any], stored_at: Optional[float] = None) -> None:
+        """
+        Insert or replace an article
+
+        Args:
+            record: Article data with at least a `title`; see `FIELDS`
+            stored_at: When the content was fetched from Wikipedia (default now); drives COMIC_ARTICLE_MAX_AGE
+        """
+        stored_at = time.time() if stored_at is None else stored_at
+        summary = _pack(record.get('summary'))
+        content = _pack(record.get('content'))
+        categories = _pack(json.dumps(record.get('categories') or [], ensure_ascii=False))
+        size = sum(len(blob) for blob in (summary, content, categories) if blob)
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO articles'
+                ' (title, url, revision_id, fetched_at, stored_at, changed_at, accessed_at, summary, content,'
+                ' categories, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (record['title'], record.get('url'), record.get('revision_id'), record.get('timestamp'),
+                 stored_at, time.time(), time.time(), summary, content, categories, size)
+            )
+
+    def get(self, title: str, fields: Optional[tuple] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up an article by canonical title
+
+        Args:
+            title: Canonical Wikipedia title
+            fields: Subset of `FIELDS` to load (default all); unrequested blobs are not read or inflated
+
+        Returns:
+            Article dictionary, or None if the title is not archived
+        """
+        fields = fields or self.FIELDS
+        columns = ['fetched_at' if f == 'timestamp' else f for f in fields] + ['stored_at']
+        row = self._connection().execute(
+            f"SELECT {', '.join(columns)} FROM articles WHERE title = ?", (title,)
+        ).fetchone()
+        if row is None:
+            return None
+        article = {}
+        for field, value in zip(fields, row):
+            if field in ('summary', 'content'):
+                value = _unpack(value)
+            elif field == 'categories':
+                value = json.loads(_unpack(value) or '[]')
+            article[field] = value
+        article['stored_at'] = row[-1]
+        return article
+
+    def touch(self, title: str) -> None:
+        """Mark an archived article as re-verified against Wikipedia now"""
+        with self._connection() as conn:
+            conn.execute('UPDATE articles SET stored_at = ? WHERE title = ?', (time.time(), title))
+
+    def record_access(self, title: str, interval: float = 3600.0) -> None:
+        """Note that an article was read, for LRU eviction; written at most once per `interval` seconds per title"""
+        now = time.monotonic()
+        last = self._accessed.get(title)
+        if last is not None and now - last < interval:
+            return
+        if len(self._accessed) >= 100000:
+            self._accessed.clear()
+        self._accessed[title] = now
+        with self._connection() as conn:
+            conn.execute('UPDATE articles SET accessed_at = ? WHERE title = ?', (time.time(), title))
+
+    def least_recently_used(self, limit: int = 500) -> List[Tuple[str, int, float]]:
+        """(title, size, last access) of the least recently read articles, oldest first"""
+        return self._connection().execute(
+            'SELECT title, size, COALESCE(accessed_at, stored_at) AS last_access FROM articles'
+            ' ORDER BY last_access, title LIMIT ?', (limit,)
+        ).fetchall()
+
+    def delete(self, titles: List[str]) -> None:
+        """Remove articles"""
+        with self._connection() as conn:
+            conn.executemany('DELETE FROM articles WHERE title = ?', [(title,) for title in titles])
+
+    def vacuum(self) -> None:
+        """Return the space freed by deletions to the filesystem"""
+        conn = self._connection()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+
+    def revision_id(self, title: str) -> Optional[int]:
+        """Revision id of the archived copy of an article, if any"""
+        row = self._connection().execute('SELECT revision_id FROM articles WHERE title = ?', (title,)).fetchone()
+        return row[0] if row else None
+
+    def titles(self) -> Iterator[str]:
+        """Iterate over every archived title"""
+        for (title,) in self._connection().execute('SELECT title FROM articles ORDER BY title'):
+            yield title
+
+    def changed_since(self, timestamp: float) -> List[Tuple[str, float]]:
+        """(title, changed_at) of articles written after `timestamp`, oldest first; touched ones are not included"""
+        return self._connection().execute(
+            'SELECT title, changed_at FROM articles WHERE changed_at > ? ORDER BY changed_at', (timestamp,)
+        ).fetchall()
+
+    def stats(self) -> Dict[str, int]:
+        """Article count, compressed payload bytes and database file size"""
+        count, payload = self._connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM articles').fetchone()
+        return {
+            'articles': count,
+            'payload_bytes': payload,
+            # Recent writes may still sit in the write-ahead log
+            'file_bytes': sum(os.path.getsize(p) for p in (self.path, self.path + '-wal') if os.path.exists(p))
+        }
+
+
+_archives: Dict[str, ArticleArchive] = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(data_dir: str) -> ArticleArchive:
+    """Process-wide archive stored in `data_dir`"""
+    path = os.path.abspath(os.path.join(data_dir, ARCHIVE_FILENAME))
+    with _archives_lock:
+        if path not in _archives:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _archives[path] = ArticleArchive(path)
+            logger.info(f"Article archive opened at {path}")
+        return _archives[path]
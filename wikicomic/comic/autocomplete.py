@@ -0,0 +1,238 @@
+"""
+In-memory title autocomplete.
+
+Every title the app has seen - search results, fetched pages and
+disambiguation options - is kept in a sorted array of casefolded keys, so a
+prefix lookup is two bisects and never touches Wikipedia. Candidates are
+ranked by how many comics were generated for the title. The index is
+snapshotted to `<data_dir>/autocomplete.json` so a restart does not start
+cold. Several workers share the snapshot: each save merges the file's titles
+and adds this worker's generations since its last save to the file's counts,
+under an exclusive lock, so no worker's counts are lost. A worker that never
+changed its index does not write the snapshot, not even at exit.
+"""
+import atexit
+import bisect
+import heapq
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialized across workers
+    fcntl = None
+
+from django.conf import settings
+
+from .archive import get_archive
+from .persistence import atomic_write
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILENAME = 'autocomplete.json'
+
+# Sorts after every other character, so `prefix + _PREFIX_END` bounds all keys starting with `prefix`
+_PREFIX_END = '\U0010ffff'
+
+# Never-generated candidates considered per lookup. A prefix sorts before its extensions, so the
+# first keys of a range are also the shortest ones and short prefixes stay sub-millisecond
+SCAN_LIMIT = 256
+
+
+class TitleIndex:
+    def __init__(self, snapshot_path: str, snapshot_interval: float = 60.0):
+        """
+        Sorted-array prefix index over known Wikipedia titles
+
+        Args:
+            snapshot_path: JSON file the index is loaded from and saved to
+            snapshot_interval: Seconds between a change and the snapshot that saves it
+        """
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        self._keys: List[str] = []  # sorted casefolded titles
+        self._titles: Dict[str, str] = {}  # key -> display title
+        self._counts: Dict[str, int] = {}  # key -> comics generated
+        self._unsaved: Dict[str, int] = {}  # key -> comics generated here since the last save
+        self._popular: List[str] = []  # sorted keys with a generation count
+        self._results: Dict[tuple, List[str]] = {}  # (prefix, limit) -> completions, cleared on change
+        self._timer = None
+        self._dirty = False  # changed since the last save
+        self._save_at_exit = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, titles: Iterable[str]) -> None:
+        """Make titles available for completion; known titles are left as they are"""
+        with self._lock:
+            new = {}
+            for title in titles:
+                if title and title.strip():
+                    key = title.strip().casefold()
+                    if key not in self._titles and key not in new:
+                        new[key] = title.strip()
+            if not new:
+                return
+            self._titles.update(new)
+            if len(new) > 8:
+                self._keys = sorted(self._titles)
+            else:
+                for key in new:
+                    bisect.insort(self._keys, key)
+            self._changed()
+
+    def record_generation(self, title: str) -> None:
+        """Count a generated comic towards the title's ranking"""
+        self.add([title])
+        key = title.strip().casefold()
+        with self._lock:
+            if key not in self._counts:
+                bisect.insort(self._popular, key)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._unsaved[key] = self._unsaved.get(key, 0) + 1
+            self._changed()
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Titles starting with a prefix, case-insensitively
+
+        Args:
+            prefix: Typed text
+            limit: Maximum number of completions
+
+        Returns:
+            Titles, most generated first, then shortest, then alphabetical
+        """
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return []
+        with self._lock:
+            cached = self._results.get((prefix, limit))
+            if cached is not None:
+                return cached
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + _PREFIX_END, start)
+            candidates = set(self._keys[start:min(end, start + SCAN_LIMIT)])
+            if end - start > SCAN_LIMIT:
+                first = bisect.bisect_left(self._popular, prefix)
+                candidates.update(self._popular[first:bisect.bisect_left(self._popular, prefix + _PREFIX_END, first)])
+            keys = heapq.nsmallest(limit, candidates, key=lambda k: (-self._counts.get(k, 0), len(k), k))
+            results = [self._titles[key] for key in keys]
+            if len(self._results) >= 4096:
+                self._results.clear()
+            self._results[(prefix, limit)] = results
+            return results
+
+    def _changed(self) -> None:
+        # Called with the lock held
+        self._results.clear()
+        self._dirty = True
+        if not self._save_at_exit:
+            atexit.register(self.save)
+            self._save_at_exit = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.snapshot_interval, self.save)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _read_snapshot(self) -> Dict[str, Any]:
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring unreadable autocomplete snapshot: {str(e)}")
+            return {}
+
+    def _merge(self, titles: Dict[str, int]) -> None:
+        # Called with the lock held: take the snapshot's titles and counts, plus what is not saved yet
+        for title, count in titles.items():
+            key = title.casefold()
+            self._titles.setdefault(key, title)
+            count = (count or 0) + self._unsaved.get(key, 0)
+            if count:
+                self._counts[key] = count
+        self._keys = sorted(self._titles)
+        self._popular = sorted(self._counts)
+        self._results.clear()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.snapshot_path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def load(self) -> bool:
+        """Load the snapshot; returns False if there is none"""
+        data = self._read_snapshot()
+        if not data:
+            return False
+        with self._lock:
+            self._merge(data.get('titles', {}))
+        return True
+
+    def save(self) -> None:
+        """Merge with the snapshot on disk and write it back atomically; does nothing if the index is unchanged"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            # Changes made while writing mark the index dirty again
+            self._dirty = False
+        if not os.path.isdir(os.path.dirname(self.snapshot_path)):
+            # The data directory was removed (a finished test or load test run); there is nothing to save into
+            logger.debug(f"Skipping autocomplete snapshot, {os.path.dirname(self.snapshot_path)} no longer exists")
+            return
+        try:
+            with self._file_lock():
+                on_disk = self._read_snapshot().get('titles', {})
+                with self._lock:
+                    self._merge(on_disk)
+                    saved = dict(self._unsaved)
+                    data = {'titles': {title: self._counts.get(key, 0) for key, title in self._titles.items()}}
+                atomic_write(self.snapshot_path,
+                             json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        except OSError as e:
+            logger.error(f"Failed to save autocomplete snapshot: {str(e)}")
+            with self._lock:
+                self._dirty = True
+            return
+        with self._lock:
+            # Generations recorded while writing stay unsaved for the next merge
+            for key, count in saved.items():
+                remaining = self._unsaved.pop(key, 0) - count
+                if remaining > 0:
+                    self._unsaved[key] = remaining
+
+
+_indexes: Dict[str, TitleIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_title_index(data_dir: str = 'data') -> TitleIndex:
+    """Process-wide title index for a data directory, loaded from its snapshot or seeded from the article archive"""
+    path = os.path.abspath(os.path.join(data_dir, SNAPSHOT_FILENAME))
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = TitleIndex(path, getattr(settings, 'COMIC_AUTOCOMPLETE_SNAPSHOT_INTERVAL', 60.0))
+            if not index.load():
+                index.add(get_archive(data_dir).titles())
+            logger.info(f"Autocomplete index loaded with {len(index)} titles")
+            _indexes[path] = index
+        return index
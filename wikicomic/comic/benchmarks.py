@@ -0,0 +1,142 @@
+"""
+Microbenchmarks for the text-processing code that runs on every comic request.
+
+Inputs are LLM-shaped fixtures (`comic/fixtures/`) in the exact formats the
+prompts in `StoryGenerator` ask for, plus the cached articles in `data/`.
+`manage.py benchmark` runs the cases, keeps a history of results and fails
+when a case regresses beyond a threshold.
+"""
+import json
+import os
+import re
+import statistics
+import timeit
+from typing import Callable, Dict, List
+
+from .archive import ARCHIVE_FILENAME, get_archive
+from .utils import WikipediaExtractor, ComicImageGenerator, split_scene_prompts, parse_storyline_sections
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Titles that exercise every character sanitize_filename replaces
+AWKWARD_TITLES = ['A/B', 'A?B', 'AC/DC', 'What? (film)', 'C:\\Windows "path" <test>|*']
+
+
+def _read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def load_articles(data_dir: str) -> List[Dict]:
+    """Load every article in the `data_dir` archive, plus any legacy `*_data.json` files not yet imported"""
+    articles = {}
+    for name in sorted(os.listdir(data_dir)):
+        if name.endswith('_data.json'):
+            with open(os.path.join(data_dir, name), encoding='utf-8') as f:
+                article = json.load(f)
+            articles[article['title']] = article
+    if os.path.exists(os.path.join(data_dir, ARCHIVE_FILENAME)):
+        archive = get_archive(data_dir)
+        for title in archive.titles():
+            if title not in articles:
+                articles[title] = archive.get(title)
+    return [articles[title] for title in sorted(articles)]
+
+
+def _article_as_storyline(article: Dict) -> str:
+    """Rewrite wiki "== Heading ==" markup into the storyline markdown format"""
+    body = re.sub(r'^=+\s*(.+?)\s*=+\s*$', r'## \1', article['content'], flags=re.MULTILINE)
+    return f"# {article['title']}: Comic Storyline\n\n## Overview\n{article['summary']}\n\n{body}"
+
+
+def build_cases(data_dir: str) -> Dict[str, Callable[[], object]]:
+    """
+    Build the benchmark cases
+
+    Args:
+        data_dir: Directory holding the article archive
+
+    Returns:
+        Mapping of case name to a zero-argument callable that runs one iteration
+    """
+    articles = load_articles(data_dir)
+    storyline = _read_fixture('storyline.md')
+    scenes_text = _read_fixture('scene_prompts.txt')
+    scenes = split_scene_prompts(scenes_text)
+    article_storylines = [_article_as_storyline(article) for article in articles]
+    titles = [article['title'] for article in articles] + AWKWARD_TITLES
+
+    # The helpers below only use module state, so skip __init__ (it needs API keys and creates directories)
+    extractor = WikipediaExtractor.__new__(WikipediaExtractor)
+    image_generator = ComicImageGenerator.__new__(ComicImageGenerator)
+
+    return {
+        'sanitize_filename': lambda: [extractor.sanitize_filename(title) for title in titles],
+        'split_scene_prompts': lambda: split_scene_prompts(scenes_text),
+        'extract_dialog_from_prompt': lambda: [image_generator._extract_dialog_from_prompt(scene) for scene in scenes],
+        'enhance_scene_prompt': lambda: [image_generator._enhance_scene_prompt(scene) for scene in scenes],
+        'parse_storyline_sections': lambda: parse_storyline_sections(storyline),
+        'parse_storyline_sections_articles': lambda: [parse_storyline_sections(text) for text in article_storylines],
+    }
+
+
+def run_case(func: Callable[[], object], rounds: int = 7) -> Dict[str, float]:
+    """
+    Time one case
+
+    Args:
+        func: Zero-argument callable to time
+        rounds: Number of timed rounds; each round is calibrated to last at least 0.2 seconds
+
+    Returns:
+        Dictionary with per-iteration `median_us`, `min_us` and the calibrated `iterations` per round
+    """
+    timer = timeit.Timer(func)
+    iterations, _ = timer.autorange()
+    per_call = [t / iterations * 1e6 for t in timer.repeat(repeat=rounds, number=iterations)]
+    return {
+        'median_us': statistics.median(per_call),
+        'min_us': min(per_call),
+        'iterations': iterations,
+    }
+
+
+def load_history(path: str) -> List[Dict]:
+    """Read previous benchmark runs (one JSON object per line)"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path: str, run: Dict) -> None:
+    """Append a benchmark run to the history file"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run, sort_keys=True) + '\n')
+
+
+def find_regressions(results: Dict[str, Dict], history: List[Dict], threshold: float, baseline_runs: int = 5) -> Dict[str, Dict]:
+    """
+    Compare results against the median of the last `baseline_runs` runs
+
+    Args:
+        results: Current results keyed by case name
+        history: Previous runs, oldest first
+        threshold: Allowed slowdown as a fraction (0.2 allows 20%)
+        baseline_runs: Number of recent runs forming the baseline
+
+    Returns:
+        Mapping of regressed case name to its baseline, current median and relative change
+    """
+    regressions = {}
+    recent = history[-baseline_runs:]
+    for name, result in results.items():
+        previous = [run['results'][name]['median_us'] for run in recent if name in run.get('results', {})]
+        if not previous:
+            continue
+        baseline = statistics.median(previous)
+        change = result['median_us'] / baseline - 1 if baseline else 0.0
+        if change > threshold:
+            regressions[name] = {'baseline_us': baseline, 'median_us': result['median_us'], 'change': change}
+    return regressions
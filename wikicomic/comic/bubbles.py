@@ -0,0 +1,222 @@
+"""
+Speech-bubble compositing for generated panels.
+
+`ComicImageGenerator._extract_dialog_from_prompt` pulls (character, line)
+pairs out of each scene prompt; this module lays them out as speech bubbles
+and draws them onto the panel with Pillow. Fonts, per-word glyph metrics,
+word-wrap results and whole layouts are memoized per process, so repeated
+styles and lines cost a dictionary lookup. Rendering runs in worker processes
+(`cpu_pool`) so it does not hold the GIL against request threads.
+
+Only `resolve_fonts` touches Django settings, and only in the parent process,
+so workers import this module without setting up Django. Pillow is imported
+on first use, so importing the views does not load it.
+"""
+import logging
+import os
+from functools import lru_cache
+from io import BytesIO
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+from . import cpu_pool
+
+if TYPE_CHECKING:
+    from PIL import Image, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Searched when COMIC_BUBBLE_FONT is not set; Pillow's built-in font is the last resort
+FONT_CANDIDATES = (
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/TTF/DejaVuSans.ttf', '/usr/share/fonts/TTF/DejaVuSans-Bold.ttf'),
+    ('/Library/Fonts/Arial.ttf', '/Library/Fonts/Arial Bold.ttf'),
+    ('C:\\Windows\\Fonts\\arial.ttf', 'C:\\Windows\\Fonts\\arialbd.ttf'),
+)
+
+# Dialog `_extract_dialog_from_prompt` invents when a prompt has none; never drawn
+PLACEHOLDER_DIALOG = ("Character", "This is an important moment in our story.")
+
+MIN_FONT_SIZE = 10
+# Bubbles may cover at most this share of the panel height before the font shrinks
+MAX_HEIGHT_SHARE = 0.45
+MAX_WIDTH_SHARE = 0.42
+
+# (x, y, width, height, side, font size, speaker, lines); side is 'left' or 'right'
+Bubble = Tuple[int, int, int, int, str, int, str, Tuple[str, ...]]
+
+
+@lru_cache(maxsize=64)
+def get_font(path: Optional[str], size: int) -> 'ImageFont.FreeTypeFont':
+    """Load a font once per process and size"""
+    from PIL import ImageFont
+
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            logger.warning(f"Font {path} could not be loaded, using Pillow's default font")
+    return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=65536)
+def word_width(path: Optional[str], size: int, word: str) -> float:
+    """Rendered width of a word (glyph advances and kerning), cached per font and size"""
+    return get_font(path, size).getlength(word)
+
+
+@lru_cache(maxsize=8192)
+def wrap_text(path: Optional[str], size: int, text: str, max_width: int) -> Tuple[str, ...]:
+    """
+    Greedy word wrap
+
+    Args:
+        path: Font file
+        size: Font size in pixels
+        text: Text to wrap
+        max_width: Maximum line width in pixels
+
+    Returns:
+        Lines; a word wider than `max_width` gets a line of its own
+    """
+    space = word_width(path, size, ' ')
+    lines: List[str] = []
+    current: List[str] = []
+    width = 0.0
+    for word in text.split():
+        w = word_width(path, size, word)
+        if current and width + space + w > max_width:
+            lines.append(' '.join(current))
+            current, width = [word], w
+        else:
+            width = width + space + w if current else w
+            current.append(word)
+    if current:
+        lines.append(' '.join(current))
+    return tuple(lines)
+
+
+def _line_width(path: Optional[str], size: int, line: str) -> float:
+    words = line.split()
+    return sum(word_width(path, size, word) for word in words) + word_width(path, size, ' ') * max(len(words) - 1, 0)
+
+
+@lru_cache(maxsize=2048)
+def layout_bubbles(width: int, height: int, dialog: Tuple[Tuple[str, str], ...],
+                   font_path: Optional[str], bold_path: Optional[str]) -> Tuple[Bubble, ...]:
+    """
+    Place one bubble per dialog line, alternating left and right down the top of the panel
+
+    Args:
+        width: Panel width
+        height: Panel height
+        dialog: (speaker, line) pairs
+        font_path: Font for the lines
+        bold_path: Font for the speaker names
+
+    Returns:
+        Bubbles in drawing order; the font shrinks until they fit in the top part of the panel
+    """
+    margin = max(int(width * 0.03), 4)
+    size = max(height // 28, MIN_FONT_SIZE)
+    while True:
+        pad = max(size * 6 // 10, 3)
+        line_height = int(size * 1.25)
+        max_text = int(width * MAX_WIDTH_SHARE) - 2 * pad
+        bubbles = []
+        y = margin
+        for index, (speaker, line) in enumerate(dialog):
+            lines = wrap_text(font_path, size, line, max_text)
+            name_size = max(size * 8 // 10, MIN_FONT_SIZE)
+            text_width = max([_line_width(font_path, size, l) for l in lines] +
+                             [_line_width(bold_path, name_size, speaker.upper())])
+            w = int(text_width) + 2 * pad
+            h = line_height * (len(lines) + 1) + 2 * pad
+            side = 'left' if index % 2 == 0 else 'right'
+            x = margin if side == 'left' else width - margin - w
+            bubbles.append((x, y, w, h, side, size, speaker.upper(), lines))
+            y += h + size  # room for the tail
+        if y <= height * MAX_HEIGHT_SHARE or size <= MIN_FONT_SIZE:
+            return tuple(bubbles)
+        size = max(int(size * 0.9), MIN_FONT_SIZE)
+
+
+def draw_bubbles(image: 'Image.Image', bubbles: Sequence[Bubble], font_path: Optional[str], bold_path: Optional[str]) -> None:
+    """Draw laid-out bubbles onto an image in place"""
+    from PIL import ImageDraw
+
+    draw = ImageDraw.Draw(image)
+    outline = max(image.width // 300, 2)
+    for x, y, w, h, side, size, speaker, lines in bubbles:
+        pad = max(size * 6 // 10, 3)
+        line_height = int(size * 1.25)
+        # Tail points down and towards the middle of the panel
+        base = x + w * (0.25 if side == 'left' else 0.6)
+        tip = (base + (size if side == 'left' else -size), y + h + size)
+        tail = [(base, y + h - outline), (base + w * 0.15, y + h - outline), tip]
+        draw.polygon(tail, fill='white', outline='black', width=outline)
+        draw.rounded_rectangle((x, y, x + w, y + h), radius=size, fill='white', outline='black', width=outline)
+        # Cover the tail's base where it meets the bubble
+        draw.line((base + outline, y + h - outline, base + w * 0.15 - outline, y + h - outline), fill='white', width=outline)
+        name_size = max(size * 8 // 10, MIN_FONT_SIZE)
+        draw.text((x + pad, y + pad), speaker, fill='black', font=get_font(bold_path, name_size))
+        for number, line in enumerate(lines, 1):
+            draw.text((x + pad, y + pad + number * line_height), line, fill='black', font=get_font(font_path, size))
+
+
+def composite_panel(png_bytes: bytes, dialog: Tuple[Tuple[str, str], ...], font_path: Optional[str],
+                    bold_path: Optional[str]) -> bytes:
+    """
+    Draw dialog bubbles onto a PNG panel (runs in a worker process)
+
+    Args:
+        png_bytes: Panel image
+        dialog: (speaker, line) pairs
+        font_path: Font for the lines
+        bold_path: Font for the speaker names
+
+    Returns:
+        PNG bytes of the composited panel
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(png_bytes)).convert('RGB')
+    draw_bubbles(image, layout_bubbles(image.width, image.height, dialog, font_path, bold_path), font_path, bold_path)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=1)
+def resolve_fonts() -> Tuple[Optional[str], Optional[str]]:
+    """Regular and bold font files from COMIC_BUBBLE_FONT / COMIC_BUBBLE_BOLD_FONT or the system"""
+    from django.conf import settings
+
+    regular = getattr(settings, 'COMIC_BUBBLE_FONT', None)
+    if regular:
+        return regular, getattr(settings, 'COMIC_BUBBLE_BOLD_FONT', None) or regular
+    for regular, bold in FONT_CANDIDATES:
+        if os.path.exists(regular):
+            return regular, bold if os.path.exists(bold) else regular
+    return None, None
+
+
+def composite(png_bytes: bytes, dialog: Sequence[Tuple[str, str]], timeout: float = 60.0) -> bytes:
+    """
+    Draw a scene's dialog onto its panel in the CPU pool
+
+    Args:
+        png_bytes: Panel image
+        dialog: (speaker, line) pairs as returned by `_extract_dialog_from_prompt`
+        timeout: Seconds to wait for the worker
+
+    Returns:
+        Composited PNG bytes, or the original panel if there is no dialog or compositing fails
+    """
+    dialog = tuple((speaker, line) for speaker, line in dialog if (speaker, line) != PLACEHOLDER_DIALOG)
+    if not dialog:
+        return png_bytes
+    try:
+        return cpu_pool.run('composite', composite_panel, png_bytes, dialog, *resolve_fonts(), timeout=timeout)
+    except Exception as e:
+        logger.error(f"Speech bubble compositing failed, keeping the bare panel: {str(e)}")
+        return png_bytes
@@ -0,0 +1,199 @@
+"""
+Page and strip composition for generated comics.
+
+Instead of loading one large image per scene, a client can ask for a comic
+as a few composed pages: panels laid out as a grid (left to right), a manga
+grid (right to left) or a single-column strip, downscaled to a common cell
+size and encoded as one progressive JPEG per page, with a map of where each
+panel sits.
+
+A composition is keyed by the layout parameters and the scenes' image paths,
+which are content hashes, so adding or replacing a scene yields a new key and
+never a stale page. Page files are named after the key under
+`MEDIA_ROOT/comic_pages/`, so they survive restarts and are shared by every
+process; rendering runs on the CPU pool.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, List
+
+from django.conf import settings
+
+from . import cpu_pool, metrics
+from .persistence import atomic_write
+
+logger = logging.getLogger(__name__)
+
+PAGES_PREFIX = 'comic_pages'
+LAYOUTS = ('grid', 'manga', 'strip')
+DEFAULT_ROWS = {'grid': 3, 'manga': 3, 'strip': 15}
+DEFAULT_COLUMNS = {'grid': 2, 'manga': 2, 'strip': 1}
+GUTTER = 16
+BORDER = 3
+
+
+def compose_page(spec: bytes) -> bytes:
+    """
+    Render one page (runs in a CPU pool worker)
+
+    Args:
+        spec: JSON page spec: width, height, quality and panels with an absolute `path` and a cell x, y, width, height
+
+    Returns:
+        JPEG bytes
+    """
+    from PIL import Image, ImageDraw, ImageOps
+
+    page = json.loads(spec)
+    canvas = Image.new('RGB', (page['width'], page['height']), 'white')
+    draw = ImageDraw.Draw(canvas)
+    for panel in page['panels']:
+        box = (panel['x'], panel['y'], panel['x'] + panel['width'], panel['y'] + panel['height'])
+        try:
+            with Image.open(panel['path']) as image:
+                image.draft('RGB', (panel['width'], panel['height']))
+                canvas.paste(ImageOps.pad(image.convert('RGB'), (panel['width'], panel['height']),
+                                          method=Image.LANCZOS, color='white'), box[:2])
+        except OSError:
+            draw.rectangle(box, fill='#dddddd')
+        draw.rectangle((box[0] - BORDER, box[1] - BORDER, box[2] + BORDER - 1, box[3] + BORDER - 1),
+                       outline='black', width=BORDER)
+    buffer = BytesIO()
+    canvas.save(buffer, format='JPEG', quality=page['quality'], optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def plan_pages(scenes: List[Dict[str, Any]], layout: str, columns: int, rows: int, cell: int) -> List[Dict[str, Any]]:
+    """
+    Assign scenes to page cells
+
+    Args:
+        scenes: Scenes in reading order
+        layout: One of LAYOUTS
+        columns: Cells per row
+        rows: Rows per page
+        cell: Cell edge in pixels
+
+    Returns:
+        Pages with width, height and panels (scene_number, image and the cell's x, y, width, height)
+    """
+    per_page = columns * rows
+    pages = []
+    for start in range(0, len(scenes), per_page):
+        chunk = scenes[start:start + per_page]
+        used_rows = (len(chunk) + columns - 1) // columns
+        panels = []
+        for index, scene in enumerate(chunk):
+            row, column = divmod(index, columns)
+            if layout == 'manga':
+                column = columns - 1 - column  # read right to left
+            panels.append({
+                'scene_number': scene['scene_number'],
+                'image': scene['image'],
+                'x': GUTTER + column * (cell + GUTTER),
+                'y': GUTTER + row * (cell + GUTTER),
+                'width': cell,
+                'height': cell,
+            })
+        pages.append({
+            'width': GUTTER + columns * (cell + GUTTER),
+            'height': GUTTER + used_rows * (cell + GUTTER),
+            'panels': panels,
+        })
+    return pages
+
+
+class PageComposer:
+    def __init__(self, root: str, cell: int = 512, quality: int = 82, max_cached: int = 256):
+        """
+        Composes and caches comic pages under MEDIA_ROOT
+
+        Args:
+            root: Media root
+            cell: Panel cell edge in pixels
+            quality: JPEG quality
+            max_cached: Page maps kept in memory
+        """
+        self.root = root
+        self.cell = cell
+        self.quality = quality
+        self.max_cached = max_cached
+        self._maps: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def key(self, scenes: List[Dict[str, Any]], layout: str, columns: int, rows: int) -> str:
+        """Composition key; changes whenever a scene image or a layout parameter does"""
+        material = json.dumps([layout, columns, rows, self.cell, self.quality, [s['image'] for s in scenes]])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _abs(self, relative: str) -> str:
+        return os.path.join(self.root, *relative.split('/'))
+
+    def page_path(self, key: str, number: int) -> str:
+        return f'{PAGES_PREFIX}/{key[:2]}/{key}-{number}.jpg'
+
+    def compose(self, scenes: List[Dict[str, Any]], layout: str, columns: int, rows: int) -> Dict[str, Any]:
+        """
+        Composed pages for a comic's scenes, rendering any page not on disk yet
+
+        Returns:
+            Dictionary with the composition `key` and `pages`, each with its relative `image` path
+        """
+        key = self.key(scenes, layout, columns, rows)
+        with self._lock:
+            pages = self._maps.get(key)
+            if pages is not None and not all(os.path.exists(self._abs(page['image'])) for page in pages):
+                pages = None  # evicted by garbage collection since
+            if pages is not None:
+                self._maps.move_to_end(key)
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        metrics.record_cache('comic_pages', pages is not None)
+        if pages is not None:
+            return {'key': key, 'pages': pages}
+
+        # One render per key, however many requests arrive for it at once
+        with key_lock:
+            pages = plan_pages(scenes, layout, columns, rows, self.cell)
+            for number, page in enumerate(pages, 1):
+                page['page'] = number
+                page['image'] = self.page_path(key, number)
+                path = self._abs(page['image'])
+                if os.path.exists(path):
+                    continue
+                spec = dict(page, quality=self.quality, panels=[
+                    dict(panel, path=self._abs(panel['image'])) for panel in page['panels']
+                ])
+                data = cpu_pool.run('compose', compose_page, json.dumps(spec).encode('utf-8'))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                atomic_write(path, data)
+            logger.info(f"Composed {len(pages)} {layout} page(s) for key {key[:12]}")
+
+        with self._lock:
+            self._maps[key] = pages
+            self._key_locks.pop(key, None)
+            while len(self._maps) > self.max_cached:
+                self._maps.popitem(last=False)
+        return {'key': key, 'pages': pages}
+
+
+_composers: Dict[str, PageComposer] = {}
+_composers_lock = threading.Lock()
+
+
+def get_composer() -> PageComposer:
+    """Process-wide composer for MEDIA_ROOT using COMIC_PAGE_CELL_SIZE and COMIC_PAGE_JPEG_QUALITY"""
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    with _composers_lock:
+        if root not in _composers:
+            _composers[root] = PageComposer(
+                root,
+                cell=getattr(settings, 'COMIC_PAGE_CELL_SIZE', 512),
+                quality=getattr(settings, 'COMIC_PAGE_JPEG_QUALITY', 82),
+            )
+        return _composers[root]
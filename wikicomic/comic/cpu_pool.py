@@ -0,0 +1,195 @@
+"""
+Process pool for CPU-bound image work.
+
+Decoding, re-encoding, resizing and compositing panels with Pillow holds the
+GIL, so running it on generation threads stalls the Django request threads
+of the same process. `run` sends such tasks to a pool of
+COMIC_CPU_WORKERS spawned processes instead.
+
+Image buffers are not pickled through the pool's pipe. The parent writes the
+input to a spool file (in /dev/shm when available, so it stays in memory),
+the worker reads it and writes its output to another spool file, and only
+the paths cross the process boundary. At most one task per worker is handed
+to the executor at a time; further tasks wait in the parent, and those of
+batch generation jobs only go once no interactive task is waiting. Queue
+depth and task latency are exported as metrics.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Optional, Tuple
+
+from . import metrics, scheduler
+
+logger = logging.getLogger(__name__)
+
+CPU_QUEUE_DEPTH = metrics.REGISTRY.register(metrics.Gauge(
+    'comic_cpu_pool_queue_depth', 'CPU pool tasks submitted and not yet finished.'))
+CPU_TASK_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    'comic_cpu_task_seconds', 'CPU pool task latency from submission to result, by task.', ['task'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)))
+CPU_TASK_WAIT_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    'comic_cpu_task_wait_seconds', 'Time CPU pool tasks spent queued or in handoff rather than running, by task.',
+    ['task'], buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)))
+
+
+# Tasks: module-level so spawned workers can import them by name. Each takes the input bytes first.
+
+def convert_to_png(data: bytes) -> bytes:
+    """Decode any Pillow-readable image and re-encode it as PNG"""
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.open(BytesIO(data)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def resize_png(data: bytes, max_edge: int) -> bytes:
+    """Downscale a PNG so its longer edge is at most `max_edge` pixels"""
+    from PIL import Image
+
+    image = Image.open(BytesIO(data))
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _run_spooled(func: Callable[..., bytes], in_path: str, out_path: str, args: Tuple[Any, ...]) -> float:
+    """Worker side of `run`: read the input file, run the task, write the output file; returns run seconds"""
+    start = time.perf_counter()
+    with open(in_path, 'rb') as f:
+        data = f.read()
+    result = func(data, *args)
+    with open(out_path, 'wb') as f:
+        f.write(result)
+    return time.perf_counter() - start
+
+
+class CPUPool:
+    def __init__(self, workers: int, spool_dir: str):
+        """
+        Sized process pool with file handoff
+
+        Args:
+            workers: Worker processes
+            spool_dir: Directory for handoff files; a tmpfs such as /dev/shm keeps them in memory
+        """
+        self.workers = workers
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        # Spawned, not forked: forking a process with running request threads can copy held locks
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self._slots = threading.Condition()
+        self._in_flight = 0
+        self._interactive_waiting = 0
+
+    def _acquire(self, interactive: bool) -> None:
+        with self._slots:
+            if interactive:
+                self._interactive_waiting += 1
+                try:
+                    self._slots.wait_for(lambda: self._in_flight < self.workers)
+                finally:
+                    self._interactive_waiting -= 1
+            else:
+                self._slots.wait_for(lambda: self._in_flight < self.workers and not self._interactive_waiting)
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._slots:
+            self._in_flight -= 1
+            self._slots.notify_all()
+
+    def _finish(self, acquired: bool, paths: Tuple[str, ...]) -> None:
+        """Give back a task's slot and remove its spool files"""
+        if acquired:
+            self._release()
+        CPU_QUEUE_DEPTH.dec()
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def run(self, task: str, func: Callable[..., bytes], data: bytes, *args: Any, timeout: Optional[float] = None) -> bytes:
+        """
+        Run `func(data, *args)` in a worker process and return its output
+
+        Args:
+            task: Task name for the metrics
+            func: Module-level function taking the input bytes first and returning bytes
+            data: Input bytes
+            timeout: Seconds to wait for the result
+
+        Returns:
+            Output bytes
+
+        Raises:
+            TimeoutError: No result within `timeout`; a task already running keeps its slot and spool
+                files until the worker is done with it
+        """
+        fd, in_path = tempfile.mkstemp(dir=self.spool_dir, prefix=f'{task}-', suffix='.in')
+        out_path = in_path[:-3] + '.out'
+        CPU_QUEUE_DEPTH.inc()
+        start = time.perf_counter()
+        acquired = False
+        future = None
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            self._acquire(scheduler.current_priority() == scheduler.INTERACTIVE)
+            acquired = True
+            future = self._executor.submit(_run_spooled, func, in_path, out_path, args)
+            run_seconds = future.result(timeout=timeout)
+            with open(out_path, 'rb') as f:
+                result = f.read()
+            elapsed = time.perf_counter() - start
+            CPU_TASK_SECONDS.observe(elapsed, task=task)
+            CPU_TASK_WAIT_SECONDS.observe(max(elapsed - run_seconds, 0.0), task=task)
+            return result
+        finally:
+            if future is not None and not future.done() and not future.cancel():
+                # The worker is still busy with it: releasing the slot now would overcommit the pool,
+                # and removing the files would fail the task midway
+                future.add_done_callback(lambda _: self._finish(acquired, (in_path, out_path)))
+            else:
+                self._finish(acquired, (in_path, out_path))
+
+
+def _spool_dir(base: Optional[str]) -> str:
+    if not base:
+        base = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+    # Per process, so it can be removed wholesale at exit
+    return os.path.join(base, f'wikicomic-cpu-{os.getpid()}')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> CPUPool:
+    """Process-wide CPU pool sized by COMIC_CPU_WORKERS (default: CPU count), spooling under COMIC_CPU_SPOOL_DIR"""
+    global _pool
+    if _pool is None:
+        from django.conf import settings
+
+        with _pool_lock:
+            if _pool is None:
+                workers = getattr(settings, 'COMIC_CPU_WORKERS', None) or os.cpu_count() or 1
+                _pool = CPUPool(workers, _spool_dir(getattr(settings, 'COMIC_CPU_SPOOL_DIR', None)))
+                atexit.register(shutil.rmtree, _pool.spool_dir, True)
+                logger.info(f"CPU pool started with {workers} workers, spooling to {_pool.spool_dir}")
+    return _pool
+
+
+def run(task: str, func: Callable[..., bytes], data: bytes, *args: Any, timeout: Optional[float] = 60.0) -> bytes:
+    """Run an image task on the process-wide CPU pool; see `CPUPool.run`"""
+    return get_pool().run(task, func, data, *args, timeout=timeout)
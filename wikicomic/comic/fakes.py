@@ -0,0 +1,345 @@
+"""
+Offline stand-ins for the upstream services used by the comic pipeline.
+
+The fakes mimic the parts of the `wikipedia` module, the Groq chat completions
+client and the Gemini `generate_content` client that `WikipediaExtractor`,
+`StoryGenerator` and `ComicImageGenerator` actually touch. Each one draws its
+latency from a configurable distribution, fails at a configurable rate and
+returns payloads of a configurable size, so the generation pipeline can be
+load-tested without API quota or network noise.
+"""
+import contextlib
+import logging
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from wikipedia.exceptions import DisambiguationError, PageError
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyModel:
+    def __init__(self, kind: str = "lognormal", median: float = 0.5, sigma: float = 0.4,
+                 low: float = 0.0, high: float = 1.0):
+        """
+        Latency distribution for a fake upstream call
+
+        Args:
+            kind: One of "constant", "uniform" or "lognormal"
+            median: Median latency in seconds (constant and lognormal)
+            sigma: Shape of the lognormal distribution; larger values give a heavier tail
+            low: Lower bound in seconds (uniform)
+            high: Upper bound in seconds (uniform)
+        """
+        if kind not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.median = median
+        self.sigma = sigma
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "LatencyModel":
+        """Build a latency model from a profile dictionary"""
+        return cls(**(data or {}))
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency value in seconds"""
+        if self.kind == "constant":
+            return self.median
+        if self.kind == "uniform":
+            return rng.uniform(self.low, self.high)
+        return self.median * math.exp(rng.gauss(0.0, self.sigma))
+
+
+class UpstreamProfile:
+    def __init__(self, latency: Optional[Dict[str, Any]] = None, error_rate: float = 0.0,
+                 payload_size: int = 0, seed: Optional[int] = None):
+        """
+        Behaviour of one fake upstream service
+
+        Args:
+            latency: Keyword arguments for `LatencyModel`
+            error_rate: Probability (0-1) that a call fails
+            payload_size: Service-specific payload size (characters of article text,
+                words of generated text or image edge length in pixels; 0 keeps the default)
+            seed: Seed for the random generator, for reproducible runs
+        """
+        self.latency = LatencyModel.from_dict(latency)
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "UpstreamProfile":
+        """Build a profile from a dictionary (as loaded from a JSON profile file)"""
+        return cls(**(data or {}))
+
+    def draw(self):
+        """Return a (latency, should_fail) pair for the next call"""
+        with self._lock:
+            return self.latency.sample(self.rng), self.rng.random() < self.error_rate
+
+
+class CallRecorder:
+    """Thread-safe record of the service time of every fake upstream call, keyed by stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, stage: str, seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+            if failed:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def snapshot(self):
+        """Return copies of the recorded samples and error counts"""
+        with self._lock:
+            return {k: list(v) for k, v in self.samples.items()}, dict(self.errors)
+
+
+class _FakeService:
+    stage_prefix = "upstream"
+
+    def __init__(self, profile: Optional[UpstreamProfile] = None, recorder: Optional[CallRecorder] = None):
+        self.profile = profile or UpstreamProfile()
+        self.recorder = recorder or CallRecorder()
+
+    def _simulate(self, stage: str, error_factory, timeout: Optional[float] = None) -> None:
+        """Sleep for a sampled latency and raise `error_factory()` if the call should fail, or TimeoutError past `timeout`"""
+        latency, failed = self.profile.draw()
+        if timeout is not None and latency > timeout:
+            time.sleep(max(timeout, 0.0))
+            self.recorder.record(f"{self.stage_prefix}.{stage}", timeout, True)
+            raise TimeoutError(f"{self.stage_prefix} {stage} timed out")
+        time.sleep(max(latency, 0.0))
+        self.recorder.record(f"{self.stage_prefix}.{stage}", latency, failed)
+        if failed:
+            raise error_factory()
+
+
+class FakeWikipediaPage:
+    def __init__(self, title: str, content: str):
+        self.title = title
+        self.url = f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
+        self.content = content
+        self.summary = content.split("\n\n", 1)[0]
+        # Stable across processes, unlike hash() with its per-process seed
+        self.revision_id = zlib.crc32(title.encode('utf-8'))
+        self.references = []
+        self.categories = [f"Category:{title}"]
+        self.links = []
+        self.images = []
+
+
+class FakeWikipedia(_FakeService):
+    """Drop-in for the `wikipedia` module as used by `WikipediaExtractor`"""
+
+    stage_prefix = "wikipedia"
+
+    def __init__(self, profile: Optional[UpstreamProfile] = None, recorder: Optional[CallRecorder] = None,
+                 articles: Optional[Dict[str, str]] = None, disambiguation: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            profile: Latency, error rate and article size (characters) for this fake
+            recorder: Shared call recorder
+            articles: Optional mapping of title to article text; unknown titles get generated text
+            disambiguation: Optional mapping of title to option lists that raise `DisambiguationError`
+        """
+        super().__init__(profile, recorder)
+        self.articles = articles or {}
+        self.disambiguation = disambiguation or {}
+
+    def set_lang(self, language: str) -> None:
+        pass
+
+    def search(self, query: str, results: int = 10) -> List[str]:
+        self._simulate("search", lambda: ConnectionError("injected wikipedia search failure"))
+        matches = [t for t in self.articles if query.lower() in t.lower()]
+        return (matches or [query] + [f"{query} ({i})" for i in range(1, results)])[:results]
+
+    def suggest(self, query: str) -> Optional[str]:
+        return None
+
+    def page(self, title: str, auto_suggest: bool = True) -> FakeWikipediaPage:
+        from .utils import fetch_time_left
+
+        # Like the real module's requests, bounded by the deadline `get_page_info` sets
+        self._simulate("page", lambda: ConnectionError("injected wikipedia page failure"), fetch_time_left())
+        if title in self.disambiguation:
+            raise DisambiguationError(title, self.disambiguation[title])
+        if self.articles and title not in self.articles and not auto_suggest:
+            raise PageError(title)
+        content = self.articles.get(title) or self._generate_article(title)
+        return FakeWikipediaPage(title, content)
+
+    def _generate_article(self, title: str) -> str:
+        size = self.profile.payload_size or 60000
+        paragraph = (f"{title} is a subject of historical and scientific interest. "
+                     f"Scholars have documented its origins, key figures and lasting impact. ")
+        paragraphs = []
+        length = 0
+        section = 1
+        while length < size:
+            block = f"== Section {section} ==\n{paragraph * 6}\n\n"
+            paragraphs.append(block)
+            length += len(block)
+            section += 1
+        return "".join(paragraphs)[:size]
+
+
+class _FakeCompletions:
+    def __init__(self, owner: "FakeGroqClient"):
+        self._owner = owner
+
+    def create(self, messages, model=None, max_tokens=None, timeout=None, **kwargs):
+        return self._owner._complete(messages, model, max_tokens, timeout)
+
+
+class FakeGroqClient(_FakeService):
+    """Drop-in for `groq.Client` as used by `StoryGenerator`"""
+
+    stage_prefix = "groq"
+
+    def __init__(self, profile: Optional[UpstreamProfile] = None, recorder: Optional[CallRecorder] = None):
+        super().__init__(profile, recorder)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    def _complete(self, messages, model, max_tokens, timeout=None):
+        prompt = messages[-1]["content"]
+        scenes_match = re.search(r"create exactly (\d+) sequential scene prompts", prompt)
+        title_match = re.search(r'about "([^"]+)"', prompt)
+        title = title_match.group(1) if title_match else "Topic"
+        if scenes_match:
+            self._simulate("prompts", lambda: RuntimeError("injected groq failure"), timeout)
+            content = self._scenes_text(title, int(scenes_match.group(1)))
+        else:
+            self._simulate("storyline", lambda: RuntimeError("injected groq failure"), timeout)
+            content = self._storyline_text(title)
+
+        completion_tokens = len(content.split()) * 4 // 3
+        finish_reason = "stop"
+        if max_tokens and completion_tokens > max_tokens:
+            content = " ".join(content.split(" ")[:max_tokens * 3 // 4])
+            completion_tokens = max_tokens
+            finish_reason = "length"
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens),
+        )
+
+    def _storyline_text(self, title: str) -> str:
+        words = self.profile.payload_size or 1000
+        filler = " ".join(["The story unfolds with vivid detail and dramatic tension."] * max(words // 36, 1))
+        return (f"# {title}: Comic Storyline\n\n## Overview\n{filler}\n\n"
+                f"## Main Characters\n- **The Narrator**: A curious historian.\n- **The Witness**: Saw it all.\n\n"
+                f"## Act 1: Beginnings\n{filler}\n\n## Act 2: Turning Point\n{filler}\n\n"
+                f"## Act 3: Legacy\n{filler}\n\n## Key Visuals\n- Wide establishing shots\n- Close-up reactions\n")
+
+    def _scenes_text(self, title: str, num_scenes: int) -> str:
+        detail = " ".join(["Detailed background with period-accurate architecture."] * max((self.profile.payload_size or 120) // 7, 1))
+        scenes = []
+        for i in range(1, num_scenes + 1):
+            scenes.append(
+                f"Scene {i}: Moment {i} of {title}\n"
+                f"Visual: The Narrator stands before a crowd, gesturing toward a map. {detail}\n"
+                f"Dialog: The Narrator: \"This is moment {i} in the story of {title}.\"\n"
+                f"Dialog: The Witness: \"I remember it as if it were yesterday.\"\n"
+                f"Style: comic book style with bold outlines and dramatic lighting.\n"
+            )
+        return "\n".join(scenes)
+
+
+class _FakeModels:
+    def __init__(self, owner: "FakeGeminiClient"):
+        self._owner = owner
+
+    def generate_content(self, model=None, contents=None, config=None):
+        http_options = getattr(config, "http_options", None)
+        timeout = getattr(http_options, "timeout", None)
+        return self._owner._generate(model, timeout / 1000.0 if timeout else None)
+
+
+class FakeGeminiClient(_FakeService):
+    """Drop-in for `google.genai.Client` as used by `ComicImageGenerator`"""
+
+    stage_prefix = "gemini"
+
+    def __init__(self, profile: Optional[UpstreamProfile] = None, recorder: Optional[CallRecorder] = None):
+        super().__init__(profile, recorder)
+        self.models = _FakeModels(self)
+        self._png = None
+        self._png_lock = threading.Lock()
+
+    def _image_bytes(self) -> bytes:
+        # Encode once: the payload is identical for every call, and encoding would otherwise
+        # show up as fake CPU time in the measurements.
+        with self._png_lock:
+            if self._png is None:
+                from PIL import Image
+                edge = self.profile.payload_size or 1024
+                noise = random.Random(edge).getrandbits(edge * edge * 24).to_bytes(edge * edge * 3, "little")
+                buffer = BytesIO()
+                Image.frombytes("RGB", (edge, edge), noise).save(buffer, format="PNG")
+                self._png = buffer.getvalue()
+            return self._png
+
+    def _generate(self, model, timeout=None):
+        self._simulate("image", lambda: RuntimeError("injected gemini failure"), timeout)
+        image_part = SimpleNamespace(inline_data=SimpleNamespace(data=self._image_bytes(), mime_type="image/png"), text=None)
+        text_part = SimpleNamespace(inline_data=None, text="Here is your comic panel.")
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[text_part, image_part]))])
+
+
+@contextlib.contextmanager
+def offline_upstreams(profiles: Optional[Dict[str, Dict[str, Any]]] = None, data_dir: Optional[str] = None,
+                      recorder: Optional[CallRecorder] = None):
+    """
+    Route the views' pipeline components to fake upstreams for the duration of the block
+
+    Args:
+        profiles: Mapping with optional "wikipedia", "groq" and "gemini" keys, each holding
+            `UpstreamProfile` keyword arguments
+        data_dir: Directory the extractor writes article data to (keeps fakes out of `data/`)
+        recorder: Call recorder shared by all fakes; a new one is created if omitted
+
+    Yields:
+        The `CallRecorder` collecting per-stage upstream service times
+    """
+    from functools import partial
+    from . import views
+
+    profiles = profiles or {}
+    recorder = recorder or CallRecorder()
+    wiki = FakeWikipedia(UpstreamProfile.from_dict(profiles.get("wikipedia")), recorder)
+    groq_client = FakeGroqClient(UpstreamProfile.from_dict(profiles.get("groq")), recorder)
+    gemini_client = FakeGeminiClient(UpstreamProfile.from_dict(profiles.get("gemini")), recorder)
+
+    originals = (views.WikipediaExtractor, views.StoryGenerator, views.ComicImageGenerator)
+    extractor_kwargs = {"backend": wiki}
+    if data_dir:
+        extractor_kwargs["data_dir"] = data_dir
+    views.WikipediaExtractor = partial(originals[0], **extractor_kwargs)
+    views.StoryGenerator = partial(originals[1], client=groq_client)
+    views.ComicImageGenerator = partial(originals[2], client=gemini_client)
+    logger.info("Offline upstream fakes installed")
+    try:
+        yield recorder
+    finally:
+        views.WikipediaExtractor, views.StoryGenerator, views.ComicImageGenerator = originals
+        logger.info("Offline upstream fakes removed")
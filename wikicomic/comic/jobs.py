@@ -0,0 +1,211 @@
+"""
+Cancellation and deadlines for generation jobs.
+
+Each job gets a `JobContext` when it is queued. The job checks it between
+stages and between scenes, and runs every upstream call through
+`JobContext.call`. That call gives the request a timeout no longer than what
+is left of the stage and job deadlines, and waits for it in a way a cancel
+interrupts. A cancelled job stops waiting at once. The abandoned request is
+not awaited, and the timeout passed to the client bounds how long it can
+keep running.
+
+A job is cancelled by the cancel endpoint, by a new submission that replaces
+it, when it runs past COMIC_JOB_DEADLINE, or when its client stops polling
+its status for COMIC_ABANDON_AFTER seconds after having polled at least once.
+Cancels and polls handled by another worker reach the job through the shared
+status backend (see `status_store`), which `check` reads at most every
+SHARED_CHECK_INTERVAL seconds.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics, status_store
+
+logger = logging.getLogger(__name__)
+
+# Per-call timeouts (seconds) by stage, unless COMIC_STAGE_TIMEOUTS overrides them
+DEFAULT_STAGE_TIMEOUTS = {'fetch': 30.0, 'storyline': 60.0, 'prompts': 90.0, 'image': 120.0}
+
+# Seconds between two reads of a job's shared cancel request and last poll
+SHARED_CHECK_INTERVAL = 1.0
+
+JOBS_CANCELLED = metrics.REGISTRY.register(metrics.Counter(
+    'comic_jobs_cancelled_total', 'Generation jobs stopped before completing, by reason.', ['reason']))
+
+# Runs upstream calls so the job thread can stop waiting for them
+_call_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='comic-upstream')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled or has run out of time"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Job cancelled: {reason}")
+        self.reason = reason
+
+
+class JobContext:
+    def __init__(self, job_id: str, deadline: Optional[float] = None, abandon_after: Optional[float] = None,
+                 stage_timeouts: Optional[Dict[str, float]] = None, shared: Optional[status_store.StatusWriter] = None):
+        """
+        Cancellation state and deadlines of one generation job
+
+        Args:
+            job_id: Request ID of the job
+            deadline: Seconds the whole job may take once it starts running (None for no limit)
+            abandon_after: Seconds without a status poll after which the client is assumed gone
+            stage_timeouts: Maximum seconds of a single upstream call, by stage
+            shared: Status writer carrying cancel requests and polls from other workers (None for local only)
+        """
+        self.job_id = job_id
+        self.comic_id = None
+        self.time_limit = deadline
+        # Set by `begin`, so time spent queued does not count
+        self.deadline: Optional[float] = None
+        self.abandon_after = abandon_after
+        self.stage_timeouts = dict(DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {}))
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+        # Unix time of the latest poll seen here or recorded by another worker
+        self._last_poll: Optional[float] = None
+        self.shared = shared
+        self._last_sync = float('-inf')
+
+    def begin(self) -> None:
+        """Start the job's deadline clock when a worker picks the job up"""
+        if self.time_limit:
+            self.deadline = time.monotonic() + self.time_limit
+
+    def cancel(self, reason: str = 'cancelled') -> bool:
+        """Request cancellation; returns False if the job was already cancelled"""
+        if self._cancelled.is_set():
+            return False
+        self.reason = reason
+        self._cancelled.set()
+        logger.info(f"Cancelling job {self.job_id}: {reason}")
+        return True
+
+    def heartbeat(self) -> None:
+        """Record a status poll from the job's client"""
+        self._last_poll = time.time()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        """Raise JobCancelled if the job was cancelled, ran past its deadline or lost its client"""
+        now = time.monotonic()
+        if not self._cancelled.is_set():
+            self._sync(now)
+        if not self._cancelled.is_set():
+            if self.deadline is not None and now >= self.deadline:
+                self.cancel('deadline')
+            elif (self.abandon_after and self._last_poll is not None
+                  and time.time() - self._last_poll > self.abandon_after):
+                self.cancel('abandoned')
+        if self._cancelled.is_set():
+            raise JobCancelled(self.reason)
+
+    def _sync(self, now: float) -> None:
+        """Pick up a cancel request and the latest poll recorded by other workers"""
+        if self.shared is None or now - self._last_sync < SHARED_CHECK_INTERVAL:
+            return
+        self._last_sync = now
+        try:
+            reason = self.shared.cancel_requested(self.job_id)
+            polled_at = self.shared.last_poll(self.job_id)
+        except Exception as e:
+            logger.error(f"Failed to read shared state of job {self.job_id}: {str(e)}")
+            return
+        if polled_at is not None and (self._last_poll is None or polled_at > self._last_poll):
+            self._last_poll = polled_at
+        if reason is not None:
+            self.cancel(reason)
+
+    def timeout(self, stage: str) -> float:
+        """Seconds an upstream call of `stage` may take: its stage timeout, cut to the job deadline"""
+        timeout = self.stage_timeouts.get(stage, 60.0)
+        if self.deadline is not None:
+            timeout = min(timeout, self.deadline - time.monotonic())
+        return max(timeout, 0.0)
+
+    def call(self, stage: str, func: Callable[[float], Any]) -> Any:
+        """
+        Run an upstream call, giving up as soon as the job is cancelled
+
+        Args:
+            stage: Stage name, for the timeout
+            func: Call taking the timeout in seconds to pass on to the client
+
+        Returns:
+            The call's result
+
+        Raises:
+            JobCancelled: The job was cancelled or its deadline passed before the call returned
+            TimeoutError: The call outlived its stage timeout
+        """
+        self.check()
+        timeout = self.timeout(stage)
+        future = _call_pool.submit(func, timeout)
+        end = time.monotonic() + timeout
+        while True:
+            try:
+                # Short waits, so a cancel or a lost client is noticed within a fraction of a second
+                return future.result(timeout=min(0.2, max(end - time.monotonic(), 0.0)))
+            except FutureTimeoutError:
+                self.check()
+                if time.monotonic() >= end:
+                    future.cancel()
+                    raise TimeoutError(f"{stage} call exceeded {timeout:.1f}s")
+
+
+_jobs: Dict[str, JobContext] = {}
+_jobs_lock = threading.Lock()
+
+
+def start_job(job_id: str, interactive: bool = True) -> JobContext:
+    """
+    Create and register the context of a new job
+
+    Args:
+        job_id: Request ID of the job
+        interactive: Whether a reader is waiting; only then does a lost client cancel the job
+
+    Returns:
+        The job's context, with COMIC_JOB_DEADLINE, COMIC_ABANDON_AFTER and COMIC_STAGE_TIMEOUTS applied
+    """
+    from django.conf import settings
+
+    job = JobContext(
+        job_id,
+        deadline=getattr(settings, 'COMIC_JOB_DEADLINE', 900),
+        abandon_after=getattr(settings, 'COMIC_ABANDON_AFTER', 60) if interactive else None,
+        stage_timeouts=getattr(settings, 'COMIC_STAGE_TIMEOUTS', None),
+        shared=status_store.get_writer(),
+    )
+    with _jobs_lock:
+        _jobs[job_id] = job
+    return job
+
+
+def get_job(job_id: str) -> Optional[JobContext]:
+    """Context of a queued or running job"""
+    return _jobs.get(job_id)
+
+
+def get_job_for_comic(comic_id: str) -> Optional[JobContext]:
+    """Context of the queued or running job generating a comic"""
+    with _jobs_lock:
+        return next((job for job in _jobs.values() if job.comic_id == comic_id), None)
+
+
+def finish_job(job_id: str) -> None:
+    """Forget a job once it has ended"""
+    with _jobs_lock:
+        job = _jobs.pop(job_id, None)
+    if job is not None and job.cancelled:
+        JOBS_CANCELLED.inc(reason=job.reason)
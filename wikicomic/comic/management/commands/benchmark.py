@@ -0,0 +1,64 @@
+import os
+import platform
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from comic import benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Run microbenchmarks for the text-processing hot paths, record them in a history file "
+            "and fail if any case is slower than the recent baseline by more than the threshold.")
+
+    def add_arguments(self, parser):
+        base_dir = getattr(settings, 'BASE_DIR', os.getcwd())
+        parser.add_argument('--data-dir', default=os.path.join(base_dir, 'data'))
+        parser.add_argument('--history', default=os.path.join(base_dir, '.benchmarks', 'hotpaths.jsonl'),
+                            help='JSON-lines file with previous runs')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed slowdown against the baseline as a fraction (default 0.2)')
+        parser.add_argument('--baseline-runs', type=int, default=5, help='Number of recent runs in the baseline')
+        parser.add_argument('--rounds', type=int, default=7)
+        parser.add_argument('--case', action='append', help='Only run the named case (repeatable)')
+        parser.add_argument('--no-save', action='store_true', help='Do not append this run to the history')
+        parser.add_argument('--accept', action='store_true',
+                            help='Record this run even if it regressed (an intended slowdown becomes the new baseline)')
+
+    def handle(self, *args, **options):
+        cases = benchmarks.build_cases(options['data_dir'])
+        if options['case']:
+            unknown = set(options['case']) - set(cases)
+            if unknown:
+                raise CommandError(f"Unknown benchmark case(s): {', '.join(sorted(unknown))}")
+            cases = {name: cases[name] for name in options['case']}
+
+        results = {}
+        self.stdout.write(f"{'case':<38}{'median':>14}{'min':>14}")
+        for name, func in cases.items():
+            results[name] = benchmarks.run_case(func, rounds=options['rounds'])
+            self.stdout.write(f"{name:<38}{results[name]['median_us']:>12.1f}us{results[name]['min_us']:>12.1f}us")
+
+        history = benchmarks.load_history(options['history'])
+        regressions = benchmarks.find_regressions(results, history, options['threshold'], options['baseline_runs'])
+
+        # A regressed run only enters the baseline when accepted, otherwise repeated runs would hide the slowdown
+        if not options['no_save'] and (not regressions or options['accept']):
+            benchmarks.append_history(options['history'], {
+                'timestamp': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            })
+
+        if regressions:
+            for name, data in regressions.items():
+                self.stderr.write(
+                    f"{name}: {data['median_us']:.1f}us vs baseline {data['baseline_us']:.1f}us (+{data['change']:.0%})"
+                )
+            if options['accept']:
+                self.stdout.write(self.style.WARNING(f"Accepted {len(regressions)} regression(s) into the baseline"))
+                return
+            raise CommandError(f"{len(regressions)} benchmark(s) regressed by more than {options['threshold']:.0%}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {min(len(history), options['baseline_runs'])} previous run(s)"))
@@ -0,0 +1,84 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from comic import bubbles
+from comic.benchmarks import FIXTURES_DIR
+from comic.utils import ComicImageGenerator, split_scene_prompts
+
+
+def _panel(size):
+    """A noisy test panel, so PNG encoding costs what it does on real art"""
+    image = Image.effect_noise((size, size), 64).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = ("Measure speech-bubble compositing throughput in panels per second per core, inline "
+            "and through the worker process pool, using the dialog in comic/fixtures/scene_prompts.txt.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--panels', type=int, default=60, help='Panels composited per measurement')
+        parser.add_argument('--size', type=int, default=1024, help='Panel edge in pixels')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes for the pool run')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        with open(os.path.join(FIXTURES_DIR, 'scene_prompts.txt'), encoding='utf-8') as f:
+            scenes = split_scene_prompts(f.read())
+        extractor = ComicImageGenerator.__new__(ComicImageGenerator)
+        dialogs = [tuple(extractor._extract_dialog_from_prompt(scene)) for scene in scenes]
+        panel = _panel(options['size'])
+        fonts = bubbles.resolve_fonts()
+        jobs = [dialogs[i % len(dialogs)] for i in range(options['panels'])]
+
+        # Cold: first panel in a fresh process state pays for font loading and layout
+        bubbles.get_font.cache_clear()
+        bubbles.word_width.cache_clear()
+        bubbles.wrap_text.cache_clear()
+        bubbles.layout_bubbles.cache_clear()
+        start = time.perf_counter()
+        bubbles.composite_panel(panel, jobs[0], *fonts)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for dialog in jobs:
+            bubbles.composite_panel(panel, dialog, *fonts)
+        inline = len(jobs) / (time.perf_counter() - start)
+
+        workers = options['workers']
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            # Warm every worker before timing
+            list(pool.map(bubbles.composite_panel, [panel] * workers, jobs[:workers], [fonts[0]] * workers, [fonts[1]] * workers))
+            start = time.perf_counter()
+            list(pool.map(bubbles.composite_panel, [panel] * len(jobs), jobs,
+                          [fonts[0]] * len(jobs), [fonts[1]] * len(jobs)))
+            pooled = len(jobs) / (time.perf_counter() - start)
+
+        report = {
+            'panel_size': options['size'],
+            'panels': len(jobs),
+            'font': fonts[0] or 'Pillow default',
+            'cold_first_panel_ms': round(cold * 1000, 2),
+            'inline_panels_per_sec': round(inline, 2),
+            'pool_workers': workers,
+            'pool_panels_per_sec': round(pooled, 2),
+            'pool_panels_per_sec_per_core': round(pooled / workers, 2),
+            'layout_cache': bubbles.layout_bubbles.cache_info()._asdict(),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{report['panels']} panels of {report['panel_size']}px, font {report['font']}")
+        self.stdout.write(f"  first panel (cold caches): {report['cold_first_panel_ms']} ms")
+        self.stdout.write(f"  inline, 1 core:            {report['inline_panels_per_sec']} panels/s")
+        self.stdout.write(f"  pool, {workers} worker(s):        {report['pool_panels_per_sec']} panels/s "
+                          f"({report['pool_panels_per_sec_per_core']} panels/s/core)")
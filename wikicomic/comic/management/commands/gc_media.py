@@ -0,0 +1,56 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from comic import storage_gc
+
+
+class Command(BaseCommand):
+    help = ("Evict least recently used panels and archived articles until they fit the "
+            "COMIC_MEDIA_QUOTA_BYTES and COMIC_ARTICLE_QUOTA_BYTES quotas, and report the space reclaimed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--media-quota', type=int, help='Panel byte quota (overrides COMIC_MEDIA_QUOTA_BYTES)')
+        parser.add_argument('--article-quota', type=int, help='Archive byte quota (overrides COMIC_ARTICLE_QUOTA_BYTES)')
+        parser.add_argument('--min-age', type=float,
+                            help='Keep anything accessed within this many seconds (overrides COMIC_GC_MIN_AGE)')
+        parser.add_argument('--data-dir', default=os.path.join(getattr(settings, 'BASE_DIR', os.getcwd()), 'data'))
+        parser.add_argument('--full-scan', action='store_true', help='List every media directory, not only changed ones')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        report = storage_gc.collect(
+            media_quota=options['media_quota'],
+            article_quota=options['article_quota'],
+            min_age=options['min_age'],
+            data_dir=options['data_dir'],
+            dry_run=options['dry_run'],
+            full_scan=options['full_scan'],
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        media, articles = report['media'], report['articles']
+        prefix = 'Would reclaim' if report['dry_run'] else 'Reclaimed'
+        self.stdout.write(
+            f"Media: {media['files_before']} files, {media['bytes_before']:,} bytes "
+            f"(quota {self._quota(media['quota_bytes'])}); scanned {media['dirs_listed']} changed "
+            f"and skipped {media['dirs_skipped']} unchanged directories"
+        )
+        self.stdout.write(f"  {prefix} {media['reclaimed_bytes']:,} bytes from {media['evicted_files']} files, "
+                          f"{media['bytes_after']:,} bytes left")
+        self.stdout.write(
+            f"Articles: {articles['articles_before']} articles, {articles['bytes_before']:,} bytes "
+            f"(quota {self._quota(articles['quota_bytes'])})"
+        )
+        self.stdout.write(f"  {prefix} {articles['reclaimed_bytes']:,} bytes from {articles['evicted_articles']} "
+                          f"articles, {articles['bytes_after']:,} bytes left")
+        self.stdout.write(self.style.SUCCESS(f"Done in {report['seconds']}s"))
+
+    @staticmethod
+    def _quota(value):
+        return f"{value:,} bytes" if value is not None else 'unlimited'
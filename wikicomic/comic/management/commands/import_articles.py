@@ -0,0 +1,56 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from comic.archive import get_archive
+
+
+class Command(BaseCommand):
+    help = ("Import the per-title `*_data.json` article files written by earlier versions into the "
+            "article archive, optionally deleting them once imported.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-dir', default=os.path.join(getattr(settings, 'BASE_DIR', os.getcwd()), 'data'))
+        parser.add_argument('--delete', action='store_true', help='Delete each JSON file after importing it')
+
+    def handle(self, *args, **options):
+        data_dir = options['data_dir']
+        if not os.path.isdir(data_dir):
+            raise CommandError(f"Data directory not found: {data_dir}")
+
+        names = sorted(n for n in os.listdir(data_dir) if n.endswith(('_data.json', '_data.json.gz')))
+        before = sum(os.path.getsize(os.path.join(data_dir, n)) for n in names)
+        archive = get_archive(data_dir)
+
+        imported = 0
+        for name in names:
+            path = os.path.join(data_dir, name)
+            opener = gzip.open if name.endswith('.gz') else open
+            try:
+                with opener(path, 'rt', encoding='utf-8') as f:
+                    record = json.load(f)
+                # Keep the original fetch time, so COMIC_ARTICLE_MAX_AGE treats old copies as stale
+                archive.put(record, stored_at=self._fetched_at(record, path))
+            except (OSError, ValueError, KeyError) as e:
+                self.stderr.write(f"Skipped {name}: {e}")
+                continue
+            imported += 1
+            if options['delete']:
+                os.remove(path)
+
+        stats = archive.stats()
+        self.stdout.write(f"Imported {imported} of {len(names)} article file(s)")
+        self.stdout.write(f"JSON files: {before:,} bytes; archive: {stats['articles']} article(s), "
+                          f"{stats['payload_bytes']:,} payload bytes, {stats['file_bytes']:,} bytes on disk")
+
+    @staticmethod
+    def _fetched_at(record, path):
+        """Unix time the article was fetched: its `timestamp`, else the file's modification time"""
+        try:
+            return datetime.fromisoformat(record['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return os.path.getmtime(path)
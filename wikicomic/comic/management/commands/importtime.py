@@ -0,0 +1,85 @@
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Upstream client libraries the app imports on first use; a worker boot should not load them
+LAZY_MODULES = ('wikipedia', 'groq', 'google.genai', 'PIL', 'dotenv')
+
+
+def parse_importtime(stderr):
+    """
+    Parse `python -X importtime` output
+
+    Args:
+        stderr: Standard error of the measured interpreter
+
+    Returns:
+        List of (module, self microseconds, cumulative microseconds, depth) in import order
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            depth = (len(name) - len(name.lstrip())) // 2
+            entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+        except ValueError:
+            continue
+    return entries
+
+
+class Command(BaseCommand):
+    help = ("Measure how long a fresh worker takes to import the app (like `python -X importtime`) "
+            "and fail if it exceeds COMIC_IMPORT_BUDGET_MS or loads an upstream client library.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=getattr(settings, 'ROOT_URLCONF', 'comic.urls'),
+                            help='Module a worker imports after django.setup() (default: the URLconf)')
+        parser.add_argument('--budget', type=float, default=getattr(settings, 'COMIC_IMPORT_BUDGET_MS', 400),
+                            help='Allowed median time to import the module after django.setup(), in milliseconds')
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to measure')
+        parser.add_argument('--top', type=int, default=15, help='Slowest modules to list')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be positive')
+        code = f"import django; django.setup(); import {options['module']}"
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+
+        setup_times = []
+        module_times = []
+        entries = []
+        for _ in range(options['runs']):
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                raise CommandError(f"Importing {options['module']} failed:\n{result.stderr.strip().splitlines()[-1]}")
+            entries = parse_importtime(result.stderr)
+            top_level = [(name, cumulative) for name, _, cumulative, depth in entries if depth == 0]
+            # django.setup() runs the installed apps; the module after it is what a worker adds on top
+            names = [name for name, _ in top_level]
+            start = names.index('django') if 'django' in names else 0
+            end = names.index(options['module']) if options['module'] in names else len(names)
+            setup_times.append(sum(cumulative for _, cumulative in top_level[start:end]) / 1000.0)
+            module_times.append(sum(cumulative for _, cumulative in top_level[end:]) / 1000.0)
+
+        self.stdout.write(f"{'module':<56}{'self':>10}{'cumulative':>12}")
+        for name, self_us, total_us, _ in sorted(entries, key=lambda entry: -entry[1])[:options['top']]:
+            self.stdout.write(f"{name:<56}{self_us / 1000.0:>8.1f}ms{total_us / 1000.0:>10.1f}ms")
+
+        median = statistics.median(module_times)
+        self.stdout.write(f"django.setup(): median {statistics.median(setup_times):.1f}ms")
+        self.stdout.write(f"import {options['module']}: median {median:.1f}ms over {len(module_times)} run(s), "
+                          f"budget {options['budget']:.0f}ms")
+        imported = {entry[0] for entry in entries}
+        loaded = [module for module in LAZY_MODULES if module in imported]
+        if loaded:
+            raise CommandError(f"Imported at start-up instead of on first use: {', '.join(loaded)}")
+        if median > options['budget']:
+            raise CommandError(f"Import time {median:.1f}ms exceeds the {options['budget']:.0f}ms budget")
+        self.stdout.write(self.style.SUCCESS('Within budget'))
@@ -0,0 +1,215 @@
+import json
+import os
+import math
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from comic.fakes import offline_upstreams
+
+TERMINAL_STATES = ('COMPLETED', 'ERROR', 'CANCELLED')
+
+DEFAULT_PROFILES = {
+    'wikipedia': {'latency': {'kind': 'lognormal', 'median': 0.3, 'sigma': 0.3}},
+    'groq': {'latency': {'kind': 'lognormal', 'median': 1.5, 'sigma': 0.4}},
+    'gemini': {'latency': {'kind': 'lognormal', 'median': 2.0, 'sigma': 0.5}, 'payload_size': 512},
+}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100.0 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = ("Drive the generate/status/comic API end to end against offline upstream fakes and "
+            "report throughput, per-stage latency percentiles and worker utilization.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=20, help='Number of comics to generate')
+        parser.add_argument('--concurrency', type=int, default=4, help='Simultaneous client sessions')
+        parser.add_argument('--num-scenes', type=int, default=8)
+        parser.add_argument('--target-length', default='medium')
+        parser.add_argument('--batch-jobs', type=int, default=0,
+                            help='Batch-priority comics submitted at the start, as a backfill running alongside')
+        parser.add_argument('--batch-num-scenes', type=int, default=15)
+        parser.add_argument('--poll-interval', type=float, default=0.25, help='Seconds between status polls')
+        parser.add_argument('--session-timeout', type=float, default=600.0,
+                            help='Seconds a session waits for its comic before counting it as failed')
+        parser.add_argument('--profile', help='JSON file with "wikipedia", "groq" and "gemini" upstream profiles')
+        parser.add_argument('--time-scale', type=float, default=1.0,
+                            help='Multiply every configured latency by this factor (e.g. 0.01 for a smoke run)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['jobs'] < 1 or options['concurrency'] < 1 or options['batch_jobs'] < 0:
+            raise CommandError('--jobs and --concurrency must be positive and --batch-jobs not negative')
+
+        profiles = json.loads(json.dumps(DEFAULT_PROFILES))
+        if options['profile']:
+            with open(options['profile'], encoding='utf-8') as f:
+                profiles.update(json.load(f))
+        for i, profile in enumerate(profiles.values()):
+            latency = profile.setdefault('latency', {})
+            for key in ('median', 'low', 'high'):
+                if key in latency:
+                    latency[key] *= options['time_scale']
+            profile.setdefault('seed', options['seed'] + i)
+
+        titles = self._titles()
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory(prefix='wikicomic-loadtest-') as workdir, \
+                    override_settings(MEDIA_ROOT=os.path.join(workdir, 'media')), \
+                    offline_upstreams(profiles, data_dir=os.path.join(workdir, 'data')) as recorder:
+                report = self._run(options, titles, recorder)
+        finally:
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_report(report)
+
+    def _titles(self):
+        data_dir = os.path.join(settings.BASE_DIR, 'data') if hasattr(settings, 'BASE_DIR') else 'data'
+        suffix = '_data.json'
+        titles = []
+        if os.path.isdir(data_dir):
+            titles = sorted(name[:-len(suffix)] for name in os.listdir(data_dir) if name.endswith(suffix))
+        return titles or ['Moon', 'NASA', 'World War II']
+
+    def _run(self, options, titles, recorder):
+        lock = threading.Lock()
+        http = {'generate': [], 'status': [], 'comic': []}
+        jobs = []
+
+        def timed(bucket, call):
+            start = time.perf_counter()
+            response = call()
+            with lock:
+                http[bucket].append(time.perf_counter() - start)
+            return response
+
+        def session(index, priority='interactive'):
+            # One address per session, so the scheduler treats sessions as separate clients
+            client = Client(REMOTE_ADDR=f"10.{priority == 'batch':d}.{index // 250}.{index % 250 + 1}")
+            title = titles[index % len(titles)]
+            batch = priority == 'batch'
+            started = time.perf_counter()
+            response = timed('generate', lambda: client.post(
+                reverse('api_generate_comic'),
+                data=json.dumps({
+                    'title': title,
+                    'num_scenes': options['batch_num_scenes'] if batch else options['num_scenes'],
+                    'target_length': 'long' if batch else options['target_length'],
+                    'priority': priority,
+                    # Measure generation, not reuse of an earlier comic of the same title
+                    'fresh': True,
+                }),
+                content_type='application/json',
+            ))
+            state = {}
+            if response.status_code == 200:
+                request_id = response.json()['request_id']
+                deadline = started + options['session_timeout']
+                while state.get('status') not in TERMINAL_STATES:
+                    if time.perf_counter() >= deadline:
+                        # A lost job (or a status that never appears) must not hang the run
+                        state = {'status': 'TIMEOUT', 'comic_id': state.get('comic_id')}
+                        break
+                    time.sleep(options['poll_interval'])
+                    response = timed('status', lambda: client.get(reverse('api_check_status', args=[request_id])))
+                    if response.status_code == 200:
+                        state = response.json()
+            else:
+                state = {'status': f'HTTP {response.status_code}'}
+            finished = time.perf_counter()
+            if state.get('comic_id'):
+                timed('comic', lambda: client.get(reverse('api_get_comic', args=[state['comic_id']])))
+            with lock:
+                jobs.append({'status': state.get('status'), 'seconds': finished - started, 'priority': priority})
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(options['batch_jobs'], 1)) as backfill:
+            batch_sessions = [backfill.submit(session, index, 'batch') for index in range(options['batch_jobs'])]
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                list(pool.map(session, range(options['jobs'])))
+            interactive_wall = time.perf_counter() - wall_start
+            for future in batch_sessions:
+                future.result()
+        wall = time.perf_counter() - wall_start
+        # Batch jobs are a background load; throughput and utilization describe the interactive sessions
+        batch_jobs = [job for job in jobs if job['priority'] == 'batch']
+        jobs = [job for job in jobs if job['priority'] == 'interactive']
+
+        upstream, upstream_errors = recorder.snapshot()
+        busy = sum(job['seconds'] for job in jobs)
+        completed = [job for job in jobs if job['status'] == 'COMPLETED']
+        wall, total_wall = interactive_wall, wall
+
+        def summary(samples):
+            return {
+                'count': len(samples),
+                'p50': percentile(samples, 50),
+                'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99),
+            }
+
+        return {
+            'jobs': len(jobs),
+            'completed': len(completed),
+            'failed': len(jobs) - len(completed),
+            'timed_out': sum(1 for job in jobs + batch_jobs if job['status'] == 'TIMEOUT'),
+            'wall_seconds': wall,
+            'batch_jobs': len(batch_jobs),
+            'batch_completed': sum(1 for job in batch_jobs if job['status'] == 'COMPLETED'),
+            'total_wall_seconds': total_wall,
+            'throughput_jobs_per_minute': 60.0 * len(completed) / wall if wall else 0.0,
+            'mean_jobs_in_flight': busy / wall if wall else 0.0,
+            'worker_utilization': busy / (wall * options['concurrency']) if wall else 0.0,
+            'stages': dict(
+                [('job.end_to_end', summary([job['seconds'] for job in jobs]))]
+                + ([('job.batch_end_to_end', summary([job['seconds'] for job in batch_jobs]))] if batch_jobs else [])
+                + [(f'http.{name}', summary(samples)) for name, samples in http.items()]
+                + [(name, summary(samples)) for name, samples in sorted(upstream.items())]
+            ),
+            'upstream_errors': upstream_errors,
+        }
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"{report['completed']}/{report['jobs']} comics completed in {report['wall_seconds']:.2f}s "
+            f"({report['throughput_jobs_per_minute']:.1f} comics/min, "
+            f"worker utilization {report['worker_utilization']:.0%}, "
+            f"{report['mean_jobs_in_flight']:.2f} jobs in flight on average)"
+        )
+        if report['timed_out']:
+            self.stdout.write(self.style.WARNING(
+                f"{report['timed_out']} session(s) gave up waiting after --session-timeout"
+            ))
+        if report['batch_jobs']:
+            self.stdout.write(
+                f"{report['batch_completed']}/{report['batch_jobs']} batch comics completed alongside "
+                f"(all done after {report['total_wall_seconds']:.2f}s)"
+            )
+        self.stdout.write(f"{'stage':<24}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+        for name, stats in report['stages'].items():
+            self.stdout.write(
+                f"{name:<24}{stats['count']:>8}{stats['p50'] * 1000:>12.1f}"
+                f"{stats['p95'] * 1000:>12.1f}{stats['p99'] * 1000:>12.1f}"
+            )
+        for name, count in sorted(report['upstream_errors'].items()):
+            self.stdout.write(self.style.WARNING(f"{name}: {count} injected failures"))
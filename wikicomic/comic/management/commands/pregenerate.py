@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from comic.autocomplete import SNAPSHOT_FILENAME
+from comic.models import COMIC_OPTION_FIELDS
+
+TERMINAL_STATES = ('COMPLETED', 'ERROR', 'CANCELLED')
+
+# What the API fills in for options a request leaves out
+DEFAULT_OPTIONS = {
+    'comic_style': 'comic book',
+    'target_length': 'medium',
+    'num_scenes': 8,
+    'age_group': 'general',
+    'education_level': 'standard',
+}
+
+
+class Command(BaseCommand):
+    help = ("Pre-generate comics for popular topics through a running server's API, so the first "
+            "request for them is served from the comic store. Topics come from arguments, a file or "
+            "the popularity snapshot; option combinations from the flags or the comics already generated.")
+
+    def add_arguments(self, parser):
+        default_data_dir = os.path.join(getattr(settings, 'BASE_DIR', os.getcwd()), 'data')
+        parser.add_argument('topics', nargs='*', help='Article titles')
+        parser.add_argument('--file', help='File with one title per line (# starts a comment)')
+        parser.add_argument('--popular', type=int, default=0,
+                            help='Also take the N most generated titles from the popularity snapshot')
+        parser.add_argument('--data-dir', default=default_data_dir)
+        parser.add_argument('--server', default='http://127.0.0.1:8000/comic', help='Base URL of the comic app')
+        parser.add_argument('--combos', type=int, default=0,
+                            help="Use the N most common option combinations among the server's comics")
+        parser.add_argument('--comic-style', action='append', help='Style to generate (repeatable)')
+        parser.add_argument('--target-length', action='append', help='Target length to generate (repeatable)')
+        parser.add_argument('--num-scenes', type=int)
+        parser.add_argument('--concurrency', type=int, default=2, help='Comics generating at once')
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--timeout', type=float, default=1800.0, help='Seconds to wait for one comic')
+        parser.add_argument('--dry-run', action='store_true', help='List the planned comics without generating them')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be positive')
+        self.server = options['server'].rstrip('/')
+        self.http = requests.Session()
+
+        topics = self._topics(options)
+        if not topics:
+            raise CommandError('No topics: pass titles, --file or --popular')
+        combos = self._combos(options)
+
+        # Nothing is recorded between runs: comics live in the server's memory, so only the server knows
+        # which are still there, and it answers a finished one with its reuse response at once
+        plan = [(title, combo) for title in topics for combo in combos]
+        self.stdout.write(f"{len(plan)} comics planned ({len(topics)} topics x {len(combos)} option sets)")
+        if options['dry_run']:
+            for title, combo in plan:
+                self.stdout.write(f"  {title}: {json.dumps(combo, sort_keys=True)}")
+            return
+
+        lock = threading.Lock()
+        results = Counter()
+
+        def run(item):
+            title, combo = item
+            outcome, detail = self._generate(title, combo, options)
+            with lock:
+                results[outcome] += 1
+            style = self.style.SUCCESS if outcome in ('generated', 'reused') else self.style.WARNING
+            self.stdout.write(style(f"{outcome:<10} {title} ({combo['comic_style']}, {combo['target_length']}): {detail}"))
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(run, plan))
+        self.stdout.write(', '.join(f"{count} {outcome}" for outcome, count in sorted(results.items())) or 'Nothing to do')
+
+    def _topics(self, options):
+        topics = list(options['topics'])
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                topics.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+        if options['popular']:
+            path = os.path.join(options['data_dir'], SNAPSHOT_FILENAME)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    counts = json.load(f).get('titles', {})
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read the popularity snapshot {path}: {e}")
+            popular = sorted((t for t, n in counts.items() if n > 0), key=lambda t: (-counts[t], t))
+            topics.extend(popular[:options['popular']])
+        seen = set()
+        return [t for t in topics if not (t.casefold() in seen or seen.add(t.casefold()))]
+
+    def _combos(self, options):
+        """Option sets to generate: the most common ones on the server, or the flags crossed with each other"""
+        if options['combos']:
+            counts = Counter()
+            cursor = None
+            while True:
+                params = {'status': 'completed', 'limit': 100}
+                if cursor:
+                    params['cursor'] = cursor
+                response = self.http.get(f"{self.server}/api/comics/", params=params, timeout=30)
+                response.raise_for_status()
+                page = response.json()
+                for comic in page['results']:
+                    counts[tuple(comic.get(f) or DEFAULT_OPTIONS[f] for f in COMIC_OPTION_FIELDS)] += 1
+                cursor = page.get('next_cursor')
+                if not cursor:
+                    break
+            combos = [dict(zip(COMIC_OPTION_FIELDS, values)) for values, _ in counts.most_common(options['combos'])]
+            if combos:
+                return combos
+        styles = options['comic_style'] or [DEFAULT_OPTIONS['comic_style']]
+        lengths = options['target_length'] or [DEFAULT_OPTIONS['target_length']]
+        return [dict(DEFAULT_OPTIONS, comic_style=style, target_length=length,
+                     num_scenes=options['num_scenes'] or DEFAULT_OPTIONS['num_scenes'])
+                for style in styles for length in lengths]
+
+    def _generate(self, title, combo, options):
+        """Submit one comic at batch priority and wait for it; returns (outcome, detail)"""
+        try:
+            response = self.http.post(f"{self.server}/api/generate/",
+                                      json=dict(combo, title=title, priority='batch'), timeout=30)
+            response.raise_for_status()
+            started = response.json()
+            if started.get('reused'):
+                return 'reused', f"comic {started['comic_id']}"
+            deadline = time.monotonic() + options['timeout']
+            while time.monotonic() < deadline:
+                time.sleep(options['poll_interval'])
+                response = self.http.get(f"{self.server}/api/status/{started['request_id']}/", timeout=30)
+                if response.status_code != 200:
+                    continue
+                state = response.json()
+                if state.get('status') == 'COMPLETED':
+                    return self._check_scenes(state['comic_id'])
+                if state.get('status') in TERMINAL_STATES:
+                    return 'failed', state.get('message', state.get('status'))
+            self.http.post(f"{self.server}/api/status/{started['request_id']}/cancel/", timeout=30)
+            return 'failed', f"timed out after {options['timeout']:.0f}s"
+        except (requests.RequestException, ValueError, KeyError) as e:
+            return 'failed', str(e)
+
+    def _check_scenes(self, comic_id):
+        """Outcome of a completed comic: 'partial' if some renders failed, so the server will not reuse it"""
+        response = self.http.get(f"{self.server}/api/comic/{comic_id}/", params={'sections': 'none'}, timeout=30)
+        response.raise_for_status()
+        comic = response.json()
+        scenes, expected = len(comic['scenes']), comic.get('expected_scenes') or 0
+        if scenes < expected:
+            return 'partial', f"comic {comic_id} has {scenes} of {expected} scenes"
+        return 'generated', f"comic {comic_id}"
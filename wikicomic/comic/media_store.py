@@ -0,0 +1,120 @@
+"""
+Content-addressed storage for generated comic panels.
+
+Panels are stored once per distinct image under
+`MEDIA_ROOT/comic_media/<ab>/<cd>/<sha256>.png`, where `ab` and `cd` are the
+first two byte pairs of the hash, so no directory grows past a few thousand
+entries. Scenes reference panels by hash. Two comics of the same article can
+no longer overwrite each other's files, and identical panels share one file.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from django.conf import settings
+
+from . import metrics
+from .persistence import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIX = 'comic_media'
+
+# Bound on remembered touch times; past it the map starts over
+MAX_TOUCHED = 1_000_000
+
+MEDIA_WRITES = metrics.REGISTRY.register(metrics.Counter(
+    'comic_media_writes_total', 'Panel stores by result (written or deduplicated).', ['result']))
+MEDIA_BYTES_WRITTEN = metrics.REGISTRY.register(metrics.Counter(
+    'comic_media_bytes_written_total', 'Bytes of panel images written to disk.'))
+
+
+class MediaStore:
+    def __init__(self, root: str, prefix: str = MEDIA_PREFIX):
+        """
+        Sharded, content-addressed file store
+
+        Args:
+            root: Directory relative paths are resolved against (MEDIA_ROOT)
+            prefix: Subdirectory of `root` holding the shards
+        """
+        self.root = root
+        self.prefix = prefix
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def relative_path(self, digest: str, ext: str = 'png') -> str:
+        """Path of a stored object relative to the root (what scenes keep as `image`)"""
+        return '/'.join((self.prefix, digest[:2], digest[2:4], f'{digest}.{ext}'))
+
+    def absolute_path(self, digest: str, ext: str = 'png') -> str:
+        return os.path.join(self.root, *self.relative_path(digest, ext).split('/'))
+
+    def exists(self, digest: str, ext: str = 'png') -> bool:
+        """Whether an object is stored; always asks the disk, since the garbage collector may have removed it"""
+        return os.path.exists(self.absolute_path(digest, ext))
+
+    def touch(self, relative_path: str, interval: float = 3600.0) -> None:
+        """
+        Record that a stored file was served by bumping its mtime, which the garbage collector uses as last access
+
+        Args:
+            relative_path: Path relative to the root, as kept in a scene's `image`
+            interval: Minimum seconds between two touches of the same file
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._touched.get(relative_path)
+            if last is not None and now - last < interval:
+                return
+            if len(self._touched) >= MAX_TOUCHED:
+                self._touched.clear()
+            self._touched[relative_path] = now
+        try:
+            os.utime(os.path.join(self.root, *relative_path.split('/')))
+        except OSError:
+            pass
+
+    def put(self, data: bytes, ext: str = 'png') -> Tuple[str, str]:
+        """
+        Store bytes under their SHA-256, writing only if no identical object exists
+
+        Args:
+            data: Object content
+            ext: File extension
+
+        Returns:
+            (digest, relative path)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.absolute_path(digest, ext)
+        try:
+            # Existing object: reuse it and bump its last access, so the GC grace period covers the new reference
+            os.utime(path)
+            MEDIA_WRITES.inc(result='deduplicated')
+            return digest, self.relative_path(digest, ext)
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent writers of the same object race harmlessly: both renames install identical bytes
+        atomic_write(path, data)
+        MEDIA_WRITES.inc(result='written')
+        MEDIA_BYTES_WRITTEN.inc(len(data))
+        return digest, self.relative_path(digest, ext)
+
+
+_stores: Dict[str, MediaStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_media_store() -> MediaStore:
+    """Process-wide media store under MEDIA_ROOT"""
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = MediaStore(root)
+        return _stores[root]
@@ -0,0 +1,210 @@
+"""
+Process-local metrics for the comic pipeline, rendered in the Prometheus text format.
+
+Counters, gauges and histograms are registered once at import time and are
+safe to update from the generation threads. `JobTimings` records the
+duration of each pipeline stage on the job itself (returned by the status
+API) and feeds the same observations into the stage histogram.
+"""
+import bisect
+import contextlib
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}'] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every registered metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+JOBS_STARTED = REGISTRY.register(Counter(
+    'comic_jobs_started_total', 'Comic generation jobs started.'))
+JOBS = REGISTRY.register(Counter(
+    'comic_jobs_total', 'Finished comic generation jobs by outcome.', ['outcome']))
+JOB_SECONDS = REGISTRY.register(Histogram(
+    'comic_job_seconds', 'End-to-end duration of comic generation jobs.', ['outcome']))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'comic_stage_seconds', 'Duration of each comic generation stage.', ['stage']))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'comic_cache_requests_total', 'Cache lookups by cache and result (hit or miss).', ['cache', 'result']))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    'comic_upstream_errors_total', 'Failed calls to upstream services.', ['service']))
+LLM_TOKENS = REGISTRY.register(Counter(
+    'comic_llm_tokens_total', 'LLM tokens used by generation stage and kind (prompt or completion).', ['stage', 'kind']))
+LLM_TRUNCATIONS = REGISTRY.register(Counter(
+    'comic_llm_truncations_total', 'LLM responses cut off by the max_tokens budget.', ['stage']))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count one cache lookup"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+class JobTimings:
+    """Per-stage durations of one generation job"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.images: List[Dict[str, float]] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, scene: Optional[int] = None):
+        """
+        Time a block as a pipeline stage
+
+        Args:
+            name: Stage name (fetch, storyline, prompts, image, persistence, ...)
+            scene: Scene number, for per-panel image timings
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, scene)
+
+    def add(self, name: str, seconds: float, scene: Optional[int] = None) -> None:
+        """Record a stage duration; repeated stages accumulate"""
+        STAGE_SECONDS.observe(seconds, stage=name)
+        with self._lock:
+            if scene is not None:
+                self.images.append({'scene': scene, 'seconds': round(seconds, 4)})
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict:
+        """Serializable snapshot for the job status"""
+        with self._lock:
+            data = {name: round(seconds, 4) for name, seconds in self.stages.items()}
+            data['images'] = list(self.images)
+        data['total'] = round(self.elapsed(), 4)
+        return data
@@ -1,21 +1,52 @@
+import base64
+import bisect
 import datetime
 import json
 import os
+import threading
+from collections import OrderedDict
 from django.conf import settings
 
+from . import storage_gc
+
+# Generation options recorded on each comic (used for listing filters and display)
+COMIC_OPTION_FIELDS = ('comic_style', 'target_length', 'num_scenes', 'age_group', 'education_level')
+
 # In-memory storage for comics
 class ComicStore:
     _comics = {}
     _next_id = 1
+    # Serialized API payloads, least recently used first: {(comic_id, variant): (etag, payload)}
+    _payload_cache = OrderedDict()
+    # comic_id -> variants cached for it, so a change to the comic drops all of them
+    _payload_variants = {}
+    _payload_lock = threading.Lock()
+    # Listing indexes: (created_at, numeric id, id) and (casefolded title, created_at, numeric id, id), both sorted
+    _created_index = []
+    _title_index = []
+    # Sorted (created_at, numeric id, id) keys per status and per comic_style, for filtered listings
+    _status_index = {}
+    _style_index = {}
+    _index_lock = threading.RLock()
+    # comic_id -> [condition, number of waiters], only while someone long-polls that comic;
+    # notified when the comic gains a scene or changes status
+    _waiters = {}
+    _waiters_lock = threading.Lock()
 
     @classmethod
     def save_comic(cls, data):
         """Save comic data to in-memory storage"""
-        if '_id' not in data:
-            data['_id'] = str(cls._next_id)
-            cls._next_id += 1
-        
-        cls._comics[data['_id']] = data
+        with cls._index_lock:
+            if '_id' not in data:
+                data['_id'] = str(cls._next_id)
+                cls._next_id += 1
+            
+            if data['_id'] in cls._comics:
+                cls._unindex(cls._comics[data['_id']])
+            cls._comics[data['_id']] = data
+            cls._index(data)
+        cls.invalidate_payloads(data['_id'])
+        storage_gc.pins_changed()
         return data['_id']
 
     @classmethod
@@ -27,7 +58,16 @@ class ComicStore:
     def update_comic(cls, comic_id, data):
         """Update comic data in in-memory storage"""
         if comic_id in cls._comics:
-            cls._comics[comic_id].update(data)
+            with cls._index_lock:
+                reindex = any(field in data for field in ('title', 'created_at', 'status', 'comic_style'))
+                if reindex:
+                    cls._unindex(cls._comics[comic_id])
+                cls._comics[comic_id].update(data)
+                if reindex:
+                    cls._index(cls._comics[comic_id])
+            if 'updated_at' not in data:
+                cls._comics[comic_id]['updated_at'] = datetime.datetime.now().isoformat()
+            cls.invalidate_payloads(comic_id)
             return True
         return False
 
@@ -37,11 +77,10 @@ class ComicStore:
         return list(cls._comics.values())
     
     @classmethod
-    def create_comic(cls, title, wikipedia_url, storyline):
+    def create_comic(cls, title, wikipedia_url, storyline, options=None):
         """Create a new comic in in-memory storage"""
         now = datetime.datetime.now().isoformat()
         comic_data = {
-            '_id': str(cls._next_id),
             'title': title,
             'wikipedia_url': wikipedia_url,
             'storyline': storyline,
@@ -51,26 +90,247 @@ class ComicStore:
             'error_message': None,
             'scenes': []
         }
-        cls._next_id += 1
-        cls._comics[comic_data['_id']] = comic_data
+        for field in COMIC_OPTION_FIELDS:
+            if options and field in options:
+                comic_data[field] = options[field]
+        with cls._index_lock:
+            comic_data['_id'] = str(cls._next_id)
+            cls._next_id += 1
+            cls._comics[comic_data['_id']] = comic_data
+            cls._index(comic_data)
+        storage_gc.pins_changed()
         return comic_data['_id']
+
+    @classmethod
+    def _created_key(cls, comic):
+        return (comic['created_at'], int(comic['_id']) if comic['_id'].isdigit() else 0, comic['_id'])
+
+    @classmethod
+    def _title_key(cls, comic):
+        return (comic['title'].casefold(),) + cls._created_key(comic)
+
+    @classmethod
+    def _index(cls, comic):
+        key = cls._created_key(comic)
+        bisect.insort(cls._created_index, key)
+        bisect.insort(cls._title_index, cls._title_key(comic))
+        bisect.insort(cls._status_index.setdefault(comic.get('status'), []), key)
+        bisect.insort(cls._style_index.setdefault(comic.get('comic_style'), []), key)
+
+    @classmethod
+    def _unindex(cls, comic):
+        key = cls._created_key(comic)
+        indexes = [(cls._created_index, key), (cls._title_index, cls._title_key(comic))]
+        for by_value, value in ((cls._status_index, comic.get('status')), (cls._style_index, comic.get('comic_style'))):
+            if value in by_value:
+                indexes.append((by_value[value], key))
+        for index, entry in indexes:
+            position = bisect.bisect_left(index, entry)
+            if position < len(index) and index[position] == entry:
+                del index[position]
+        for by_value, value in ((cls._status_index, comic.get('status')), (cls._style_index, comic.get('comic_style'))):
+            if value in by_value and not by_value[value]:
+                del by_value[value]
+
+    @classmethod
+    def summarize(cls, comic):
+        """Lightweight listing entry for a comic (no storyline or prompts)"""
+        scenes = comic.get('scenes') or []
+        summary = {
+            'id': comic['_id'],
+            'title': comic['title'],
+            'status': comic['status'],
+            'scene_count': len(scenes),
+            'cover_image': scenes[0]['image'] if scenes else None,
+            'created_at': comic['created_at'],
+            'updated_at': comic['updated_at']
+        }
+        for field in COMIC_OPTION_FIELDS:
+            summary[field] = comic.get(field)
+        return summary
+
+    @staticmethod
+    def encode_cursor(key):
+        """Opaque pagination cursor for an index key"""
+        return base64.urlsafe_b64encode(json.dumps(list(key[-3:])).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor from encode_cursor; raises ValueError if it is malformed"""
+        try:
+            created_at, number, comic_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return (str(created_at), int(number), str(comic_id))
+        except Exception:
+            raise ValueError('Invalid cursor')
+
+    @classmethod
+    def list_comics(cls, limit=20, cursor=None, status=None, style=None, title_prefix=None,
+                    created_after=None, created_before=None):
+        """
+        List comic summaries, newest first, using the sorted indexes instead of copying every comic
+        
+        Args:
+            limit: Maximum number of summaries to return
+            cursor: Cursor returned as next_cursor by the previous page
+            status: Only comics with this status
+            style: Only comics with this comic_style
+            title_prefix: Only comics whose title starts with this (case-insensitive)
+            created_after: ISO timestamp; only comics created at or after it
+            created_before: ISO timestamp; only comics created before it
+            
+        Returns:
+            Tuple of (list of summaries, next cursor or None)
+        """
+        upper = cls.decode_cursor(cursor) if cursor else None
+        prefix = title_prefix.casefold() if title_prefix else None
+        with cls._index_lock:
+            # Walk the smallest index that covers one of the filters; the other filters are checked per comic
+            choices = []
+            if status:
+                choices.append(cls._status_index.get(status, []))
+            if style:
+                choices.append(cls._style_index.get(style, []))
+            if prefix:
+                start = bisect.bisect_left(cls._title_index, (prefix,))
+                matching = []
+                for key in cls._title_index[start:]:
+                    if not key[0].startswith(prefix):
+                        break
+                    matching.append(key[1:])
+                matching.sort()
+                choices.append(matching)
+            candidates = min(choices, key=len) if choices else cls._created_index
+            
+            # Narrow to the created range and the cursor with bisect, then walk backwards (newest first)
+            low = bisect.bisect_left(candidates, (created_after,)) if created_after else 0
+            high = len(candidates)
+            if created_before:
+                high = bisect.bisect_left(candidates, (created_before,))
+            if upper:
+                high = min(high, bisect.bisect_left(candidates, upper))
+            
+            results = []
+            last_key = None
+            has_more = False
+            position = high - 1
+            while position >= low:
+                key = candidates[position]
+                position -= 1
+                comic = cls._comics.get(key[2])
+                if not comic:
+                    continue
+                if status and comic.get('status') != status:
+                    continue
+                if style and comic.get('comic_style') != style:
+                    continue
+                if prefix and not comic['title'].casefold().startswith(prefix):
+                    continue
+                if len(results) == limit:
+                    # One more match exists, so the cursor leads to a non-empty page
+                    has_more = True
+                    break
+                results.append(cls.summarize(comic))
+                last_key = key
+        return results, (cls.encode_cursor(last_key) if has_more else None)
     
     @classmethod
-    def add_scene(cls, comic_id, scene_number, prompt, image_path):
-        """Add a scene to a comic in in-memory storage"""
+    def find_completed(cls, title, options):
+        """
+        Newest completed comic of a title generated with the same options and every planned scene
+        
+        A comic whose renders partly failed still completes with fewer scenes than `expected_scenes`;
+        it is never handed out for reuse. Only this worker's comics are searched.
+        
+        Args:
+            title: Article title (case-insensitive)
+            options: Generation options; every COMIC_OPTION_FIELDS value must match
+            
+        Returns:
+            The comic's ID, or None
+        """
+        key = title.casefold()
+        wanted = {field: options.get(field) for field in COMIC_OPTION_FIELDS}
+        with cls._index_lock:
+            start = bisect.bisect_left(cls._title_index, (key,))
+            end = bisect.bisect_left(cls._title_index, (key + '\0',))
+            for entry in reversed(cls._title_index[start:end]):
+                comic = cls._comics.get(entry[-1])
+                if comic and comic['title'].casefold() == key and comic['status'] == 'completed' \
+                        and comic.get('scenes') and all(comic.get(f) == v for f, v in wanted.items()) \
+                        and len(comic['scenes']) >= (comic.get('expected_scenes') or comic.get('num_scenes') or 0):
+                    return comic['_id']
+        return None
+
+    @classmethod
+    def add_scene(cls, comic_id, scene_number, prompt, image_path, image_hash=None):
+        """Add a scene to a comic in in-memory storage; `image_hash` is the panel's key in the media store"""
         if comic_id in cls._comics:
             scene_data = {
                 'scene_number': scene_number,
                 'prompt': prompt,
                 'image': image_path,
+                'image_hash': image_hash,
                 'created_at': datetime.datetime.now().isoformat()
             }
             if 'scenes' not in cls._comics[comic_id]:
                 cls._comics[comic_id]['scenes'] = []
             cls._comics[comic_id]['scenes'].append(scene_data)
+            cls._comics[comic_id]['updated_at'] = scene_data['created_at']
+            cls.invalidate_payloads(comic_id)
+            cls._notify(comic_id)
+            storage_gc.pins_changed()
             return True
         return False
 
+    @classmethod
+    def _notify(cls, comic_id):
+        with cls._waiters_lock:
+            entry = cls._waiters.get(comic_id)
+        if entry is not None:
+            with entry[0]:
+                entry[0].notify_all()
+
+    @classmethod
+    def wait_for_scenes(cls, comic_id, count, timeout):
+        """
+        Block until a comic has more than `count` scenes or is no longer pending
+        
+        Args:
+            comic_id: Comic to watch
+            count: Number of scenes the caller already has
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            True if the comic changed, False on timeout or if it does not exist
+        """
+        def ready():
+            comic = cls._comics.get(comic_id)
+            return comic is None or comic['status'] != 'pending' or len(comic.get('scenes', [])) > count
+        with cls._waiters_lock:
+            entry = cls._waiters.setdefault(comic_id, [threading.Condition(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                entry[0].wait_for(ready, timeout)
+        finally:
+            with cls._waiters_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del cls._waiters[comic_id]
+        comic = cls._comics.get(comic_id)
+        return comic is not None and (comic['status'] != 'pending' or len(comic.get('scenes', [])) > count)
+
+    @classmethod
+    def live_references(cls):
+        """Media paths and article titles used by comics in memory; published as garbage collection pins"""
+        with cls._index_lock:
+            comics = list(cls._comics.values())
+        media, titles = set(), set()
+        for comic in comics:
+            titles.add(comic['title'])
+            media.update(scene['image'] for scene in comic.get('scenes', []))
+        return media, titles
+
     @classmethod
     def get_scenes(cls, comic_id):
         """Get scenes for a comic from in-memory storage"""
@@ -88,6 +348,48 @@ class ComicStore:
             }
             if error_message is not None:
                 update_data['error_message'] = error_message
-            cls._comics[comic_id].update(update_data)
+            with cls._index_lock:
+                cls._unindex(cls._comics[comic_id])
+                cls._comics[comic_id].update(update_data)
+                cls._index(cls._comics[comic_id])
+            cls.invalidate_payloads(comic_id)
+            cls._notify(comic_id)
             return True
         return False
+
+    @classmethod
+    def get_cached_payload(cls, comic_id, variant, etag):
+        """Get a serialized payload for a comic if it was cached for the given ETag"""
+        with cls._payload_lock:
+            cached = cls._payload_cache.get((comic_id, variant))
+            if cached and cached[0] == etag:
+                cls._payload_cache.move_to_end((comic_id, variant))
+                return cached[1]
+        return None
+
+    @classmethod
+    def cache_payload(cls, comic_id, variant, etag, payload):
+        """
+        Cache a serialized payload for a comic; it is dropped on the next change to the comic
+        
+        At most COMIC_PAYLOAD_CACHE_SIZE payloads (default 1000) are kept; the least recently used go first.
+        """
+        limit = getattr(settings, 'COMIC_PAYLOAD_CACHE_SIZE', 1000)
+        with cls._payload_lock:
+            cls._payload_cache[(comic_id, variant)] = (etag, payload)
+            cls._payload_cache.move_to_end((comic_id, variant))
+            cls._payload_variants.setdefault(comic_id, set()).add(variant)
+            while len(cls._payload_cache) > limit:
+                (evicted_id, evicted_variant), _ = cls._payload_cache.popitem(last=False)
+                variants = cls._payload_variants.get(evicted_id)
+                if variants is not None:
+                    variants.discard(evicted_variant)
+                    if not variants:
+                        del cls._payload_variants[evicted_id]
+
+    @classmethod
+    def invalidate_payloads(cls, comic_id):
+        """Drop every cached payload for a comic"""
+        with cls._payload_lock:
+            for variant in cls._payload_variants.pop(comic_id, ()):
+                cls._payload_cache.pop((comic_id, variant), None)
@@ -0,0 +1,160 @@
+"""
+Write-behind persistence for extracted Wikipedia articles.
+
+`WikipediaExtractor._save_extracted_data` hands page data to an
+`ArticlePersister`, which stores it in the article archive on a background
+thread so the request path never blocks on disk. Writes are coalesced per
+title while queued and skipped when the content has not changed since the
+last write. `atomic_write` is shared by the other on-disk stores.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from . import metrics
+from .archive import ArticleArchive, get_archive
+
+logger = logging.getLogger(__name__)
+
+# Fields persisted; references, links and images were never read back
+PERSISTED_FIELDS = ('title', 'url', 'content', 'summary', 'categories', 'revision_id', 'timestamp')
+
+ARTICLE_WRITES = metrics.REGISTRY.register(metrics.Counter(
+    'comic_article_writes_total', 'Article persistence attempts by result (written, unchanged or failed).', ['result']))
+ARTICLE_QUEUE = metrics.REGISTRY.register(metrics.Gauge(
+    'comic_article_write_queue', 'Articles waiting to be written by the write-behind persister.'))
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    Write bytes to a file so that readers see either the old or the new content, never a mix
+
+    Args:
+        path: Destination path; its directory must exist
+        data: Content to write
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ArticlePersister:
+    # Content digests remembered for the change check; older titles fall back to the archived revision_id
+    MAX_DIGESTS = 10000
+
+    def __init__(self, archive: ArticleArchive):
+        """
+        Background writer for extracted article data
+
+        Args:
+            archive: Archive the articles are stored in
+        """
+        self.archive = archive
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # title -> digest of the last write, least recently written first
+        self._digests: 'OrderedDict[str, str]' = OrderedDict()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._thread = threading.Thread(target=self._run, name='article-persister', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush, 5.0)
+
+    def submit(self, page_info: Dict[str, Any]) -> None:
+        """
+        Queue an article for writing; a newer submission for the same title replaces a queued one
+
+        Args:
+            page_info: Article data as returned by `WikipediaExtractor.get_page_info`
+        """
+        record = {field: page_info[field] for field in PERSISTED_FIELDS if field in page_info}
+        with self._cond:
+            self._pending[record['title']] = record
+            ARTICLE_QUEUE.set(len(self._pending))
+            self._cond.notify()
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """Call `callback(record)` on the persister thread after each article is written"""
+        self._listeners.append(callback)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued article is written; returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                title, record = self._pending.popitem()
+                ARTICLE_QUEUE.set(len(self._pending))
+                self._busy = True
+            try:
+                self._write(title, record)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _remember(self, title: str, digest: str) -> None:
+        self._digests[title] = digest
+        self._digests.move_to_end(title)
+        while len(self._digests) > self.MAX_DIGESTS:
+            self._digests.popitem(last=False)
+
+    def _write(self, title: str, record: Dict[str, Any]) -> None:
+        try:
+            # The fetch timestamp changes on every call, so it is left out of the change check
+            content = {k: v for k, v in record.items() if k != 'timestamp'}
+            digest = hashlib.sha1(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+            if title not in self._digests and record.get('revision_id') is not None:
+                # After a restart, an archived copy of the same revision counts as unchanged
+                if self.archive.revision_id(title) == record['revision_id']:
+                    self._remember(title, digest)
+            if self._digests.get(title) == digest:
+                self.archive.touch(title)
+                ARTICLE_WRITES.inc(result='unchanged')
+                return
+
+            self.archive.put(record)
+            self._remember(title, digest)
+            ARTICLE_WRITES.inc(result='written')
+            logger.info(f"Archived extracted data for: {title}")
+        except Exception as e:
+            ARTICLE_WRITES.inc(result='failed')
+            logger.error(f"Failed to save extracted data: {str(e)}")
+            return
+
+        for callback in list(self._listeners):
+            try:
+                callback(record)
+            except Exception as e:
+                logger.error(f"Article listener failed for {title}: {str(e)}")
+
+
+_persisters: Dict[str, ArticlePersister] = {}
+_persisters_lock = threading.Lock()
+
+
+def get_persister(data_dir: str) -> ArticlePersister:
+    """Process-wide persister for the archive in a data directory"""
+    key = os.path.abspath(data_dir)
+    with _persisters_lock:
+        if key not in _persisters:
+            _persisters[key] = ArticlePersister(get_archive(data_dir))
+        return _persisters[key]
@@ -0,0 +1,217 @@
+"""
+Speculative storyline generation while the options page is open.
+
+`comic_options` already fetches the full article (and the archive keeps it),
+so the next expensive step is the storyline, which depends on the article
+and the target length but not on the comic style. When the options page
+renders, a storyline for the default length is started as a batch-priority
+job and its ID is kept in the session. If the user submits that length,
+`generate_comic` picks up the result (waiting for it if it is still
+running, at most until its deadline) instead of asking Groq again; one still
+queued is dropped and the storyline generated inline. Otherwise it is
+cancelled.
+
+Speculation is bounded: at most COMIC_PREFETCH_MAX_INFLIGHT at once, at
+most COMIC_PREFETCH_TOKENS_PER_HOUR LLM tokens per process and hour, each
+run limited to COMIC_PREFETCH_DEADLINE seconds, results kept for
+COMIC_PREFETCH_TTL seconds, and one per session (a new one cancels the
+previous one).
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics, scheduler
+from .jobs import JobCancelled, JobContext
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'prefetch_id'
+
+PREFETCHES = metrics.REGISTRY.register(metrics.Counter(
+    'comic_prefetch_total', 'Speculative storylines by outcome (started, used, wasted, over_budget).', ['outcome']))
+
+
+class Speculation:
+    def __init__(self, title: str, target_length: str, deadline: float):
+        """
+        One speculative storyline
+
+        Args:
+            title: Article title
+            target_length: Storyline length it is generated for
+            deadline: Seconds the generation may take
+        """
+        self.id = uuid.uuid4().hex
+        self.title = title
+        self.target_length = target_length
+        self.job = JobContext(f'prefetch-{self.id}', deadline=deadline)
+        self.created = time.monotonic()
+        self.storyline: Optional[str] = None
+        self.usage: Dict[str, Any] = {}
+        self.claimed = False
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def finish(self, storyline: Optional[str], usage: Optional[Dict[str, Any]] = None) -> None:
+        """Record the outcome; None if generation failed or was cancelled"""
+        self.storyline = storyline
+        self.usage = usage or {}
+        self._done.set()
+
+    def wait(self, job: JobContext) -> Optional[str]:
+        """
+        Wait for the storyline on behalf of a generation job, which stays cancellable meanwhile
+
+        A speculation still queued behind batch work is taken off the scheduler instead, and a
+        running one is waited for no longer than its own remaining deadline.
+
+        Returns:
+            The storyline, or None if the job should generate it itself
+        """
+        if scheduler.get_scheduler().remove(self.job.job_id):
+            self.job.cancel('not started')
+            self.finish(None)
+            return None
+        until = time.monotonic() + self.job.timeout('storyline')
+        while not self._done.wait(0.2):
+            job.check()
+            if time.monotonic() >= until:
+                self.job.cancel('deadline')
+                return None
+        return self.storyline
+
+
+class Prefetcher:
+    def __init__(self, max_inflight: int = 4, tokens_per_hour: int = 100000, deadline: float = 60.0,
+                 ttl: float = 300.0):
+        """
+        Registry and budget of speculative storylines
+
+        Args:
+            max_inflight: Speculations running or queued at once
+            tokens_per_hour: LLM tokens speculation may spend per rolling hour
+            deadline: Seconds one speculation may take
+            ttl: Seconds an unclaimed speculation is kept
+        """
+        self.max_inflight = max_inflight
+        self.tokens_per_hour = tokens_per_hour
+        self.deadline = deadline
+        self.ttl = ttl
+        self._speculations: Dict[str, Speculation] = {}
+        self._spent: deque = deque()  # (monotonic time, tokens)
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        for key, speculation in list(self._speculations.items()):
+            if now - speculation.created > self.ttl:
+                self._discard(key)
+        while self._spent and now - self._spent[0][0] > 3600:
+            self._spent.popleft()
+
+    def _discard(self, key: str) -> None:
+        speculation = self._speculations.pop(key, None)
+        if speculation is not None and not speculation.claimed:
+            speculation.job.cancel('unused')
+            PREFETCHES.inc(outcome='wasted')
+
+    def start(self, session: Any, title: str, target_length: str, run: Callable[[Speculation], None],
+              client: str = '') -> Optional[Speculation]:
+        """
+        Start a speculative storyline for a session, replacing the session's previous one
+
+        Args:
+            session: Django session the speculation is attached to
+            title: Article title
+            target_length: Length to generate for
+            run: Job body; must call `Speculation.finish`
+            client: Requester key for the scheduler
+
+        Returns:
+            The speculation, or None if the budget is exhausted
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            previous = session.pop(SESSION_KEY, None)
+            if previous:
+                self._discard(previous)
+            inflight = sum(1 for s in self._speculations.values() if not s.done)
+            spent = sum(tokens for _, tokens in self._spent)
+            if inflight >= self.max_inflight or spent >= self.tokens_per_hour:
+                PREFETCHES.inc(outcome='over_budget')
+                return None
+            speculation = Speculation(title, target_length, self.deadline)
+            self._speculations[speculation.id] = speculation
+        session[SESSION_KEY] = speculation.id
+        PREFETCHES.inc(outcome='started')
+        scheduler.get_scheduler().submit(
+            speculation.job.job_id, self._run, (speculation, run), client=client,
+            priority=scheduler.BATCH, cost=scheduler.BASE_COST
+        )
+        return speculation
+
+    def _run(self, speculation: Speculation, run: Callable[[Speculation], None]) -> None:
+        try:
+            speculation.job.begin()
+            speculation.job.check()
+            run(speculation)
+        except JobCancelled:
+            pass
+        finally:
+            if not speculation.done:
+                speculation.finish(None)
+            tokens = sum(record.get('total_tokens', 0) for record in speculation.usage.values())
+            if tokens:
+                with self._lock:
+                    self._spent.append((time.monotonic(), tokens))
+
+    def claim(self, session: Any, title: str, target_length: str) -> Optional[Speculation]:
+        """
+        Take the session's speculation if it matches the request; a mismatch is cancelled
+
+        Returns:
+            The speculation, possibly still running, or None
+        """
+        key = session.pop(SESSION_KEY, None)
+        if not key:
+            return None
+        with self._lock:
+            speculation = self._speculations.get(key)
+            if speculation is None or speculation.title != title or speculation.target_length != target_length:
+                self._discard(key)
+                return None
+            if speculation.done and speculation.storyline is None:
+                self._speculations.pop(key)
+                return None
+            speculation.claimed = True
+            self._speculations.pop(key)
+        PREFETCHES.inc(outcome='used')
+        return speculation
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Prefetcher:
+    """Process-wide prefetcher configured by the COMIC_PREFETCH_* settings"""
+    global _prefetcher
+    if _prefetcher is None:
+        from django.conf import settings
+
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher(
+                    max_inflight=getattr(settings, 'COMIC_PREFETCH_MAX_INFLIGHT', 4),
+                    tokens_per_hour=getattr(settings, 'COMIC_PREFETCH_TOKENS_PER_HOUR', 100000),
+                    deadline=getattr(settings, 'COMIC_PREFETCH_DEADLINE', 60),
+                    ttl=getattr(settings, 'COMIC_PREFETCH_TTL', 300),
+                )
+    return _prefetcher
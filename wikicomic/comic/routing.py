@@ -0,0 +1,230 @@
+"""
+Per-stage model routing with fallbacks and hedged requests.
+
+Each LLM or image stage has an ordered list of models (COMIC_MODEL_ROUTES).
+A call goes to the first model. If that call fails, it is retried on the next
+model.
+
+While a call is in flight, it is hedged once it has taken longer than the
+observed p95 latency of its stage and model. A duplicate request is sent and
+the first successful response wins. Hedges draw from a token bucket that
+earns COMIC_HEDGE_RATIO of a token per call. That keeps duplicates to a few
+percent of traffic, even when an upstream slows down as a whole and every
+call crosses the old p95.
+
+Calls made for a generation job stay cancellable and respect its deadlines
+(see `comic.jobs`).
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUTES = {
+    'storyline': ['llama3-8b-8192', 'llama-3.1-8b-instant'],
+    'prompts': ['llama3-8b-8192', 'llama-3.1-8b-instant'],
+    'image': ['gemini-2.0-flash-exp-image-generation', 'gemini-2.0-flash-preview-image-generation'],
+}
+
+# Latencies kept per stage and model, and the fewest needed before hedging on their p95
+WINDOW = 200
+MIN_SAMPLES = 20
+
+ROUTE_CALLS = metrics.REGISTRY.register(metrics.Counter(
+    'comic_model_calls_total', 'Upstream model calls by stage, model and result.', ['stage', 'model', 'result']))
+HEDGES = metrics.REGISTRY.register(metrics.Counter(
+    'comic_hedged_requests_total', 'Hedge decisions by stage and outcome (sent, won, denied).', ['stage', 'outcome']))
+
+
+class LatencyWindow:
+    """Sliding window of recent latencies with a cached percentile"""
+
+    def __init__(self, size: int = WINDOW):
+        self._samples: deque = deque(maxlen=size)
+        self._sorted: List[float] = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                oldest = self._samples[0]
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._samples.append(seconds)
+            bisect.insort(self._sorted, seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile, or None until MIN_SAMPLES latencies were seen"""
+        with self._lock:
+            if len(self._sorted) < MIN_SAMPLES:
+                return None
+            return self._sorted[min(int(len(self._sorted) * pct / 100.0), len(self._sorted) - 1)]
+
+
+class HedgeBudget:
+    def __init__(self, ratio: float = 0.05, burst: float = 10.0):
+        """
+        Token bucket for hedges
+
+        Args:
+            ratio: Tokens earned per call; hedges stay at about this share of calls
+            burst: Most tokens that can be saved up
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.burst)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class ModelRouter:
+    def __init__(self, routes: Dict[str, Sequence[str]], hedging: bool = True, hedge_ratio: float = 0.05,
+                 hedge_percentile: float = 95.0, min_hedge_delay: float = 0.5, workers: int = 32):
+        """
+        Routes calls to per-stage model lists
+
+        Args:
+            routes: Models per stage, in fallback order
+            hedging: Whether slow calls are hedged
+            hedge_ratio: Hedge budget earned per call
+            hedge_percentile: Latency percentile after which a call is hedged
+            min_hedge_delay: Never hedge sooner than this many seconds
+            workers: Threads for in-flight requests
+        """
+        self.routes = {stage: list(models) for stage, models in routes.items()}
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.budget = HedgeBudget(hedge_ratio)
+        self._latency: Dict[Tuple[str, str], LatencyWindow] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='comic-route')
+
+    def models(self, stage: str) -> List[str]:
+        return self.routes.get(stage) or DEFAULT_ROUTES[stage]
+
+    def _window(self, stage: str, model: str) -> LatencyWindow:
+        with self._lock:
+            return self._latency.setdefault((stage, model), LatencyWindow())
+
+    def hedge_delay(self, stage: str, model: str) -> Optional[float]:
+        """Seconds after which a call is hedged, or None while there is too little history"""
+        p = self._window(stage, model).percentile(self.hedge_percentile)
+        return None if p is None else max(p, self.min_hedge_delay)
+
+    def call(self, stage: str, func: Callable[[str, Optional[float]], Any], job: Any = None) -> Any:
+        """
+        Call a stage's models in order until one succeeds, all within one stage timeout
+
+        Args:
+            stage: Stage name (a key of the routes)
+            func: Request taking the model name and a timeout in seconds (None for the client default)
+            job: JobContext of the generation job, if any; its cancellation and deadlines apply
+
+        Returns:
+            The first successful response
+
+        Raises:
+            The last model's error if every model failed, or JobCancelled
+        """
+        from .jobs import JobCancelled
+
+        models = self.models(stage)
+        # The stage's timeout covers the fallbacks too; each model gets what the ones before it left
+        end = time.monotonic() + job.timeout(stage) if job is not None else None
+        for index, model in enumerate(models):
+            try:
+                return self._call_model(stage, model, func, job, end)
+            except JobCancelled:
+                raise
+            except Exception as e:
+                if index == len(models) - 1 or (end is not None and time.monotonic() >= end):
+                    raise
+                logger.warning(f"{stage} call to {model} failed ({str(e)}), falling back to {models[index + 1]}")
+
+    def _call_model(self, stage: str, model: str, func: Callable[[str, Optional[float]], Any], job: Any,
+                    end: Optional[float]) -> Any:
+        if job is not None:
+            job.check()
+        timeout = max(end - time.monotonic(), 0.0) if end is not None else None
+        self.budget.earn()
+
+        def attempt():
+            start = time.monotonic()
+            # A hedge started later gets only what is left of the stage
+            result = func(model, max(end - start, 0.0) if end is not None else None)
+            self._window(stage, model).add(time.monotonic() - start)
+            return result
+
+        primary = self._pool.submit(attempt)
+        pending = {primary}
+        hedge_at = None
+        delay = self.hedge_delay(stage, model) if self.hedging else None
+        if delay is not None:
+            hedge_at = time.monotonic() + delay
+        error = None
+        while pending:
+            now = time.monotonic()
+            slice_end = min(t for t in (now + 0.2, hedge_at, end) if t is not None)
+            done, pending = wait(pending, timeout=max(slice_end - now, 0.0), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    ROUTE_CALLS.inc(stage=stage, model=model, result='error')
+                    continue
+                ROUTE_CALLS.inc(stage=stage, model=model, result='ok')
+                if future is not primary:
+                    HEDGES.inc(stage=stage, outcome='won')
+                return result
+            if job is not None:
+                job.check()
+            if end is not None and time.monotonic() >= end:
+                raise TimeoutError(f"{stage} call to {model} exceeded {timeout:.1f}s")
+            if hedge_at is not None and pending and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if self.budget.spend():
+                    HEDGES.inc(stage=stage, outcome='sent')
+                    logger.info(f"Hedging slow {stage} call to {model}")
+                    pending.add(self._pool.submit(attempt))
+                else:
+                    HEDGES.inc(stage=stage, outcome='denied')
+        raise error
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Process-wide router from COMIC_MODEL_ROUTES, COMIC_HEDGING, COMIC_HEDGE_RATIO and COMIC_HEDGE_PERCENTILE"""
+    global _router
+    if _router is None:
+        from django.conf import settings
+
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter(
+                    dict(DEFAULT_ROUTES, **getattr(settings, 'COMIC_MODEL_ROUTES', {})),
+                    hedging=getattr(settings, 'COMIC_HEDGING', True),
+                    hedge_ratio=getattr(settings, 'COMIC_HEDGE_RATIO', 0.05),
+                    hedge_percentile=getattr(settings, 'COMIC_HEDGE_PERCENTILE', 95.0),
+                )
+    return _router
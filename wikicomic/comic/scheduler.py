@@ -0,0 +1,245 @@
+"""
+Fair-share scheduling for comic generation jobs.
+
+Jobs run on a fixed pool of COMIC_GENERATION_WORKERS threads instead of one
+thread each, so the number of comics competing for the upstream APIs is
+bounded. Waiting jobs are ordered by:
+
+- Priority class: `interactive` jobs (a reader is waiting) always go before
+  `batch` jobs (pre-generation, backfills), and batch jobs may never occupy
+  the last COMIC_INTERACTIVE_RESERVED_WORKERS workers, so an interactive job
+  finds a free worker even while a backfill saturates the rest.
+- Client: within a class, clients share workers by start-time fair queuing.
+  Each job is tagged with the client's virtual finish time plus its expected
+  cost, so a client submitting many long comics is served no faster than one
+  submitting a few short ones.
+- Expected cost: a client's own jobs run shortest first, estimated from
+  `num_scenes` and `target_length`.
+
+The class also applies to the job's image work: `cpu_pool` admits tasks
+from interactive jobs ahead of waiting batch tasks. Queue wait per class is
+exported as `comic_job_queue_wait_seconds`.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+# Relative storyline size per target_length; scale the per-scene cost
+LENGTH_WEIGHTS = {'short': 0.8, 'medium': 1.0, 'long': 1.4}
+# Fetch, storyline and prompt stages, in scene-equivalents
+BASE_COST = 2.0
+
+QUEUE_WAIT_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    'comic_job_queue_wait_seconds', 'Time generation jobs waited for a worker, by priority class.', ['priority'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)))
+QUEUED_JOBS = metrics.REGISTRY.register(metrics.Gauge(
+    'comic_jobs_queued', 'Generation jobs waiting for a worker, by priority class.', ['priority']))
+RUNNING_JOBS = metrics.REGISTRY.register(metrics.Gauge(
+    'comic_jobs_running', 'Generation jobs running on a worker, by priority class.', ['priority']))
+
+
+_local = threading.local()
+
+
+def current_priority() -> str:
+    """Priority class of the job running on this thread; request threads count as interactive"""
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+def expected_cost(options: Optional[Dict[str, Any]]) -> float:
+    """
+    Estimated work of a generation job in scene-equivalents
+
+    Args:
+        options: Generation options (num_scenes, target_length)
+
+    Returns:
+        Relative cost; only the ordering between jobs matters
+    """
+    options = options or {}
+    try:
+        scenes = max(int(options.get('num_scenes', 8)), 1)
+    except (TypeError, ValueError):
+        scenes = 8
+    return BASE_COST * LENGTH_WEIGHTS.get(options.get('target_length'), 1.0) + scenes
+
+
+class _Job:
+    __slots__ = ('job_id', 'func', 'args', 'client', 'priority', 'cost', 'submitted')
+
+    def __init__(self, job_id: str, func: Callable[..., Any], args: Tuple[Any, ...], client: str,
+                 priority: str, cost: float):
+        self.job_id = job_id
+        self.func = func
+        self.args = args
+        self.client = client
+        self.priority = priority
+        self.cost = cost
+        self.submitted = time.monotonic()
+
+
+class _FairQueue:
+    """Start-time fair queue over clients, shortest job first within a client"""
+
+    def __init__(self):
+        self._clients: Dict[str, List[Tuple[float, int, _Job]]] = {}
+        self._finish: Dict[str, float] = {}
+        self._vtime = 0.0
+        self._seq = itertools.count()
+        self.size = 0
+
+    def push(self, job: _Job) -> None:
+        heapq.heappush(self._clients.setdefault(job.client, []), (job.cost, next(self._seq), job))
+        self.size += 1
+
+    def pop(self) -> Optional[_Job]:
+        best = None
+        for client, jobs in self._clients.items():
+            start = max(self._finish.get(client, 0.0), self._vtime)
+            tag = (start + jobs[0][0], jobs[0][1])
+            if best is None or tag < best[0]:
+                best = (tag, client, start)
+        if best is None:
+            return None
+        _, client, start = best
+        cost, _, job = heapq.heappop(self._clients[client])
+        if not self._clients[client]:
+            del self._clients[client]
+        self._finish[client] = start + cost
+        self._vtime = start
+        # Clients already caught up with the clock have no credit to keep
+        for idle in [c for c, finish in self._finish.items() if c not in self._clients and finish <= self._vtime]:
+            del self._finish[idle]
+        self.size -= 1
+        return job
+
+    def remove(self, job_id: str) -> Optional[_Job]:
+        for client, jobs in self._clients.items():
+            for index, (_, _, job) in enumerate(jobs):
+                if job.job_id == job_id:
+                    jobs.pop(index)
+                    heapq.heapify(jobs)
+                    if not jobs:
+                        del self._clients[client]
+                    self.size -= 1
+                    return job
+        return None
+
+
+class JobScheduler:
+    def __init__(self, workers: int, reserved_interactive: int = 1):
+        """
+        Fixed worker pool with priority classes and per-client fair queues
+
+        Args:
+            workers: Worker threads
+            reserved_interactive: Workers batch jobs may not use (at most workers - 1)
+        """
+        self.workers = workers
+        self.batch_limit = max(workers - reserved_interactive, 1)
+        self._queues = {priority: _FairQueue() for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._cond = threading.Condition()
+        self._threads = []
+        for number in range(workers):
+            thread = threading.Thread(target=self._work, name=f'comic-job-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job_id: str, func: Callable[..., Any], args: Tuple[Any, ...], client: str = '',
+               priority: str = INTERACTIVE, cost: float = 1.0) -> int:
+        """
+        Queue `func(*args)` for a worker
+
+        Args:
+            job_id: Identifier used by `remove`
+            func: Job body
+            args: Positional arguments for `func`
+            client: Fairness key (user or address of the requester)
+            priority: One of PRIORITIES
+            cost: Expected cost, see `expected_cost`
+
+        Returns:
+            Jobs queued ahead of this one in its class and above
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        job = _Job(job_id, func, args, client, priority, cost)
+        with self._cond:
+            self._queues[priority].push(job)
+            QUEUED_JOBS.inc(priority=priority)
+            ahead = sum(self._queues[p].size for p in PRIORITIES[:PRIORITIES.index(priority) + 1]) - 1
+            self._cond.notify()
+        return ahead
+
+    def remove(self, job_id: str) -> bool:
+        """Drop a job that has not started yet; returns whether it was queued"""
+        with self._cond:
+            for priority, queue in self._queues.items():
+                if queue.remove(job_id) is not None:
+                    QUEUED_JOBS.dec(priority=priority)
+                    return True
+        return False
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._cond:
+            return {p: {'queued': self._queues[p].size, 'running': self._running[p]} for p in PRIORITIES}
+
+    def _next(self) -> Optional[_Job]:
+        job = self._queues[INTERACTIVE].pop()
+        if job is None and self._running[BATCH] < self.batch_limit:
+            job = self._queues[BATCH].pop()
+        return job
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next()
+                self._running[job.priority] += 1
+            QUEUED_JOBS.dec(priority=job.priority)
+            RUNNING_JOBS.inc(priority=job.priority)
+            QUEUE_WAIT_SECONDS.observe(time.monotonic() - job.submitted, priority=job.priority)
+            _local.priority = job.priority
+            try:
+                job.func(*job.args)
+            except Exception as e:
+                logger.error(f"Generation job {job.job_id} failed: {str(e)}", exc_info=True)
+            finally:
+                _local.priority = INTERACTIVE
+                RUNNING_JOBS.dec(priority=job.priority)
+                with self._cond:
+                    self._running[job.priority] -= 1
+                    # A batch slot may have opened up
+                    self._cond.notify()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> JobScheduler:
+    """Process-wide scheduler sized by COMIC_GENERATION_WORKERS (default 8) and COMIC_INTERACTIVE_RESERVED_WORKERS (default 4)"""
+    global _scheduler
+    if _scheduler is None:
+        from django.conf import settings
+
+        with _scheduler_lock:
+            if _scheduler is None:
+                workers = getattr(settings, 'COMIC_GENERATION_WORKERS', 8)
+                _scheduler = JobScheduler(workers, getattr(settings, 'COMIC_INTERACTIVE_RESERVED_WORKERS', 4))
+                logger.info(f"Job scheduler started with {workers} workers")
+    return _scheduler
@@ -0,0 +1,243 @@
+"""
+Local full-text search over the article archive.
+
+`SearchIndex` is an in-memory inverted index with BM25 ranking over every
+article in the archive. It is built lazily on first use, updated as soon as
+the write-behind persister stores a page in this process, and picks up pages
+archived by other processes (or by `import_articles`) on a throttled refresh.
+The same refresh drops articles the garbage collector deleted from the archive.
+`WikipediaExtractor.search_wikipedia` consults it before the live Wikipedia
+search.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter as TermCounter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .archive import ArticleArchive, get_archive
+from .persistence import get_persister
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\w+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has he in is it its of on or she that the their they this to was were which with'.split()
+)
+
+# Title tokens are counted this many times, so a title match outweighs a passing mention in the body
+TITLE_WEIGHT = 3
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class SearchIndex:
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, archive: ArticleArchive, refresh_interval: float = 30.0):
+        """
+        BM25-ranked inverted index over an article archive
+
+        Args:
+            archive: Archive the articles are read from
+            refresh_interval: Minimum seconds between checks of the archive for articles stored elsewhere
+        """
+        self.archive = archive
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._titles: List[str] = []  # doc id -> title; a replaced article keeps its id
+        self._doc_ids: Dict[str, int] = {}
+        self._folded: Dict[str, int] = {}
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._terms: Dict[int, Tuple[str, ...]] = {}
+        self._watermark = 0.0
+        self._last_refresh = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    def add(self, article: Dict[str, Any]) -> None:
+        """
+        Index an article, replacing any earlier version with the same title
+
+        Args:
+            article: Article data with `title` and `content` (or `summary`)
+        """
+        title = article['title']
+        counts = TermCounter(tokenize(title) * TITLE_WEIGHT)
+        counts.update(tokenize(article.get('content') or article.get('summary') or ''))
+        length = sum(counts.values())
+        with self._lock:
+            doc_id = self._doc_ids.get(title)
+            if doc_id is None:
+                doc_id = len(self._titles)
+                self._titles.append(title)
+                self._doc_ids[title] = doc_id
+                self._folded[title.casefold()] = doc_id
+            else:
+                self._unindex(doc_id)
+            self._lengths[doc_id] = length
+            self._total_length += length
+            self._terms[doc_id] = tuple(counts)
+            for term, count in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, title: str) -> bool:
+        """
+        Drop an article from the index
+
+        Args:
+            title: Title of the article
+
+        Returns:
+            True if the article was indexed
+        """
+        with self._lock:
+            doc_id = self._doc_ids.pop(title, None)
+            if doc_id is None:
+                return False
+            if self._folded.get(title.casefold()) == doc_id:
+                del self._folded[title.casefold()]
+            self._unindex(doc_id)
+            return True
+
+    def _unindex(self, doc_id: int) -> None:
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in self._terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Index articles whose content changed in the archive since the last refresh, and drop deleted ones
+
+        Args:
+            force: Refresh even if the last one was less than `refresh_interval` seconds ago
+
+        Returns:
+            Number of articles (re)indexed
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return 0
+            self._last_refresh = now
+            watermark = self._watermark
+        count = 0
+        for title, changed_at in self.archive.changed_since(watermark):
+            article = self.archive.get(title, fields=('title', 'summary', 'content'))
+            if article:
+                self.add(article)
+                count += 1
+            with self._lock:
+                self._watermark = max(self._watermark, changed_at)
+        self._prune()
+        return count
+
+    def _prune(self) -> None:
+        """Drop articles no longer in the archive; the title listing only runs when the counts disagree"""
+        # Every archived article is indexed at this point, so extra index entries were deleted
+        if len(self) <= self.archive.stats()['articles']:
+            return
+        with self._lock:
+            indexed = set(self._doc_ids)
+        missing = indexed - set(self.archive.titles())
+        for title in missing:
+            self.remove(title)
+        if missing:
+            logger.info(f"Dropped {len(missing)} deleted articles from the search index")
+
+    def search(self, query: str, limit: int = 15) -> List[Tuple[str, float]]:
+        """
+        Rank indexed articles against a query
+
+        Args:
+            query: Free-text query
+            limit: Maximum number of results
+
+        Returns:
+            (title, score) pairs, best first; an exact title match always ranks first
+        """
+        self.refresh()
+        terms = set(tokenize(query))
+        scores: Dict[int, float] = {}
+        with self._lock:
+            count = len(self._doc_ids)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.K1 * (1 - self.B + self.B * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+            exact = self._folded.get(query.strip().casefold())
+            if exact is not None:
+                scores[exact] = float('inf')
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            return [(self._titles[doc_id], score) for doc_id, score in ranked]
+
+
+class RecentResults:
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0):
+        """
+        Small LRU of recent upstream search results, served alongside local hits
+
+        Args:
+            max_entries: Maximum number of queries kept
+            ttl: Seconds a result list stays usable
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, List[str]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[List[str]]:
+        key = query.casefold()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, query: str, results: List[str]) -> None:
+        key = query.casefold()
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_indexes: Dict[str, SearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(data_dir: str) -> SearchIndex:
+    """Process-wide search index over the archive in `data_dir`, built on first use"""
+    archive = get_archive(data_dir)
+    with _indexes_lock:
+        index = _indexes.get(archive.path)
+        if index is None:
+            index = SearchIndex(archive)
+            # Registered before the initial build so nothing stored in between is missed
+            get_persister(data_dir).add_listener(index.add)
+            started = time.perf_counter()
+            index.refresh(force=True)
+            logger.info(f"Search index built with {len(index)} articles in {time.perf_counter() - started:.2f}s")
+            _indexes[archive.path] = index
+        return index
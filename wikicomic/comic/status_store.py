@@ -0,0 +1,300 @@
+"""
+Generation status storage shared between worker processes.
+
+`update_status` used to write straight to Django's default cache, which is a
+per-process LocMem cache unless configured otherwise, so a status poll that
+landed on another gunicorn worker returned 404. The default backend is now a
+SQLite file shared by every worker on the host (`BASE_DIR/status.sqlite3`);
+another one is chosen with the COMIC_STATUS_BACKEND setting:
+
+    COMIC_STATUS_BACKEND = {
+        'BACKEND': 'comic.status_store.RedisStatusBackend',
+        'OPTIONS': {'url': 'redis://cache.internal:6379/0'},
+    }
+
+`CacheStatusBackend` only works across workers when Django's cache is itself
+shared (Redis, Memcached, database); with the LocMem cache cancels and polls
+handled by another worker are lost.
+
+`StatusWriter` sits in front of the backend: it keeps progress monotonic and
+coalesces bursts of progress updates so a long job writes a handful of times
+instead of once per step. It also carries cancel requests and status polls
+to the worker that runs a job, under `<request_id>:cancel` and
+`<request_id>:poll`, so a cancel or poll landing on any worker reaches it.
+Otherwise only the status is shared: the `comic_id` it carries refers to the
+`ComicStore` of the worker that runs the job.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+STATUS_TIMEOUT = 3600  # 1 hour
+TERMINAL_STATES = ('COMPLETED', 'ERROR', 'CANCELLED')
+
+STATUS_WRITES = metrics.REGISTRY.register(metrics.Counter(
+    'comic_status_writes_total', 'Job status updates by result (written or coalesced).', ['result']))
+
+
+class StatusBackend:
+    """Key-value store for job status dictionaries"""
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, request_id: str, status_data: Dict[str, Any], timeout: int = STATUS_TIMEOUT) -> None:
+        raise NotImplementedError
+
+
+class CacheStatusBackend(StatusBackend):
+    """
+    Django cache backend, for deployments that already run a shared cache
+
+    Requires a cache shared by every worker (Redis, Memcached, database); the default
+    LocMem cache is per-process, so statuses, cancels and polls would not cross workers.
+    """
+
+    def __init__(self, alias: str = 'default', key_prefix: str = 'comic_status_'):
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def get(self, request_id):
+        return self.cache.get(f'{self.key_prefix}{request_id}')
+
+    def set(self, request_id, status_data, timeout=STATUS_TIMEOUT):
+        self.cache.set(f'{self.key_prefix}{request_id}', status_data, timeout=timeout)
+
+
+class SQLiteStatusBackend(StatusBackend):
+    """Single-host backend shared by every worker process through a SQLite file in WAL mode"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(getattr(settings, 'BASE_DIR', '.'), 'status.sqlite3')
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS comic_status ('
+                ' request_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, request_id):
+        row = self._connection().execute(
+            'SELECT data FROM comic_status WHERE request_id = ? AND expires_at > ?', (request_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, request_id, status_data, timeout=STATUS_TIMEOUT):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO comic_status (request_id, data, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(request_id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at',
+                (request_id, json.dumps(status_data, separators=(',', ':')), now + timeout)
+            )
+            # Expired rows are removed opportunistically on terminal writes
+            if status_data.get('status') in TERMINAL_STATES:
+                conn.execute('DELETE FROM comic_status WHERE expires_at <= ?', (now,))
+
+
+class RedisStatusBackend(StatusBackend):
+    """Multi-host backend for Redis or any server speaking its protocol (requires the `redis` package)"""
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', key_prefix: str = 'comic_status:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RedisStatusBackend requires the 'redis' package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    def get(self, request_id):
+        raw = self.client.get(f'{self.key_prefix}{request_id}')
+        return json.loads(raw) if raw else None
+
+    def set(self, request_id, status_data, timeout=STATUS_TIMEOUT):
+        self.client.set(f'{self.key_prefix}{request_id}', json.dumps(status_data, separators=(',', ':')), ex=timeout)
+
+
+class StatusWriter:
+    # Entries of jobs that stopped writing without reaching a terminal state are dropped after this long
+    IDLE_SECONDS = STATUS_TIMEOUT
+    # Minimum seconds between two shared poll records of a job from this process
+    POLL_RECORD_INTERVAL = 5.0
+
+    def __init__(self, backend: StatusBackend, min_interval: float = 1.0):
+        """
+        Coalescing, monotonic front end for a status backend
+
+        Args:
+            backend: Backend the status dictionaries are written to
+            min_interval: Minimum seconds between two writes for a job while its status value is
+                unchanged; intermediate updates are merged and flushed by a timer
+        """
+        self.backend = backend
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        # request_id -> {'last_write': float, 'progress': int, 'status': str, 'pending': dict|None,
+        #                'timer': Timer|None, 'seq': int, 'stored_seq': int, 'io_lock': Lock}
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._last_prune = time.monotonic()
+        # request_id -> monotonic time this process last recorded a poll of the job
+        self._polls: Dict[str, float] = {}
+
+    def write(self, request_id: str, status_data: Dict[str, Any]) -> None:
+        """Record a status update; state changes and terminal states are written immediately"""
+        with self._lock:
+            job = self._jobs.setdefault(request_id, {
+                'last_write': 0.0, 'progress': 0, 'status': None, 'pending': None, 'timer': None,
+                'seq': 0, 'stored_seq': 0, 'io_lock': threading.Lock()
+            })
+            status_data = dict(status_data)
+            # Progress never goes backwards, even on failure
+            status_data['progress'] = max(status_data.get('progress', 0), job['progress'])
+            job['progress'] = status_data['progress']
+
+            now = time.monotonic()
+            self._prune(now)
+            urgent = status_data.get('status') != job['status'] or status_data.get('status') in TERMINAL_STATES
+            if not urgent and now - job['last_write'] < self.min_interval:
+                job['pending'] = status_data
+                if job['timer'] is None:
+                    job['timer'] = threading.Timer(self.min_interval - (now - job['last_write']), self._flush, (request_id,))
+                    job['timer'].daemon = True
+                    job['timer'].start()
+                STATUS_WRITES.inc(result='coalesced')
+                return
+
+            self._cancel_timer(job)
+            job['pending'] = None
+            job['last_write'] = now
+            job['status'] = status_data.get('status')
+            job['seq'] += 1
+            seq = job['seq']
+            if status_data.get('status') in TERMINAL_STATES:
+                del self._jobs[request_id]
+        # Backend I/O happens outside the writer lock, so a slow write only delays its own job
+        self._store(request_id, status_data, job, seq)
+
+    def forget(self, request_id: str) -> None:
+        """Write a job's pending update, if any, and drop its entry (for jobs that end without a terminal status)"""
+        with self._lock:
+            job = self._jobs.pop(request_id, None)
+            if job is None:
+                return
+            self._cancel_timer(job)
+            status_data, job['pending'] = job['pending'], None
+            job['seq'] += 1
+            seq = job['seq']
+        if status_data is not None:
+            self._store(request_id, status_data, job, seq)
+
+    def _flush(self, request_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(request_id)
+            if not job or job['pending'] is None:
+                return
+            status_data = job['pending']
+            job['pending'] = None
+            job['timer'] = None
+            job['last_write'] = time.monotonic()
+            job['seq'] += 1
+            seq = job['seq']
+        self._store(request_id, status_data, job, seq)
+
+    def _prune(self, now: float) -> None:
+        """Drop entries idle for IDLE_SECONDS; called with the lock held"""
+        if now - self._last_prune < 60.0:
+            return
+        self._last_prune = now
+        for request_id, job in list(self._jobs.items()):
+            if job['timer'] is None and now - job['last_write'] > self.IDLE_SECONDS:
+                del self._jobs[request_id]
+
+    @staticmethod
+    def _cancel_timer(job: Dict[str, Any]) -> None:
+        if job['timer'] is not None:
+            job['timer'].cancel()
+            job['timer'] = None
+
+    def _store(self, request_id: str, status_data: Dict[str, Any], job: Dict[str, Any], seq: int) -> None:
+        # Writes of one job are serialized, and one that lost the race to a newer update is skipped
+        with job['io_lock']:
+            if seq <= job['stored_seq']:
+                STATUS_WRITES.inc(result='coalesced')
+                return
+            job['stored_seq'] = seq
+            status_data['updated_at'] = time.time()
+            try:
+                self.backend.set(request_id, status_data)
+                STATUS_WRITES.inc(result='written')
+            except Exception as e:
+                logger.error(f"Failed to write status for {request_id}: {str(e)}")
+
+    def read(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get(request_id)
+
+    def request_cancel(self, request_id: str, reason: str) -> None:
+        """Ask whichever worker runs a job to cancel it at its next check"""
+        self.backend.set(f'{request_id}:cancel', {'reason': reason, 'requested_at': time.time()})
+
+    def cancel_requested(self, request_id: str) -> Optional[str]:
+        """Reason of a pending cancel request for a job, or None"""
+        request = self.backend.get(f'{request_id}:cancel')
+        return request['reason'] if request else None
+
+    def record_poll(self, request_id: str) -> None:
+        """Record that a job's client polled; written at most every POLL_RECORD_INTERVAL seconds per process"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._polls.get(request_id, float('-inf')) < self.POLL_RECORD_INTERVAL:
+                return
+            if len(self._polls) >= 10000:
+                self._polls = {key: last for key, last in self._polls.items() if now - last < self.POLL_RECORD_INTERVAL}
+            self._polls[request_id] = now
+        try:
+            self.backend.set(f'{request_id}:poll', {'polled_at': time.time()})
+        except Exception as e:
+            logger.error(f"Failed to record poll for {request_id}: {str(e)}")
+
+    def last_poll(self, request_id: str) -> Optional[float]:
+        """Unix time of the latest poll of a job recorded by any worker, or None"""
+        poll = self.backend.get(f'{request_id}:poll')
+        return poll['polled_at'] if poll else None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> StatusWriter:
+    """Process-wide status writer built from the COMIC_STATUS_BACKEND and COMIC_STATUS_MIN_INTERVAL settings"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                config = getattr(settings, 'COMIC_STATUS_BACKEND', None) or {}
+                backend_class = import_string(config.get('BACKEND', 'comic.status_store.SQLiteStatusBackend'))
+                backend = backend_class(**config.get('OPTIONS', {}))
+                _writer = StatusWriter(backend, getattr(settings, 'COMIC_STATUS_MIN_INTERVAL', 1.0))
+                logger.info(f"Status store initialized with {backend_class.__name__}")
+    return _writer
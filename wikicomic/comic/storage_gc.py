@@ -0,0 +1,458 @@
+"""
+Disk quota enforcement for generated panels and archived articles.
+
+Panels under MEDIA_ROOT (the content-addressed `comic_media/` shards and the
+legacy `comic_scenes/` folders), composed pages (`comic_pages/`) and articles
+in the archive are evicted least recently used first until each is under its
+byte quota:
+
+    COMIC_MEDIA_QUOTA_BYTES = 20 * 1024 ** 3
+    COMIC_ARTICLE_QUOTA_BYTES = 512 * 1024 ** 2
+
+Last access is a panel's mtime, bumped when a comic using it is served
+(`MediaStore.touch`), and an article's `accessed_at` in the archive. Panels
+and articles of comics held by `ComicStore` in any worker are never removed:
+each worker publishes them as pins in the index below (`PinPublisher`), which
+`manage.py gc_media` reads from its own process. Nothing touched within
+COMIC_GC_MIN_AGE seconds is removed either, which covers the few seconds
+before a new pin is published.
+
+Files are tracked in a SQLite index next to the media. A scan only lists
+directories whose mtime changed since the previous scan, so a sweep over
+millions of unchanged panels costs one stat per shard directory.
+`manage.py gc_media` runs a collection; setting COMIC_GC_INTERVAL also runs
+one periodically in every process that loads the app (see `ComicConfig.ready`).
+"""
+import atexit
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from . import metrics
+from .archive import ArticleArchive
+from .composer import PAGES_PREFIX
+from .media_store import MEDIA_PREFIX
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = '.gc_index.sqlite3'
+# Directories under MEDIA_ROOT holding collectable panels and composed pages
+MEDIA_DIRS = (MEDIA_PREFIX, 'comic_scenes', PAGES_PREFIX)
+# A worker re-publishes its pins at least this often; pins of a worker silent for PIN_TTL are dropped
+PIN_REFRESH = 300.0
+PIN_TTL = 3 * PIN_REFRESH
+# Minimum seconds between two publications, so a burst of new scenes costs one write
+PIN_DEBOUNCE = 5.0
+
+GC_RECLAIMED = metrics.REGISTRY.register(metrics.Counter(
+    'comic_gc_reclaimed_bytes_total', 'Bytes freed by garbage collection by kind (media or articles).', ['kind']))
+GC_EVICTED = metrics.REGISTRY.register(metrics.Counter(
+    'comic_gc_evicted_total', 'Files or articles removed by garbage collection by kind.', ['kind']))
+
+
+class MediaIndex:
+    def __init__(self, root: str, path: Optional[str] = None):
+        """
+        Incrementally maintained index of the files under MEDIA_ROOT
+
+        Args:
+            root: Media root
+            path: SQLite index file (default `<root>/.gc_index.sqlite3`)
+        """
+        self.root = root
+        self.path = path or os.path.join(root, INDEX_FILENAME)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT NOT NULL,'
+                ' size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS files_dir ON files (dir)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime_ns, path)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS pin_owners (owner TEXT PRIMARY KEY, seen_at REAL NOT NULL)')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS pins (owner TEXT NOT NULL, kind TEXT NOT NULL, ref TEXT NOT NULL,'
+                ' PRIMARY KEY (owner, kind, ref))'
+            )
+
+    def _abs(self, relative: str) -> str:
+        return os.path.join(self.root, *relative.split('/'))
+
+    def scan(self, top_dirs: Iterable[str] = MEDIA_DIRS, full: bool = False) -> Dict[str, int]:
+        """
+        Bring the index up to date with the disk
+
+        Args:
+            top_dirs: Directories under the root to scan
+            full: List every directory, even if its mtime is unchanged
+
+        Returns:
+            Counts of directories `listed` and `skipped` as unchanged
+        """
+        listed = skipped = 0
+        stack = list(top_dirs)
+        while stack:
+            relative = stack.pop()
+            try:
+                mtime_ns = os.stat(self._abs(relative)).st_mtime_ns
+            except FileNotFoundError:
+                self._drop_tree(relative)
+                continue
+            row = self.conn.execute('SELECT mtime_ns FROM dirs WHERE path = ?', (relative,)).fetchone()
+            if row and row[0] == mtime_ns and not full:
+                # No entries were added, removed or renamed here; only subdirectories can hold changes
+                stack.extend(child for (child,) in self.conn.execute('SELECT path FROM dirs WHERE parent = ?', (relative,)))
+                skipped += 1
+                continue
+
+            files, subdirs = {}, []
+            with os.scandir(self._abs(relative)) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue  # temporary files of atomic writes, and this index
+                    child = f'{relative}/{entry.name}'
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(child)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files[child] = (stat.st_size, stat.st_mtime_ns)
+            with self.conn:
+                known = {path for (path,) in self.conn.execute('SELECT path FROM files WHERE dir = ?', (relative,))}
+                self.conn.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in known - set(files)])
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO files (path, dir, size, mtime_ns) VALUES (?, ?, ?, ?)',
+                    [(path, relative, size, mtime) for path, (size, mtime) in files.items()]
+                )
+                for (child,) in self.conn.execute('SELECT path FROM dirs WHERE parent = ?', (relative,)).fetchall():
+                    if child not in subdirs:
+                        self._drop_tree(child)
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)',
+                    (relative, relative.rpartition('/')[0], mtime_ns)
+                )
+            stack.extend(subdirs)
+            listed += 1
+        return {'listed': listed, 'skipped': skipped}
+
+    def _drop_tree(self, relative: str) -> None:
+        pattern = relative.replace('%', r'\%').replace('_', r'\_') + '/%'
+        with self.conn:
+            self.conn.execute("DELETE FROM files WHERE dir = ? OR dir LIKE ? ESCAPE '\\'", (relative, pattern))
+            self.conn.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (relative, pattern))
+
+    def publish_pins(self, owner: str, media: Iterable[str], titles: Iterable[str]) -> None:
+        """
+        Record references a worker holds and refresh its heartbeat
+
+        Args:
+            owner: Worker identifier
+            media: Relative media paths to add to the worker's pins
+            titles: Article titles to add to the worker's pins
+        """
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO pin_owners (owner, seen_at) VALUES (?, ?)', (owner, time.time()))
+            self.conn.executemany('INSERT OR IGNORE INTO pins (owner, kind, ref) VALUES (?, ?, ?)',
+                                  [(owner, 'media', path) for path in media] +
+                                  [(owner, 'title', title) for title in titles])
+
+    def drop_pins(self, owner: str) -> None:
+        with self.conn:
+            self.conn.execute('DELETE FROM pins WHERE owner = ?', (owner,))
+            self.conn.execute('DELETE FROM pin_owners WHERE owner = ?', (owner,))
+
+    def pinned(self, ttl: float = PIN_TTL) -> Tuple[Set[str], Set[str]]:
+        """
+        References held by live workers; pins of workers silent for `ttl` seconds are deleted
+
+        Returns:
+            (relative media paths, article titles)
+        """
+        with self.conn:
+            self.conn.execute('DELETE FROM pins WHERE owner IN (SELECT owner FROM pin_owners WHERE seen_at < ?)',
+                              (time.time() - ttl,))
+            self.conn.execute('DELETE FROM pin_owners WHERE seen_at < ?', (time.time() - ttl,))
+            self.conn.execute('DELETE FROM pins WHERE owner NOT IN (SELECT owner FROM pin_owners)')
+        media, titles = set(), set()
+        for kind, ref in self.conn.execute('SELECT DISTINCT kind, ref FROM pins'):
+            (media if kind == 'media' else titles).add(ref)
+        return media, titles
+
+    def usage(self) -> Dict[str, int]:
+        files, size = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files').fetchone()
+        return {'files': files, 'bytes': size}
+
+    def evict(self, quota: int, protected: Set[str], min_age: float, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Delete least recently used files until the indexed total is within the quota
+
+        Args:
+            quota: Byte quota
+            protected: Relative paths that must be kept
+            min_age: Files accessed more recently than this many seconds ago are kept
+            dry_run: Only report what would be deleted
+
+        Returns:
+            Counts of `files` evicted and `bytes` reclaimed
+        """
+        total = self.usage()['bytes']
+        cutoff_ns = int((time.time() - min_age) * 1e9)
+        evicted = reclaimed = 0
+        position = (-1, '')
+        while total > quota:
+            batch = self.conn.execute(
+                'SELECT path, size, mtime_ns FROM files WHERE mtime_ns < ? AND (mtime_ns, path) > (?, ?)'
+                ' ORDER BY mtime_ns, path LIMIT 500', (cutoff_ns, position[0], position[1])
+            ).fetchall()
+            if not batch:
+                break
+            for path, size, mtime_ns in batch:
+                position = (mtime_ns, path)
+                if total <= quota:
+                    break
+                if path in protected:
+                    continue
+                try:
+                    current = os.stat(self._abs(path)).st_mtime_ns
+                except FileNotFoundError:
+                    self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+                    total -= size
+                    continue
+                if current != mtime_ns:
+                    # Touched since the scan; its real last access puts it later in the order
+                    self.conn.execute('UPDATE files SET mtime_ns = ? WHERE path = ?', (current, path))
+                    continue
+                if not dry_run:
+                    try:
+                        os.remove(self._abs(path))
+                    except FileNotFoundError:
+                        pass
+                    self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+                total -= size
+                evicted += 1
+                reclaimed += size
+            self.conn.commit()
+        return {'files': evicted, 'bytes': reclaimed}
+
+
+def collect_articles(archive: ArticleArchive, quota: int, protected: Set[str], min_age: float,
+                     dry_run: bool = False) -> Dict[str, int]:
+    """
+    Delete least recently read articles until the archive payload is within the quota
+
+    Args:
+        archive: Article archive
+        quota: Byte quota for the compressed payload
+        protected: Titles that must be kept
+        min_age: Articles read more recently than this many seconds ago are kept
+        dry_run: Only report what would be deleted
+
+    Returns:
+        Counts of `articles` evicted and payload `bytes` reclaimed
+    """
+    total = archive.stats()['payload_bytes']
+    cutoff = time.time() - min_age
+    victims: List[str] = []
+    reclaimed = 0
+    for title, size, last_access in archive.least_recently_used(limit=1000000):
+        if total <= quota or last_access >= cutoff:
+            break
+        if title in protected:
+            continue
+        victims.append(title)
+        total -= size
+        reclaimed += size
+    if victims and not dry_run:
+        archive.delete(victims)
+        archive.vacuum()
+    return {'articles': len(victims), 'bytes': reclaimed}
+
+
+def collect(media_quota: Optional[int] = None, article_quota: Optional[int] = None, min_age: Optional[float] = None,
+            data_dir: str = 'data', dry_run: bool = False, full_scan: bool = False) -> Dict[str, Any]:
+    """
+    Run one garbage collection
+
+    Args:
+        media_quota: Panel byte quota (default COMIC_MEDIA_QUOTA_BYTES; None only reports usage)
+        article_quota: Archive payload byte quota (default COMIC_ARTICLE_QUOTA_BYTES; None only reports usage)
+        min_age: Grace period in seconds (default COMIC_GC_MIN_AGE)
+        data_dir: Directory of the article archive
+        dry_run: Only report what would be deleted
+        full_scan: Re-list every media directory
+
+    Returns:
+        Report with usage before and after and the space reclaimed, per kind
+    """
+    from .archive import get_archive
+    from .models import ComicStore
+
+    if media_quota is None:
+        media_quota = getattr(settings, 'COMIC_MEDIA_QUOTA_BYTES', None)
+    if article_quota is None:
+        article_quota = getattr(settings, 'COMIC_ARTICLE_QUOTA_BYTES', None)
+    if min_age is None:
+        min_age = getattr(settings, 'COMIC_GC_MIN_AGE', 3600)
+    live_media, live_titles = ComicStore.live_references()
+    started = time.perf_counter()
+
+    index = MediaIndex(os.path.abspath(settings.MEDIA_ROOT))
+    try:
+        pinned_media, pinned_titles = index.pinned()
+        live_media |= pinned_media
+        live_titles |= pinned_titles
+        scan = index.scan(full=full_scan)
+        before = index.usage()
+        media = {'files': 0, 'bytes': 0}
+        if media_quota is not None:
+            media = index.evict(media_quota, live_media, min_age, dry_run)
+        after = index.usage()
+    finally:
+        index.conn.close()
+
+    archive = get_archive(data_dir)
+    articles_before = archive.stats()
+    articles = {'articles': 0, 'bytes': 0}
+    if article_quota is not None:
+        articles = collect_articles(archive, article_quota, live_titles, min_age, dry_run)
+
+    if not dry_run:
+        GC_RECLAIMED.inc(media['bytes'], kind='media')
+        GC_EVICTED.inc(media['files'], kind='media')
+        GC_RECLAIMED.inc(articles['bytes'], kind='articles')
+        GC_EVICTED.inc(articles['articles'], kind='articles')
+    report = {
+        'dry_run': dry_run,
+        'seconds': round(time.perf_counter() - started, 3),
+        'media': {
+            'quota_bytes': media_quota,
+            'dirs_listed': scan['listed'],
+            'dirs_skipped': scan['skipped'],
+            'files_before': before['files'],
+            'bytes_before': before['bytes'],
+            'evicted_files': media['files'],
+            'reclaimed_bytes': media['bytes'],
+            'bytes_after': after['bytes'] if not dry_run else before['bytes'] - media['bytes'],
+        },
+        'articles': {
+            'quota_bytes': article_quota,
+            'articles_before': articles_before['articles'],
+            'bytes_before': articles_before['payload_bytes'],
+            'evicted_articles': articles['articles'],
+            'reclaimed_bytes': articles['bytes'],
+            'bytes_after': articles_before['payload_bytes'] - articles['bytes'],
+        },
+    }
+    logger.info(f"Garbage collection reclaimed {media['bytes']} media bytes and {articles['bytes']} article bytes")
+    return report
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def ensure_sweeper() -> None:
+    """Start the background sweeper if COMIC_GC_INTERVAL is set and it is not running yet"""
+    global _sweeper
+    interval = getattr(settings, 'COMIC_GC_INTERVAL', None)
+    if not interval or _sweeper is not None:
+        return
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep, args=(interval,), name='storage-gc', daemon=True)
+            _sweeper.start()
+
+
+def _sweep(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            collect()
+        except Exception as e:
+            logger.error(f"Background garbage collection failed: {str(e)}", exc_info=True)
+
+
+class PinPublisher:
+    def __init__(self, root: str):
+        """
+        Publishes the references of this process's comics to the GC index, so collections in any process keep them
+
+        Args:
+            root: Media root holding the index
+        """
+        self.root = root
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._published: Set[tuple] = set()
+        self._event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def changed(self) -> None:
+        """Schedule a publication; starts the publishing thread on first use"""
+        self._event.set()
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='storage-gc-pins', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def publish(self) -> None:
+        """Add new references to this worker's pins and refresh its heartbeat"""
+        from .models import ComicStore
+
+        media, titles = ComicStore.live_references()
+        refs = {('media', path) for path in media} | {('title', title) for title in titles}
+        new = refs - self._published
+        index = MediaIndex(self.root)
+        try:
+            index.publish_pins(self.owner, [ref for kind, ref in new if kind == 'media'],
+                               [ref for kind, ref in new if kind == 'title'])
+        finally:
+            index.conn.close()
+        self._published |= new
+
+    def close(self) -> None:
+        """Drop this worker's pins, e.g. on a clean shutdown"""
+        try:
+            index = MediaIndex(self.root)
+            try:
+                index.drop_pins(self.owner)
+            finally:
+                index.conn.close()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Failed to drop garbage collection pins: {str(e)}")
+
+    def _run(self) -> None:
+        while True:
+            # Wakes on a change, or after PIN_REFRESH to keep the heartbeat fresh
+            self._event.wait(PIN_REFRESH)
+            self._event.clear()
+            try:
+                self.publish()
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Failed to publish garbage collection pins: {str(e)}")
+            time.sleep(PIN_DEBOUNCE)
+
+
+_publishers: Dict[str, PinPublisher] = {}
+_publishers_lock = threading.Lock()
+
+
+def pins_changed() -> None:
+    """Note that this process's comics reference new panels or articles"""
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    publisher = _publishers.get(root)
+    if publisher is None:
+        with _publishers_lock:
+            publisher = _publishers.setdefault(root, PinPublisher(root))
+    publisher.changed()
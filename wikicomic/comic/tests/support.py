@@ -0,0 +1,67 @@
+"""Helpers shared by the comic test modules"""
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+from .. import status_store
+from ..fakes import offline_upstreams
+from ..models import ComicStore
+
+# Upstream fakes without latency, so a whole generation takes a fraction of a second
+INSTANT_PROFILES = {
+    'wikipedia': {'latency': {'kind': 'constant', 'median': 0.0}},
+    'groq': {'latency': {'kind': 'constant', 'median': 0.0}},
+    'gemini': {'latency': {'kind': 'constant', 'median': 0.0}, 'payload_size': 64},
+}
+
+
+class MemoryStatusBackend(status_store.StatusBackend):
+    """Status backend recording every write"""
+
+    def __init__(self):
+        self.data = {}
+        self.writes = []
+
+    def get(self, request_id):
+        return self.data.get(request_id)
+
+    def set(self, request_id, status_data, timeout=status_store.STATUS_TIMEOUT):
+        self.data[request_id] = dict(status_data)
+        self.writes.append((request_id, dict(status_data)))
+
+
+def make_comic(title, scenes=0, status='pending', **options):
+    """Comic in the in-memory store with `scenes` placeholder panels"""
+    comic_id = ComicStore.create_comic(title=title, wikipedia_url='', storyline='', options=options)
+    for number in range(1, scenes + 1):
+        ComicStore.add_scene(comic_id, number, f'Scene {number}', f'comic_media/00/00/{title}-{number}.png')
+    if status != 'pending':
+        ComicStore.update_status(comic_id, status)
+    return comic_id
+
+
+class TempDirMixin:
+    def make_dir(self):
+        path = tempfile.mkdtemp(prefix='wikicomic-test-')
+        self.addCleanup(shutil.rmtree, path, True)
+        return path
+
+
+class OfflineMixin(TempDirMixin):
+    """Runs each test in a temporary working directory and media root, with the upstream fakes installed"""
+
+    def setUp(self):
+        super().setUp()
+        self.workdir = self.make_dir()
+        # Aliases, the archive and the title index default to `data/` in the working directory
+        cwd = os.getcwd()
+        os.chdir(self.workdir)
+        self.addCleanup(os.chdir, cwd)
+        media = override_settings(MEDIA_ROOT=os.path.join(self.workdir, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        fakes = offline_upstreams(INSTANT_PROFILES, data_dir=os.path.join(self.workdir, 'data'))
+        self.recorder = fakes.__enter__()
+        self.addCleanup(fakes.__exit__, None, None, None)
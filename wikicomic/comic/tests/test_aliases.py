@@ -0,0 +1,36 @@
+import os
+
+from django.test import TestCase
+
+from ..aliases import TitleAliases, normalize_title
+from ..archive import ArticleArchive
+from .support import TempDirMixin
+
+
+class AliasTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.path = os.path.join(self.make_dir(), 'articles.sqlite3')
+
+    def test_aliases_resolve_redirects_and_disambiguations(self):
+        aliases = TitleAliases(self.path)
+        aliases.add('WW2', 'World War II')
+        aliases.add_disambiguation('Mercury', ['Mercury (planet)', 'Mercury (element)'])
+        self.assertEqual(aliases.canonical('wW2'), 'World War II')
+        self.assertEqual(aliases.resolve('Mercury'), {'options': ['Mercury (planet)', 'Mercury (element)']})
+        aliases.forget('WW2')
+        self.assertEqual(aliases.canonical('WW2'), 'WW2')
+
+    def test_expired_aliases_are_ignored(self):
+        aliases = TitleAliases(self.path, max_age=0)
+        aliases.add('WW2', 'World War II')
+        self.assertIsNone(aliases.resolve('WW2'))
+
+    def test_aliases_share_the_archive_database(self):
+        archive = ArticleArchive(self.path)
+        archive.put({'title': 'World War II', 'content': 'x'})
+        TitleAliases(self.path).add('WW2', 'World War II')
+        self.assertEqual(TitleAliases(self.path).canonical('WW2'), 'World War II')
+        self.assertEqual(archive.get('World War II')['content'], 'x')
+
+    def test_titles_are_normalized_like_wikipedia(self):
+        self.assertEqual(normalize_title('  world_war   II '), 'World war II')
@@ -0,0 +1,41 @@
+import os
+
+from django.test import TestCase
+
+from ..archive import ArticleArchive
+from .support import TempDirMixin
+
+
+class ArchiveTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.path = os.path.join(self.make_dir(), 'articles.sqlite3')
+        self.archive = ArticleArchive(self.path)
+
+    def test_round_trip_and_field_subset(self):
+        self.archive.put({'title': 'Moon', 'content': 'The Moon orbits Earth.', 'categories': ['Space'],
+                          'revision_id': 7})
+        article = self.archive.get('Moon')
+        self.assertEqual(article['content'], 'The Moon orbits Earth.')
+        self.assertEqual(article['categories'], ['Space'])
+        self.assertEqual(self.archive.revision_id('Moon'), 7)
+        self.assertNotIn('content', self.archive.get('Moon', fields=('title', 'summary')))
+        self.assertIsNone(self.archive.get('Mars'))
+
+    def test_explicit_stored_at_is_kept(self):
+        self.archive.put({'title': 'Old', 'content': 'x'}, stored_at=1000.0)
+        self.assertEqual(self.archive.get('Old')['stored_at'], 1000.0)
+
+    def test_touch_does_not_count_as_a_content_change(self):
+        self.archive.put({'title': 'Moon', 'content': 'x'})
+        watermark = self.archive.changed_since(0)[-1][1]
+        self.archive.touch('Moon')
+        self.assertEqual(self.archive.changed_since(watermark), [])
+
+    def test_deleted_articles_leave_the_stats(self):
+        for title in ('Moon', 'Mars', 'Venus'):
+            self.archive.put({'title': title, 'content': title * 100})
+        self.archive.delete(['Mars', 'Venus'])
+        self.assertEqual(list(self.archive.titles()), ['Moon'])
+        stats = self.archive.stats()
+        self.assertEqual(stats['articles'], 1)
+        self.assertGreater(stats['file_bytes'], stats['payload_bytes'])
@@ -0,0 +1,50 @@
+import os
+import shutil
+
+from django.test import TestCase
+
+from ..autocomplete import TitleIndex
+from .support import TempDirMixin
+
+
+class TitleIndexTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.path = os.path.join(self.make_dir(), 'autocomplete.json')
+
+    def test_prefix_completion_is_case_insensitive_and_ranked(self):
+        index = TitleIndex(self.path, snapshot_interval=3600)
+        index.add(['Moon', 'Moon landing', 'Moonlight Sonata', 'Mars'])
+        index.record_generation('Moonlight Sonata')
+        self.assertEqual(index.complete('moon'), ['Moonlight Sonata', 'Moon', 'Moon landing'])
+        self.assertEqual(index.complete('moon', limit=1), ['Moonlight Sonata'])
+        self.assertEqual(index.complete('x'), [])
+
+    def test_saves_of_several_workers_add_up(self):
+        first = TitleIndex(self.path, snapshot_interval=3600)
+        second = TitleIndex(self.path, snapshot_interval=3600)
+        first.record_generation('Moon')
+        second.record_generation('Moon')
+        second.record_generation('Mars')
+        first.save()
+        second.save()
+        restored = TitleIndex(self.path, snapshot_interval=3600)
+        self.assertTrue(restored.load())
+        self.assertEqual(restored._counts, {'moon': 2, 'mars': 1})
+
+    def test_unchanged_index_is_not_saved(self):
+        index = TitleIndex(self.path, snapshot_interval=3600)
+        index.save()
+        self.assertFalse(os.path.exists(self.path))
+        index.add(['Moon'])
+        index.save()
+        os.utime(self.path, ns=(0, 0))
+        index.save()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 0)
+
+    def test_save_skips_a_removed_directory(self):
+        index = TitleIndex(self.path, snapshot_interval=3600)
+        index.record_generation('Moon')
+        shutil.rmtree(os.path.dirname(self.path))
+        with self.assertNoLogs('comic.autocomplete', 'ERROR'):
+            index.save()
+        self.assertFalse(os.path.exists(os.path.dirname(self.path)))
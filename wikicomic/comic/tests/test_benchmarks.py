@@ -0,0 +1,52 @@
+import io
+import os
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from .. import benchmarks
+from .support import TempDirMixin
+
+
+def run(median_us):
+    return {'results': {'split_scene_prompts': {'median_us': median_us, 'min_us': median_us, 'iterations': 1}}}
+
+
+class BenchmarkTests(TempDirMixin, SimpleTestCase):
+    def test_regression_is_measured_against_recent_median(self):
+        history = [run(1000.0), run(10.0), run(12.0), run(11.0)]
+        current = run(13.0)['results']
+        self.assertEqual(benchmarks.find_regressions(current, history, 0.2, baseline_runs=3), {})
+        regressions = benchmarks.find_regressions(current, history, 0.1, baseline_runs=3)
+        self.assertAlmostEqual(regressions['split_scene_prompts']['baseline_us'], 11.0)
+        # Cases without history are not compared
+        self.assertEqual(benchmarks.find_regressions({'new_case': {'median_us': 5.0}}, history, 0.1), {})
+
+    def test_history_round_trip(self):
+        path = os.path.join(self.make_dir(), 'nested', 'history.jsonl')
+        self.assertEqual(benchmarks.load_history(path), [])
+        benchmarks.append_history(path, run(10.0))
+        benchmarks.append_history(path, run(11.0))
+        self.assertEqual(benchmarks.load_history(path), [run(10.0), run(11.0)])
+
+    def run_command(self, history, **options):
+        call_command('benchmark', data_dir=self.make_dir(), history=history, case=['split_scene_prompts'],
+                     rounds=1, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def test_regressed_run_is_not_recorded_unless_accepted(self):
+        history = os.path.join(self.make_dir(), 'history.jsonl')
+        # A baseline no real run can match
+        benchmarks.append_history(history, run(1e-6))
+        with self.assertRaises(CommandError):
+            self.run_command(history)
+        self.assertEqual(len(benchmarks.load_history(history)), 1)
+
+        self.run_command(history, accept=True)
+        self.assertEqual(len(benchmarks.load_history(history)), 2)
+
+    def test_passing_run_is_recorded(self):
+        history = os.path.join(self.make_dir(), 'history.jsonl')
+        benchmarks.append_history(history, run(1e9))
+        self.run_command(history)
+        self.assertEqual(len(benchmarks.load_history(history)), 2)
@@ -0,0 +1,53 @@
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from .. import bubbles
+
+
+def panel(width=512, height=512):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'skyblue').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class BubbleLayoutTests(SimpleTestCase):
+    def test_wrapped_lines_fit_the_width(self):
+        lines = bubbles.wrap_text(None, 16, 'One small step for man, one giant leap for mankind.', 120)
+        self.assertGreater(len(lines), 1)
+        self.assertEqual(' '.join(lines), 'One small step for man, one giant leap for mankind.')
+        self.assertTrue(all(bubbles._line_width(None, 16, line) <= 120 for line in lines if ' ' in line))
+        # A word wider than the line gets a line of its own
+        self.assertEqual(bubbles.wrap_text(None, 16, 'a Pneumonoultramicroscopicsilicovolcanoconiosis b', 60),
+                         ('a', 'Pneumonoultramicroscopicsilicovolcanoconiosis', 'b'))
+
+    def test_bubbles_alternate_sides_inside_the_panel(self):
+        dialog = (('Armstrong', 'One small step.'), ('Aldrin', 'Beautiful view.'), ('Armstrong', 'Magnificent.'))
+        laid_out = bubbles.layout_bubbles(512, 512, dialog, None, None)
+        self.assertEqual([bubble[4] for bubble in laid_out], ['left', 'right', 'left'])
+        self.assertEqual(laid_out[0][6], 'ARMSTRONG')
+        for x, y, w, h, *_ in laid_out:
+            self.assertGreaterEqual(x, 0)
+            self.assertLessEqual(x + w, 512)
+        tops = [bubble[1] for bubble in laid_out]
+        self.assertEqual(tops, sorted(tops))
+
+    def test_font_shrinks_for_long_dialog(self):
+        short = bubbles.layout_bubbles(512, 512, (('A', 'Hi.'),), None, None)
+        long_line = 'We choose to go to the Moon in this decade and do the other things. ' * 3
+        crowded = bubbles.layout_bubbles(512, 512, tuple(('Kennedy', long_line) for _ in range(3)), None, None)
+        self.assertLess(crowded[0][5], short[0][5])
+        self.assertGreaterEqual(crowded[0][5], bubbles.MIN_FONT_SIZE)
+
+    def test_panel_keeps_its_size(self):
+        original = panel()
+        composited = bubbles.composite_panel(original, (('Armstrong', 'One small step.'),), None, None)
+        image = Image.open(BytesIO(composited)).convert('RGB')
+        self.assertEqual(image.size, (512, 512))
+        x, y, w, h = bubbles.layout_bubbles(512, 512, (('Armstrong', 'One small step.'),), None, None)[0][:4]
+        self.assertEqual(image.getpixel((x + w - 4, y + h // 2)), (255, 255, 255))
+
+    def test_placeholder_dialog_is_not_drawn(self):
+        original = panel()
+        self.assertIs(bubbles.composite(original, [bubbles.PLACEHOLDER_DIALOG]), original)
@@ -0,0 +1,99 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import jobs, status_store, utils, views
+from ..fakes import FakeWikipedia, UpstreamProfile
+from .support import MemoryStatusBackend, TempDirMixin
+
+
+class CancellationTests(TestCase):
+    def test_cancel_interrupts_a_waiting_call(self):
+        job = jobs.JobContext('cancel-wait')
+        threading.Timer(0.1, job.cancel).start()
+        started = time.monotonic()
+        with self.assertRaises(jobs.JobCancelled):
+            job.call('fetch', lambda timeout: time.sleep(2))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_deadline_cancels_the_job(self):
+        job = jobs.JobContext('cancel-deadline', deadline=0.01)
+        job.begin()
+        time.sleep(0.02)
+        with self.assertRaises(jobs.JobCancelled) as raised:
+            job.check()
+        self.assertEqual(raised.exception.reason, 'deadline')
+
+    def test_cancel_from_another_worker_reaches_the_job(self):
+        writer = status_store.StatusWriter(MemoryStatusBackend())
+        job = jobs.JobContext('cancel-remote', shared=writer)
+        writer.request_cancel('cancel-remote', 'replaced')
+        with self.assertRaises(jobs.JobCancelled) as raised:
+            job.check()
+        self.assertEqual(raised.exception.reason, 'replaced')
+
+    def test_polls_on_another_worker_keep_the_job_alive(self):
+        writer = status_store.StatusWriter(MemoryStatusBackend())
+        job = jobs.JobContext('cancel-polled', abandon_after=1.0, shared=writer)
+        job.heartbeat()
+        job._last_poll -= 10
+        writer.record_poll('cancel-polled')
+        job.check()
+        self.assertFalse(job.cancelled)
+
+    def test_endpoint_accepts_a_job_running_elsewhere(self):
+        views.update_status('cancel-elsewhere', {'status': 'IN_PROGRESS', 'progress': 50})
+        response = self.client.post(reverse('api_cancel_generation', args=['cancel-elsewhere']))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(status_store.get_writer().cancel_requested('cancel-elsewhere'), 'cancelled')
+
+    def test_endpoint_refuses_a_finished_job(self):
+        views.update_status('cancel-finished', {'status': 'COMPLETED', 'progress': 100})
+        response = self.client.post(reverse('api_cancel_generation', args=['cancel-finished']))
+        self.assertEqual(response.status_code, 409)
+
+
+class FetchTimeoutTests(TempDirMixin, TestCase):
+    def extractor(self, latency):
+        wiki = FakeWikipedia(UpstreamProfile({'kind': 'constant', 'median': latency}))
+        return utils.WikipediaExtractor(data_dir=self.make_dir(), backend=wiki)
+
+    def test_slow_fetch_gives_up_at_its_timeout(self):
+        extractor = self.extractor(2.0)
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            extractor.get_page_info('Moon', timeout=0.1)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIsNone(utils.fetch_time_left())
+
+    def test_abandoned_fetch_ends_with_its_stage_timeout(self):
+        extractor = self.extractor(0.5)
+        job = jobs.JobContext('fetch-timeout', stage_timeouts={'fetch': 0.1})
+        finished = threading.Event()
+
+        def fetch(timeout):
+            try:
+                return extractor.get_page_info('Moon', timeout=timeout)
+            finally:
+                finished.set()
+
+        with self.assertRaises(TimeoutError):
+            job.call('fetch', fetch)
+        # The upstream thread is not left waiting for the slow response
+        self.assertTrue(finished.wait(0.2))
+
+    def test_wikipedia_requests_get_the_time_left(self):
+        api = utils.get_wikipedia().wikipedia
+        self.assertIs(utils.get_wikipedia().wikipedia.requests, api.requests)
+        with mock.patch('requests.get') as get:
+            api.requests.get('https://en.wikipedia.org/w/api.php')
+            self.assertNotIn('timeout', get.call_args.kwargs)
+            utils._fetch_deadline.at = time.monotonic() + 5
+            try:
+                api.requests.get('https://en.wikipedia.org/w/api.php')
+            finally:
+                utils._fetch_deadline.at = None
+            self.assertLessEqual(get.call_args.kwargs['timeout'], 5)
@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from .. import cpu_pool
+from .support import TempDirMixin
+
+
+def slow_echo(data, seconds):
+    """Task for the pool's worker processes (module-level so they can import it)"""
+    time.sleep(seconds)
+    return data
+
+
+def wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class CPUPoolTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        self.spool = os.path.join(self.make_dir(), 'spool')
+        self.pool = cpu_pool.CPUPool(1, self.spool)
+        self.addCleanup(self.pool._executor.shutdown, cancel_futures=True)
+
+    def test_task_runs_in_a_worker_process(self):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, format='PNG')
+        resized = self.pool.run('resize', cpu_pool.resize_png, buffer.getvalue(), 100, timeout=30)
+        self.assertEqual(Image.open(BytesIO(resized)).size, (100, 50))
+        self.assertEqual(os.listdir(self.spool), [])
+        self.assertEqual(self.pool._in_flight, 0)
+
+    def test_timed_out_task_keeps_its_slot_until_it_finishes(self):
+        # Warm the worker up so the timeout below hits a running task
+        self.pool.run('echo', slow_echo, b'warm', 0, timeout=30)
+        with self.assertRaises(TimeoutError):
+            self.pool.run('echo', slow_echo, b'slow', 1.0, timeout=0.2)
+        self.assertEqual(self.pool._in_flight, 1)
+        self.assertEqual(len(os.listdir(self.spool)), 1)
+        self.assertTrue(wait_until(lambda: self.pool._in_flight == 0))
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_waiting_interactive_tasks_go_before_batch_tasks(self):
+        self.pool._acquire(interactive=True)
+        order = []
+
+        def acquire(name, interactive):
+            self.pool._acquire(interactive)
+            order.append(name)
+
+        batch = threading.Thread(target=acquire, args=('batch', False))
+        batch.start()
+        self.assertTrue(wait_until(lambda: self.pool._slots._waiters))
+        interactive = threading.Thread(target=acquire, args=('interactive', True))
+        interactive.start()
+        self.assertTrue(wait_until(lambda: self.pool._interactive_waiting == 1))
+        self.pool._release()
+        interactive.join(5)
+        self.pool._release()
+        batch.join(5)
+        self.pool._release()
+        self.assertEqual(order, ['interactive', 'batch'])
@@ -0,0 +1,49 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import views
+from ..models import ComicStore
+from .support import make_comic
+
+
+class ComicEtagTests(TestCase):
+    def test_unchanged_comic_is_not_modified(self):
+        comic_id = make_comic('Etag Comic', scenes=1)
+        url = reverse('api_get_comic', args=[comic_id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_new_scene_changes_the_etag(self):
+        comic_id = make_comic('Etag Growing', scenes=1)
+        url = reverse('api_get_comic', args=[comic_id])
+        etag = self.client.get(url)['ETag']
+        ComicStore.add_scene(comic_id, 2, 'Scene 2', 'comic_media/00/00/two.png')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['scenes']), 2)
+
+    def test_cached_payload_uses_each_host_in_image_urls(self):
+        comic_id = make_comic('Etag Hosts', scenes=1)
+        url = reverse('api_get_comic', args=[comic_id])
+        first = self.client.get(url, HTTP_HOST='one.example').json()
+        second = self.client.get(url, HTTP_HOST='two.example').json()
+        self.assertIn('one.example', first['scenes'][0]['image_url'])
+        self.assertIn('two.example', second['scenes'][0]['image_url'])
+
+    def test_sections_are_separate_representations(self):
+        comic_id = make_comic('Etag Sections', scenes=1)
+        url = reverse('api_get_comic', args=[comic_id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, {'sections': 'none'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class StatusEtagTests(TestCase):
+    def test_status_is_not_modified_until_it_changes(self):
+        views.update_status('etag-status-job', {'status': 'COMPLETED', 'progress': 100, 'message': 'Done'})
+        url = reverse('api_check_status', args=['etag-status-job'])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('api_check_status', args=['etag-unknown-job'])).status_code, 404)
@@ -0,0 +1,101 @@
+import json
+import time
+
+from django.test import TestCase
+from django.urls import reverse
+from wikipedia.exceptions import DisambiguationError
+
+from .. import metrics, status_store
+from ..fakes import FakeGroqClient, FakeWikipedia, LatencyModel, UpstreamProfile
+from ..management.commands.loadtest import percentile
+from ..models import ComicStore
+from .support import OfflineMixin
+
+
+class FakeUpstreamTests(TestCase):
+    def test_pages_are_stable_across_calls(self):
+        wiki = FakeWikipedia(UpstreamProfile({'kind': 'constant', 'median': 0.0}, payload_size=500))
+        first, second = wiki.page('Moon'), wiki.page('Moon')
+        self.assertEqual(first.revision_id, second.revision_id)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(len(first.content), 500)
+
+    def test_configured_failures_and_disambiguations_raise(self):
+        failing = FakeWikipedia(UpstreamProfile({'kind': 'constant', 'median': 0.0}, error_rate=1.0))
+        with self.assertRaises(ConnectionError):
+            failing.page('Moon')
+        ambiguous = FakeWikipedia(UpstreamProfile({'kind': 'constant', 'median': 0.0}),
+                                  disambiguation={'Mercury': ['Mercury (planet)']})
+        with self.assertRaises(DisambiguationError):
+            ambiguous.page('Mercury')
+
+    def test_slow_call_times_out(self):
+        wiki = FakeWikipedia(UpstreamProfile({'kind': 'constant', 'median': 0.05}))
+        with self.assertRaises(TimeoutError):
+            wiki._simulate('page', ConnectionError, timeout=0.01)
+        _, errors = wiki.recorder.snapshot()
+        self.assertEqual(errors, {'wikipedia.page': 1})
+
+    def test_completion_is_cut_at_max_tokens(self):
+        groq = FakeGroqClient(UpstreamProfile({'kind': 'constant', 'median': 0.0}))
+        response = groq.chat.completions.create([{'role': 'user', 'content': 'A storyline about "Moon"'}],
+                                                max_tokens=20)
+        self.assertEqual(response.choices[0].finish_reason, 'length')
+        self.assertEqual(response.usage.completion_tokens, 20)
+
+    def test_unknown_latency_distribution_is_rejected(self):
+        with self.assertRaises(ValueError):
+            LatencyModel('pareto')
+
+    def test_percentile_is_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile(list(range(1, 21)), 95), 19)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+class GenerationTests(OfflineMixin, TestCase):
+    """End to end through the scheduler against the offline fakes"""
+
+    def generate(self, title, **data):
+        response = self.client.post(reverse('api_generate_comic'), json.dumps(dict(title=title, num_scenes=2, **data)),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def wait_for_status(self, request_id, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            state = self.client.get(reverse('api_check_status', args=[request_id])).json()
+            if state.get('status') in status_store.TERMINAL_STATES:
+                return state
+            time.sleep(0.05)
+        self.fail(f'{request_id} did not finish')
+
+    def test_comic_is_generated_and_then_reused(self):
+        jobs_started, jobs_completed = metrics.JOBS_STARTED.value(), metrics.JOBS.value(outcome='completed')
+        started = self.generate('Moon', fresh=True)
+        state = self.wait_for_status(started['request_id'])
+        self.assertEqual(state['status'], 'COMPLETED')
+        self.assertLessEqual({'fetch', 'storyline', 'prompts', 'image', 'total'}, set(state['timings']))
+        self.assertEqual(metrics.JOBS_STARTED.value(), jobs_started + 1)
+        self.assertEqual(metrics.JOBS.value(outcome='completed'), jobs_completed + 1)
+        self.assertEqual(metrics.JOBS.value(outcome='started'), 0)
+        comic = self.client.get(reverse('api_get_comic', args=[started['comic_id']])).json()
+        self.assertEqual(len(comic['scenes']), 2)
+        samples, _ = self.recorder.snapshot()
+        self.assertEqual(len(samples['gemini.image']), 2)
+
+        reused = self.generate('Moon')
+        self.assertTrue(reused['reused'])
+        self.assertEqual(reused['comic_id'], started['comic_id'])
+
+    def test_partial_comic_is_not_reused(self):
+        started = self.generate('Mars', fresh=True)
+        self.wait_for_status(started['request_id'])
+        ComicStore.update_comic(started['comic_id'], {'expected_scenes': 3})
+        again = self.generate('Mars')
+        self.assertFalse(again['reused'])
+        self.assertNotEqual(again['comic_id'], started['comic_id'])
+        self.wait_for_status(again['request_id'])
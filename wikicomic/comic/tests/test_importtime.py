@@ -0,0 +1,31 @@
+import io
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from ..management.commands.importtime import parse_importtime
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        420 | io
+import time:  not a number |          5 | broken
+import time:        40 |       1500 | comic.urls
+"""
+
+
+class ImportTimeTests(SimpleTestCase):
+    def test_output_is_parsed_with_nesting_depth(self):
+        self.assertEqual(parse_importtime(SAMPLE), [
+            ('_io', 120, 120, 1),
+            ('io', 300, 420, 0),
+            ('comic.urls', 40, 1500, 0),
+        ])
+
+    def test_worker_boot_leaves_upstream_clients_unloaded(self):
+        out = io.StringIO()
+        call_command('importtime', '--runs', '1', '--budget', '100000', stdout=out)
+        self.assertIn('Within budget', out.getvalue())
+
+    def test_exceeded_budget_fails(self):
+        with self.assertRaisesMessage(CommandError, 'exceeds'):
+            call_command('importtime', '--runs', '1', '--budget', '0', stdout=io.StringIO())
@@ -0,0 +1,44 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import ComicStore
+from .support import make_comic
+
+
+class ListComicsTests(TestCase):
+    def test_cursor_pages_through_every_match_once(self):
+        ids = [make_comic('Paginated') for _ in range(5)]
+        seen, cursor = [], None
+        while True:
+            results, cursor = ComicStore.list_comics(limit=2, cursor=cursor, title_prefix='Paginated')
+            seen.extend(comic['id'] for comic in results)
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(reversed(ids)))
+
+    def test_no_cursor_when_the_last_page_is_exactly_full(self):
+        for _ in range(2):
+            make_comic('Exactly Full')
+        results, cursor = ComicStore.list_comics(limit=2, title_prefix='Exactly Full')
+        self.assertEqual(len(results), 2)
+        self.assertIsNone(cursor)
+
+    def test_status_and_style_filters_follow_updates(self):
+        comic_id = make_comic('Filtered', comic_style='watercolor-test')
+        ComicStore.update_status(comic_id, 'completed')
+        results, _ = ComicStore.list_comics(status='completed', style='watercolor-test')
+        self.assertEqual([comic['id'] for comic in results], [comic_id])
+        results, _ = ComicStore.list_comics(status='pending', style='watercolor-test')
+        self.assertEqual(results, [])
+
+    def test_endpoint_returns_summaries_without_storylines(self):
+        comic_id = make_comic('Listed Summary', scenes=1)
+        response = self.client.get(reverse('api_list_comics'), {'title_prefix': 'Listed Summary', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([comic['id'] for comic in results], [comic_id])
+        self.assertNotIn('storyline', results[0])
+
+    def test_endpoint_rejects_bad_dates(self):
+        response = self.client.get(reverse('api_list_comics'), {'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
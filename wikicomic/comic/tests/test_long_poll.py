@@ -0,0 +1,44 @@
+import threading
+import time
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import views
+from ..models import ComicStore
+from .support import make_comic
+
+
+class LongPollTests(TestCase):
+    def test_waiter_wakes_on_a_new_scene(self):
+        comic_id = make_comic('Long Poll')
+        threading.Timer(0.1, ComicStore.add_scene, (comic_id, 1, 'Scene 1', 'one.png')).start()
+        started = time.monotonic()
+        self.assertTrue(ComicStore.wait_for_scenes(comic_id, 0, timeout=5))
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_waiter_is_not_woken_by_other_comics(self):
+        watched, other = make_comic('Long Poll Watched'), make_comic('Long Poll Other')
+        threading.Timer(0.05, ComicStore.add_scene, (other, 1, 'Scene 1', 'one.png')).start()
+        self.assertFalse(ComicStore.wait_for_scenes(watched, 0, timeout=0.3))
+        self.assertNotIn(watched, ComicStore._waiters)
+
+    def test_view_returns_the_new_scene(self):
+        comic_id = make_comic('Long Poll View')
+        threading.Timer(0.1, ComicStore.add_scene, (comic_id, 1, 'Scene 1', 'one.png')).start()
+        response = self.client.get(reverse('api_get_comic', args=[comic_id]), {'wait_for_scenes': 0, 'timeout': 5})
+        self.assertEqual(len(response.json()['scenes']), 1)
+
+    @override_settings(COMIC_LONG_POLL_MAX_WAITERS=1)
+    def test_waiters_past_the_cap_get_503(self):
+        views._long_poll_semaphore = None
+        self.addCleanup(setattr, views, '_long_poll_semaphore', None)
+        comic_id = make_comic('Long Poll Capped')
+        url = reverse('api_get_comic', args=[comic_id])
+        holder = threading.Thread(target=Client().get, args=(url, {'wait_for_scenes': 0, 'timeout': 1}))
+        holder.start()
+        time.sleep(0.2)
+        response = self.client.get(url, {'wait_for_scenes': 0, 'timeout': 1})
+        holder.join()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
@@ -0,0 +1,44 @@
+import os
+import time
+
+from django.test import TestCase
+
+from ..media_store import MediaStore
+from .support import TempDirMixin
+
+
+class MediaStoreTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.root = self.make_dir()
+        self.store = MediaStore(self.root)
+
+    def absolute(self, path):
+        return os.path.join(self.root, *path.split('/'))
+
+    def test_identical_bytes_are_stored_once(self):
+        digest, path = self.store.put(b'panel')
+        self.assertEqual(self.store.put(b'panel'), (digest, path))
+        self.assertEqual(path, f'comic_media/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        with open(self.absolute(path), 'rb') as f:
+            self.assertEqual(f.read(), b'panel')
+
+    def test_removed_object_is_written_again(self):
+        digest, path = self.store.put(b'panel')
+        os.remove(self.absolute(path))
+        self.assertFalse(self.store.exists(digest))
+        self.store.put(b'panel')
+        self.assertTrue(self.store.exists(digest))
+
+    def test_reuse_and_serving_refresh_the_last_access(self):
+        _, path = self.store.put(b'panel')
+        os.utime(self.absolute(path), (0, 0))
+        self.store.put(b'panel')
+        self.assertGreater(os.path.getmtime(self.absolute(path)), time.time() - 60)
+
+        os.utime(self.absolute(path), (0, 0))
+        self.store.touch(path)
+        self.assertGreater(os.path.getmtime(self.absolute(path)), time.time() - 60)
+        # Touches of one file are throttled
+        os.utime(self.absolute(path), (0, 0))
+        self.store.touch(path)
+        self.assertEqual(os.path.getmtime(self.absolute(path)), 0)
@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from .. import metrics
+
+
+class MetricsTests(SimpleTestCase):
+    def test_counter_requires_its_labels(self):
+        counter = metrics.Counter('test_requests_total', 'Requests.', ['result'])
+        counter.inc(result='hit')
+        counter.inc(2, result='hit')
+        self.assertEqual(counter.value(result='hit'), 3)
+        with self.assertRaises(ValueError):
+            counter.inc(cache='status')
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Durations.', ['stage'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, stage='fetch')
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{stage="fetch",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="fetch",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="fetch",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{stage="fetch"} 3', lines)
+
+    def test_metric_names_are_unique(self):
+        registry = metrics.Registry()
+        registry.register(metrics.Counter('test_total', 'Test.'))
+        with self.assertRaises(ValueError):
+            registry.register(metrics.Gauge('test_total', 'Test.'))
+
+    def test_endpoint_renders_job_starts_separately(self):
+        rendered = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE comic_jobs_started_total counter', rendered)
+        self.assertNotIn('outcome="started"', rendered)
+
+
+class JobTimingsTests(SimpleTestCase):
+    def test_repeated_stages_accumulate(self):
+        timings = metrics.JobTimings()
+        timings.add('image', 0.5, scene=1)
+        timings.add('image', 0.25, scene=2)
+        with timings.stage('fetch'):
+            pass
+        data = timings.as_dict()
+        self.assertEqual(data['image'], 0.75)
+        self.assertEqual(data['images'], [{'scene': 1, 'seconds': 0.5}, {'scene': 2, 'seconds': 0.25}])
+        self.assertIn('fetch', data)
+        self.assertGreaterEqual(data['total'], data['fetch'])
+
+    def test_failed_stage_is_still_timed(self):
+        timings = metrics.JobTimings()
+        with self.assertRaises(RuntimeError):
+            with timings.stage('storyline'):
+                raise RuntimeError('upstream failed')
+        self.assertIn('storyline', timings.as_dict())
@@ -0,0 +1,30 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..composer import GUTTER, plan_pages
+from .support import make_comic
+
+
+class PagePlanningTests(TestCase):
+    def scenes(self, count):
+        return [{'scene_number': number, 'image': f'{number}.png'} for number in range(1, count + 1)]
+
+    def test_scenes_fill_pages_in_reading_order(self):
+        pages = plan_pages(self.scenes(7), 'grid', columns=2, rows=3, cell=100)
+        self.assertEqual([len(page['panels']) for page in pages], [6, 1])
+        self.assertEqual(pages[0]['width'], GUTTER + 2 * (100 + GUTTER))
+        self.assertEqual(pages[1]['height'], GUTTER + (100 + GUTTER))
+        first, second = pages[0]['panels'][:2]
+        self.assertEqual((first['x'], first['y']), (GUTTER, GUTTER))
+        self.assertEqual(second['x'], GUTTER + 100 + GUTTER)
+
+    def test_manga_reads_right_to_left(self):
+        panels = plan_pages(self.scenes(2), 'manga', columns=2, rows=1, cell=100)[0]['panels']
+        self.assertGreater(panels[0]['x'], panels[1]['x'])
+
+    def test_pages_endpoint_validates_the_layout(self):
+        url = reverse('api_get_comic_pages', args=[make_comic('Paged', scenes=2)])
+        self.assertEqual(self.client.get(url, {'layout': 'spiral'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'columns': 9}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'rows': 'two'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_get_comic_pages', args=['missing'])).status_code, 404)
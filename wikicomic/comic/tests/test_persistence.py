@@ -0,0 +1,85 @@
+import os
+import threading
+
+from django.test import SimpleTestCase
+
+from ..persistence import ArticlePersister, atomic_write
+from .support import TempDirMixin
+
+
+class RecordingArchive:
+    """Archive stand-in that records writes and can hold the persister inside `put`"""
+
+    def __init__(self, revision=None):
+        self.revision = revision
+        self.puts = []
+        self.touches = []
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def put(self, record):
+        self.writing.set()
+        self.release.wait(5)
+        self.puts.append(record)
+
+    def touch(self, title):
+        self.touches.append(title)
+
+    def revision_id(self, title):
+        return self.revision
+
+
+def article(title, text='Text', revision_id=1, timestamp='2026-01-01T00:00:00'):
+    return {'title': title, 'url': f'https://en.wikipedia.org/wiki/{title}', 'content': text, 'summary': text,
+            'revision_id': revision_id, 'timestamp': timestamp, 'links': ['dropped']}
+
+
+class ArticlePersisterTests(SimpleTestCase):
+    def test_queued_submissions_of_a_title_are_coalesced(self):
+        archive = RecordingArchive()
+        persister = ArticlePersister(archive)
+        archive.release.clear()
+        persister.submit(article('Moon'))
+        self.assertTrue(archive.writing.wait(5))
+        # The persister is busy with Moon, so these queue up and only the newest Mars is written
+        for version in range(3):
+            persister.submit(article('Mars', text=f'Version {version}'))
+        archive.release.set()
+        self.assertTrue(persister.flush(5))
+        self.assertEqual([(record['title'], record['content']) for record in archive.puts],
+                         [('Moon', 'Text'), ('Mars', 'Version 2')])
+        self.assertNotIn('links', archive.puts[0])
+
+    def test_unchanged_article_is_touched_not_rewritten(self):
+        archive = RecordingArchive()
+        persister = ArticlePersister(archive)
+        written = []
+        persister.add_listener(written.append)
+        persister.submit(article('Moon'))
+        persister.flush(5)
+        persister.submit(article('Moon', timestamp='2026-01-02T00:00:00'))
+        persister.flush(5)
+        self.assertEqual(len(archive.puts), 1)
+        self.assertEqual(archive.touches, ['Moon'])
+        self.assertEqual(len(written), 1)
+
+    def test_archived_revision_counts_as_unchanged_after_restart(self):
+        archive = RecordingArchive(revision=7)
+        persister = ArticlePersister(archive)
+        persister.submit(article('Moon', revision_id=7))
+        persister.submit(article('Mars', revision_id=8))
+        persister.flush(5)
+        self.assertEqual([record['title'] for record in archive.puts], ['Mars'])
+        self.assertEqual(archive.touches, ['Moon'])
+
+
+class AtomicWriteTests(TempDirMixin, SimpleTestCase):
+    def test_file_is_replaced_without_leftovers(self):
+        directory = self.make_dir()
+        path = os.path.join(directory, 'snapshot.json')
+        atomic_write(path, b'old')
+        atomic_write(path, b'new')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'new')
+        self.assertEqual(os.listdir(directory), ['snapshot.json'])
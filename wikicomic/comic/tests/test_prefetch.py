@@ -0,0 +1,75 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .. import prefetch, scheduler
+from ..jobs import JobContext
+
+
+class PrefetchTests(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = scheduler.JobScheduler(1, reserved_interactive=0)
+        patcher = mock.patch.object(prefetch.scheduler, 'get_scheduler', return_value=self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def block_worker(self):
+        started = threading.Event()
+
+        def hold():
+            started.set()
+            self.release.wait(10)
+
+        self.scheduler.submit('blocker', hold, (), priority=scheduler.BATCH)
+        self.assertTrue(started.wait(5))
+
+    def test_matching_storyline_is_used(self):
+        prefetcher = prefetch.Prefetcher()
+        session = {}
+        started = prefetcher.start(session, 'Moon', 'medium', lambda s: s.finish('storyline'))
+        self.assertTrue(started._done.wait(5))
+        speculation = prefetcher.claim(session, 'Moon', 'medium')
+        self.assertEqual(speculation.wait(JobContext('job')), 'storyline')
+
+    def test_other_length_cancels_the_speculation(self):
+        prefetcher = prefetch.Prefetcher()
+        session = {}
+        self.block_worker()
+        speculation = prefetcher.start(session, 'Moon', 'medium', lambda s: s.finish('storyline'))
+        self.assertIsNone(prefetcher.claim(session, 'Moon', 'long'))
+        self.assertTrue(speculation.job.cancelled)
+
+    def test_queued_speculation_is_dropped_instead_of_waited_for(self):
+        prefetcher = prefetch.Prefetcher()
+        session = {}
+        ran = threading.Event()
+        self.block_worker()
+        prefetcher.start(session, 'Moon', 'medium', lambda s: ran.set())
+        speculation = prefetcher.claim(session, 'Moon', 'medium')
+        start = time.monotonic()
+        self.assertIsNone(speculation.wait(JobContext('job')))
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertTrue(speculation.done)
+        self.release.set()
+        self.assertFalse(ran.wait(0.5))
+
+    def test_running_speculation_is_waited_for_until_its_deadline(self):
+        prefetcher = prefetch.Prefetcher(deadline=0.5)
+        session = {}
+        running = threading.Event()
+
+        def stuck(speculation):
+            running.set()
+            self.release.wait(10)
+
+        prefetcher.start(session, 'Moon', 'medium', stuck)
+        self.assertTrue(running.wait(5))
+        speculation = prefetcher.claim(session, 'Moon', 'medium')
+        start = time.monotonic()
+        self.assertIsNone(speculation.wait(JobContext('job')))
+        self.assertLess(time.monotonic() - start, 2.0)
+        self.assertTrue(speculation.job.cancelled)
@@ -0,0 +1,67 @@
+import io
+from unittest import mock
+
+import requests
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..management.commands.pregenerate import DEFAULT_OPTIONS, Command
+from ..models import ComicStore
+from .support import OfflineMixin, make_comic
+
+SERVER = 'http://testserver/comic'
+
+
+class ClientSession:
+    """Stand-in for the command's requests.Session that sends its calls through the Django test client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, url, params=None, timeout=None):
+        return ClientResponse(self.client.get(url[len('http://testserver'):], params or {}))
+
+    def post(self, url, json=None, timeout=None):
+        return ClientResponse(self.client.post(url[len('http://testserver'):], json or {},
+                                               content_type='application/json'))
+
+
+class ClientResponse:
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+
+    def json(self):
+        return self.response.json()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}')
+
+
+class PregenerateTests(OfflineMixin, TestCase):
+    def pregenerate(self, *topics):
+        out = io.StringIO()
+        with mock.patch('requests.Session', return_value=ClientSession(self.client)):
+            call_command('pregenerate', *topics, '--server', SERVER, '--num-scenes', '2', '--concurrency', '1',
+                         '--poll-interval', '0.05', '--data-dir', self.workdir, stdout=out)
+        return out.getvalue()
+
+    def test_rerun_is_answered_by_the_server_reuse(self):
+        self.assertIn('1 generated', self.pregenerate('Venus'))
+        self.assertIn('1 reused', self.pregenerate('Venus'))
+
+    def test_partial_comic_is_generated_again(self):
+        self.assertIn('1 generated', self.pregenerate('Jupiter'))
+        comic_id = ComicStore.find_completed('Jupiter', dict(DEFAULT_OPTIONS, num_scenes=2))
+        ComicStore.update_comic(comic_id, {'expected_scenes': 3})
+        self.assertIn('1 generated', self.pregenerate('Jupiter'))
+
+    def test_comic_with_missing_scenes_is_partial(self):
+        comic_id = make_comic('Saturn', scenes=2, status='completed')
+        ComicStore.update_comic(comic_id, {'expected_scenes': 3})
+        command = Command()
+        command.server, command.http = SERVER, ClientSession(self.client)
+        outcome, detail = command._check_scenes(comic_id)
+        self.assertEqual(outcome, 'partial')
+        self.assertIn('2 of 3', detail)
@@ -0,0 +1,84 @@
+import time
+
+from django.test import SimpleTestCase
+
+from .. import jobs
+from ..routing import MIN_SAMPLES, HedgeBudget, LatencyWindow, ModelRouter
+
+
+class LatencyWindowTests(SimpleTestCase):
+    def test_percentile_waits_for_enough_samples(self):
+        window = LatencyWindow()
+        for _ in range(MIN_SAMPLES - 1):
+            window.add(1.0)
+        self.assertIsNone(window.percentile(95))
+        window.add(1.0)
+        self.assertEqual(window.percentile(95), 1.0)
+
+    def test_oldest_samples_leave_the_window(self):
+        window = LatencyWindow(size=MIN_SAMPLES)
+        for _ in range(MIN_SAMPLES):
+            window.add(10.0)
+        for _ in range(MIN_SAMPLES):
+            window.add(1.0)
+        self.assertEqual(window.percentile(100), 1.0)
+
+
+class HedgeBudgetTests(SimpleTestCase):
+    def test_hedges_are_limited_to_the_earned_share(self):
+        budget = HedgeBudget(ratio=0.5, burst=1.0)
+        self.assertTrue(budget.spend())
+        self.assertFalse(budget.spend())
+        budget.earn()
+        budget.earn()
+        self.assertTrue(budget.spend())
+
+
+class ModelRouterTests(SimpleTestCase):
+    def test_failed_model_falls_back_to_the_next(self):
+        router = ModelRouter({'storyline': ['primary', 'fallback']}, hedging=False)
+        calls = []
+
+        def request(model, timeout):
+            calls.append(model)
+            if model == 'primary':
+                raise RuntimeError('primary down')
+            return model
+
+        self.assertEqual(router.call('storyline', request), 'fallback')
+        self.assertEqual(calls, ['primary', 'fallback'])
+
+    def test_fallbacks_share_the_stage_timeout(self):
+        router = ModelRouter({'storyline': ['primary', 'fallback']}, hedging=False)
+        job = jobs.JobContext('router-deadline', stage_timeouts={'storyline': 1.0})
+        timeouts = {}
+
+        def request(model, timeout):
+            timeouts[model] = timeout
+            if model == 'primary':
+                time.sleep(0.4)
+                raise RuntimeError('primary down')
+            return model
+
+        router.call('storyline', request, job)
+        self.assertLessEqual(timeouts['fallback'], 0.65)
+
+    def test_slow_call_is_hedged(self):
+        router = ModelRouter({'storyline': ['primary']}, min_hedge_delay=0.05)
+        for _ in range(MIN_SAMPLES):
+            router._window('storyline', 'primary').add(0.01)
+        attempts = []
+
+        def request(model, timeout):
+            attempts.append(model)
+            if len(attempts) == 1:
+                time.sleep(1)
+                return 'slow'
+            return 'hedge'
+
+        self.assertEqual(router.call('storyline', request), 'hedge')
+        self.assertEqual(len(attempts), 2)
+
+    def test_no_hedge_without_latency_history(self):
+        router = ModelRouter({'storyline': ['primary']})
+        self.assertIsNone(router.hedge_delay('storyline', 'primary'))
@@ -0,0 +1,70 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from .. import scheduler
+
+
+class FairQueueTests(SimpleTestCase):
+    def job(self, job_id, client, cost=1.0):
+        return scheduler._Job(job_id, print, (), client, scheduler.INTERACTIVE, cost)
+
+    def test_clients_take_turns(self):
+        queue = scheduler._FairQueue()
+        for number in range(4):
+            queue.push(self.job(f'heavy-{number}', 'heavy'))
+        queue.push(self.job('light-0', 'light'))
+        order = [queue.pop().job_id for _ in range(5)]
+        self.assertLessEqual(order.index('light-0'), 1)
+
+    def test_cheapest_job_of_a_client_goes_first(self):
+        queue = scheduler._FairQueue()
+        queue.push(self.job('long', 'client', cost=10))
+        queue.push(self.job('short', 'client', cost=2))
+        self.assertEqual(queue.pop().job_id, 'short')
+
+    def test_removed_job_is_not_handed_out(self):
+        queue = scheduler._FairQueue()
+        queue.push(self.job('kept', 'a'))
+        queue.push(self.job('dropped', 'b'))
+        self.assertIsNotNone(queue.remove('dropped'))
+        self.assertEqual(queue.pop().job_id, 'kept')
+        self.assertIsNone(queue.pop())
+
+    def test_cost_grows_with_scenes_and_length(self):
+        self.assertLess(scheduler.expected_cost({'num_scenes': 4}), scheduler.expected_cost({'num_scenes': 8}))
+        self.assertLess(scheduler.expected_cost({'num_scenes': 8, 'target_length': 'short'}),
+                        scheduler.expected_cost({'num_scenes': 8, 'target_length': 'long'}))
+        self.assertEqual(scheduler.expected_cost({'num_scenes': 'many'}), scheduler.expected_cost(None))
+
+
+class JobSchedulerTests(SimpleTestCase):
+    def test_batch_jobs_leave_the_reserved_workers_to_interactive_ones(self):
+        pool = scheduler.JobScheduler(workers=2, reserved_interactive=1)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        started, priorities = [], {}
+        lock = threading.Condition()
+
+        def job(name):
+            with lock:
+                started.append(name)
+                priorities[name] = scheduler.current_priority()
+                lock.notify_all()
+            release.wait(5)
+
+        pool.submit('batch-1', job, ('batch-1',), priority=scheduler.BATCH)
+        pool.submit('batch-2', job, ('batch-2',), priority=scheduler.BATCH)
+        pool.submit('interactive', job, ('interactive',))
+        with lock:
+            self.assertTrue(lock.wait_for(lambda: len(started) == 2, 5))
+        self.assertEqual(sorted(started), ['batch-1', 'interactive'])
+        self.assertEqual(priorities, {'batch-1': scheduler.BATCH, 'interactive': scheduler.INTERACTIVE})
+        self.assertEqual(pool.stats()[scheduler.BATCH], {'queued': 1, 'running': 1})
+        # A job still queued can be withdrawn
+        self.assertTrue(pool.remove('batch-2'))
+        self.assertFalse(pool.remove('batch-2'))
+
+    def test_unknown_priority_is_rejected(self):
+        with self.assertRaises(ValueError):
+            scheduler.JobScheduler(workers=1).submit('job', print, (), priority='urgent')
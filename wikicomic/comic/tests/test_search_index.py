@@ -0,0 +1,66 @@
+import os
+import time
+
+from django.test import TestCase
+
+from ..archive import ArticleArchive
+from ..search_index import RecentResults, SearchIndex
+from ..storage_gc import collect_articles
+from .support import TempDirMixin
+
+
+class SearchIndexTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.archive = ArticleArchive(os.path.join(self.make_dir(), 'articles.sqlite3'))
+        self.archive.put({'title': 'Apollo 11', 'content': 'Apollo 11 landed the first humans on the Moon.'})
+        self.archive.put({'title': 'Moon', 'content': 'The Moon is the natural satellite of Earth. Moon tides.'})
+        self.archive.put({'title': 'Tide', 'content': 'Tides are caused by the gravity of the Moon and the Sun.'})
+        self.index = SearchIndex(self.archive, refresh_interval=3600)
+        self.index.refresh(force=True)
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.index.search('moon')[0][0], 'Moon')
+
+    def test_exact_title_always_wins(self):
+        self.assertEqual(self.index.search('Tide')[0], ('Tide', float('inf')))
+
+    def test_reindexing_reuses_the_doc_id(self):
+        for revision in range(3):
+            self.index.add({'title': 'Moon', 'content': f'Revision {revision} of the lunar article'})
+        self.assertEqual(len(self.index._titles), 3)
+        self.assertEqual(self.index.search('lunar')[0][0], 'Moon')
+        self.assertNotIn('Moon', [title for title, _ in self.index.search('satellite')])
+
+    def test_refresh_skips_touched_articles(self):
+        time.sleep(0.01)
+        self.archive.touch('Moon')
+        self.assertEqual(self.index.refresh(force=True), 0)
+
+    def test_refresh_drops_articles_deleted_from_the_archive(self):
+        self.archive.delete(['Moon'])
+        self.index.refresh(force=True)
+        self.assertEqual(len(self.index), 2)
+        self.assertNotIn('Moon', [title for title, _ in self.index.search('moon')])
+        self.assertNotEqual(self.index.search('Moon')[0][1], float('inf'))
+
+    def test_garbage_collected_articles_leave_the_index(self):
+        collect_articles(self.archive, quota=0, protected={'Tide'}, min_age=0)
+        self.index.refresh(force=True)
+        self.assertEqual([title for title, _ in self.index.search('moon tides')], ['Tide'])
+
+    def test_removed_article_can_be_indexed_again(self):
+        self.assertTrue(self.index.remove('Moon'))
+        self.assertFalse(self.index.remove('Moon'))
+        self.index.add({'title': 'Moon', 'content': 'Lunar surface.'})
+        self.assertEqual(self.index.search('lunar')[0][0], 'Moon')
+
+
+class RecentResultsTests(TestCase):
+    def test_least_recent_query_is_evicted(self):
+        recent = RecentResults(max_entries=2)
+        recent.put('Moon', ['Moon'])
+        recent.put('Mars', ['Mars'])
+        self.assertEqual(recent.get('moon'), ['Moon'])
+        recent.put('Venus', ['Venus'])
+        self.assertIsNone(recent.get('Mars'))
+        self.assertEqual(recent.get('MOON'), ['Moon'])
@@ -0,0 +1,64 @@
+import os
+import time
+
+from django.test import TestCase, override_settings
+
+from .. import status_store
+from .support import MemoryStatusBackend, TempDirMixin
+
+
+class StatusWriterTests(TestCase):
+    def test_progress_updates_are_coalesced(self):
+        backend = MemoryStatusBackend()
+        writer = status_store.StatusWriter(backend, min_interval=60.0)
+        for progress in range(10, 60, 10):
+            writer.write('job', {'status': 'IN_PROGRESS', 'progress': progress})
+        self.assertEqual(len(backend.writes), 1)
+        writer.write('job', {'status': 'COMPLETED', 'progress': 100})
+        self.assertEqual(len(backend.writes), 2)
+        self.assertEqual(backend.data['job']['status'], 'COMPLETED')
+
+    def test_progress_never_goes_backwards(self):
+        backend = MemoryStatusBackend()
+        writer = status_store.StatusWriter(backend, min_interval=0.0)
+        writer.write('job', {'status': 'IN_PROGRESS', 'progress': 70})
+        writer.write('job', {'status': 'ERROR', 'progress': 0})
+        self.assertEqual(backend.data['job']['progress'], 70)
+
+    def test_forget_flushes_the_pending_update(self):
+        backend = MemoryStatusBackend()
+        writer = status_store.StatusWriter(backend, min_interval=60.0)
+        writer.write('job', {'status': 'IN_PROGRESS', 'progress': 10})
+        writer.write('job', {'status': 'IN_PROGRESS', 'progress': 20})
+        writer.forget('job')
+        self.assertEqual(backend.data['job']['progress'], 20)
+
+
+class StatusBackendTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.path = os.path.join(self.make_dir(), 'status.sqlite3')
+
+    def test_sqlite_backend_is_the_default(self):
+        writer = status_store._writer
+        self.addCleanup(setattr, status_store, '_writer', writer)
+        status_store._writer = None
+        with override_settings(COMIC_STATUS_BACKEND=None, BASE_DIR=os.path.dirname(self.path)):
+            backend = status_store.get_writer().backend
+        self.assertIsInstance(backend, status_store.SQLiteStatusBackend)
+        self.assertEqual(backend.path, self.path)
+
+    def test_workers_share_the_sqlite_file(self):
+        # Two backends on one file stand in for two worker processes
+        first = status_store.StatusWriter(status_store.SQLiteStatusBackend(self.path))
+        second = status_store.StatusWriter(status_store.SQLiteStatusBackend(self.path))
+        first.write('job', {'status': 'IN_PROGRESS', 'progress': 40})
+        self.assertEqual(second.read('job')['progress'], 40)
+        second.request_cancel('job', 'user')
+        self.assertEqual(first.cancel_requested('job'), 'user')
+        second.record_poll('job')
+        self.assertAlmostEqual(first.last_poll('job'), time.time(), delta=5)
+
+    def test_expired_status_is_not_returned(self):
+        backend = status_store.SQLiteStatusBackend(self.path)
+        backend.set('job', {'status': 'COMPLETED'}, timeout=-1)
+        self.assertIsNone(backend.get('job'))
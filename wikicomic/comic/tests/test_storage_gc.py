@@ -0,0 +1,64 @@
+import os
+import time
+
+from django.test import TestCase
+
+from .. import storage_gc
+from ..archive import ArticleArchive
+from ..media_store import MediaStore
+from .support import TempDirMixin
+
+
+class GarbageCollectionTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.root = self.make_dir()
+        self.store = MediaStore(self.root)
+        self.index = storage_gc.MediaIndex(self.root)
+        self.addCleanup(self.index.conn.close)
+
+    def stored(self, data, age):
+        _, path = self.store.put(data)
+        last_access = time.time() - age
+        os.utime(os.path.join(self.root, *path.split('/')), (last_access, last_access))
+        return path
+
+    def exists(self, path):
+        return os.path.exists(os.path.join(self.root, *path.split('/')))
+
+    def test_least_recently_used_files_go_first(self):
+        oldest, older, recent = self.stored(b'a' * 100, 300), self.stored(b'b' * 100, 200), self.stored(b'c' * 100, 100)
+        self.index.scan()
+        report = self.index.evict(quota=150, protected=set(), min_age=0)
+        self.assertEqual(report, {'files': 2, 'bytes': 200})
+        self.assertEqual([self.exists(path) for path in (oldest, older, recent)], [False, False, True])
+
+    def test_protected_and_recent_files_are_kept(self):
+        pinned, fresh = self.stored(b'a' * 100, 300), self.stored(b'b' * 100, 10)
+        self.index.scan()
+        self.index.evict(quota=0, protected={pinned}, min_age=60)
+        self.assertTrue(self.exists(pinned))
+        self.assertTrue(self.exists(fresh))
+
+    def test_dry_run_deletes_nothing(self):
+        path = self.stored(b'a' * 100, 300)
+        self.index.scan()
+        self.assertEqual(self.index.evict(quota=0, protected=set(), min_age=0, dry_run=True), {'files': 1, 'bytes': 100})
+        self.assertTrue(self.exists(path))
+
+    def test_pins_of_silent_workers_expire(self):
+        self.index.publish_pins('worker-a', ['comic_media/aa/bb/x.png'], ['Moon'])
+        self.assertEqual(self.index.pinned(), ({'comic_media/aa/bb/x.png'}, {'Moon'}))
+        self.index.conn.execute('UPDATE pin_owners SET seen_at = 0')
+        self.assertEqual(self.index.pinned(), (set(), set()))
+
+
+class ArticleCollectionTests(TempDirMixin, TestCase):
+    def test_least_recently_read_articles_are_deleted_until_under_quota(self):
+        archive = ArticleArchive(os.path.join(self.make_dir(), 'articles.sqlite3'))
+        for age, title in ((300, 'Moon'), (200, 'Mars'), (100, 'Venus'), (400, 'Earth')):
+            archive.put({'title': title, 'content': title * 200}, stored_at=time.time() - age)
+        sizes = {title: size for title, size, _ in archive.least_recently_used()}
+        report = storage_gc.collect_articles(archive, quota=sizes['Earth'] + sizes['Venus'], protected={'Earth'},
+                                             min_age=0)
+        self.assertEqual(report['articles'], 2)
+        self.assertEqual(sorted(archive.titles()), ['Earth', 'Venus'])
@@ -0,0 +1,65 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import ComicStore
+from ..utils import parse_storyline_sections, split_scene_prompts
+from .support import make_comic
+
+STORYLINE = """# Moon: Comic Storyline
+
+## Overview
+A short trip to the Moon.
+
+## Main Characters
+- **Narrator**: Tells the story.
+
+## Act 1: Launch
+The rocket lifts off.
+
+It clears the tower.
+"""
+
+
+class StorylineParsingTests(TestCase):
+    def test_sections_keep_storyline_order(self):
+        sections = parse_storyline_sections(STORYLINE)
+        self.assertEqual(list(sections), ['title', 'Overview', 'Main Characters', 'Act 1: Launch'])
+        self.assertEqual(sections['title'], 'Moon: Comic Storyline')
+        # Blank lines are dropped inside a section
+        self.assertEqual(sections['Act 1: Launch'], 'The rocket lifts off.\nIt clears the tower.\n')
+
+    def test_text_before_the_first_heading_is_ignored(self):
+        self.assertEqual(parse_storyline_sections('Sure! Here it is.\n## Overview\nText'), {'Overview': 'Text\n'})
+
+    def test_scene_prompts_are_split_on_scene_markers(self):
+        scenes = split_scene_prompts('Here you go:\nScene 1: Launch\nDialog: A: "Go"\n\nScene 2: Landing\n')
+        self.assertEqual(scenes, ['Scene 1: Launch\nDialog: A: "Go"', 'Scene 2: Landing'])
+
+
+class StorylineApiTests(TestCase):
+    def setUp(self):
+        self.comic_id = make_comic('Moon', scenes=1)
+        ComicStore.update_comic(self.comic_id, {'storyline': STORYLINE,
+                                                'storyline_sections': parse_storyline_sections(STORYLINE)})
+
+    def get(self, **params):
+        response = self.client.get(reverse('api_get_comic', args=[self.comic_id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_comic_has_raw_and_structured_storyline(self):
+        data = self.get()
+        self.assertEqual(data['storyline'], STORYLINE)
+        self.assertEqual(data['section_headings'], ['title', 'Overview', 'Main Characters', 'Act 1: Launch'])
+        self.assertEqual(data['storyline_sections'][1], {'heading': 'Overview', 'content': 'A short trip to the Moon.'})
+
+    def test_only_requested_sections_are_returned(self):
+        data = self.get(sections='Act 1: Launch, Overview,Epilogue')
+        self.assertNotIn('storyline', data)
+        self.assertEqual([section['heading'] for section in data['storyline_sections']], ['Overview', 'Act 1: Launch'])
+
+    def test_storyline_can_be_skipped(self):
+        data = self.get(sections='none')
+        self.assertNotIn('storyline', data)
+        self.assertNotIn('storyline_sections', data)
+        self.assertEqual(len(data['scenes']), 1)
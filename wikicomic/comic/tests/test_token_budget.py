@@ -0,0 +1,57 @@
+from django.test import SimpleTestCase
+
+from ..fakes import FakeGroqClient, UpstreamProfile
+from ..utils import StoryGenerator
+
+
+def generator(payload_size=0):
+    client = FakeGroqClient(UpstreamProfile({'kind': 'constant', 'median': 0.0}, payload_size=payload_size))
+    return StoryGenerator(client=client)
+
+
+def messages(text):
+    return [{'role': 'system', 'content': 'You write comics.'},
+            {'role': 'user', 'content': f'Base the storyline on:\n{text}\nFORMAT YOUR RESPONSE AS: ...'}]
+
+
+class TokenBudgetTests(SimpleTestCase):
+    def test_short_prompt_is_left_alone(self):
+        story = generator()
+        prompt = messages('A short article.')
+        self.assertIs(story._fit_to_context(prompt, 'A short article.'), prompt)
+
+    def test_long_input_is_cut_to_fit_the_context(self):
+        story = generator()
+        text = 'word ' * 12000
+        fitted = story._fit_to_context(messages(text), text)
+        self.assertLessEqual(story._prompt_tokens(fitted) + story.MIN_COMPLETION_TOKENS, story.MODEL_CONTEXT_TOKENS)
+        self.assertTrue(fitted[-1]['content'].endswith('...\nFORMAT YOUR RESPONSE AS: ...'))
+        self.assertEqual(fitted[0], messages(text)[0])
+
+    def test_completion_budget_fits_next_to_the_prompt(self):
+        story = generator()
+        small = messages('A short article.')
+        self.assertEqual(story._completion_budget(1000, small), 1000)
+        self.assertEqual(story._completion_budget(10, small), story.MIN_COMPLETION_TOKENS)
+        large = messages('x' * (story.MODEL_CONTEXT_TOKENS - 1000) * story.CHARS_PER_TOKEN)
+        self.assertLess(story._completion_budget(5000, large), 1000)
+        with self.assertRaises(ValueError):
+            story._completion_budget(1000, messages('x' * story.MODEL_CONTEXT_TOKENS * story.CHARS_PER_TOKEN))
+
+    def test_usage_is_recorded_per_stage(self):
+        story = generator()
+        story.generate_comic_storyline('Moon', 'The Moon is a natural satellite.')
+        usage = story.usage['storyline']
+        self.assertEqual(usage['finish_reason'], 'stop')
+        self.assertGreater(usage['completion_tokens'], 0)
+        self.assertEqual(story.truncated_stages, [])
+
+    def test_truncated_scene_is_replaced(self):
+        # ~300 words per scene, so the budget for three ends inside the third
+        story = generator(payload_size=400)
+        scenes = story.generate_scene_prompts('Moon', 'A storyline.', 'manga', num_scenes=3)
+        self.assertEqual(story.truncated_stages, ['prompts'])
+        self.assertEqual(len(scenes), 3)
+        self.assertTrue(scenes[0].startswith('Scene 1: Moment 1 of Moon'))
+        self.assertTrue(scenes[1].startswith('Scene 2: Moment 2 of Moon'))
+        self.assertIn('Additional scene from Moon', scenes[2])
@@ -7,9 +7,14 @@ urlpatterns = [
     # API endpoints
     path('api/generate/', views.api_generate_comic, name='api_generate_comic'),
     path('api/status/<str:request_id>/', views.api_check_status, name='api_check_status'),
+    path('api/status/<str:request_id>/cancel/', views.api_cancel_generation, name='api_cancel_generation'),
+    path('api/comics/', views.api_list_comics, name='api_list_comics'),
     path('api/comic/<str:comic_id>/', views.api_get_comic, name='api_get_comic'),
+    path('api/comic/<str:comic_id>/page/', views.api_get_comic_pages, name='api_get_comic_pages'),
     path('api/search/', views.api_search_wikipedia, name='api_search_wikipedia'),
+    path('api/autocomplete/', views.api_autocomplete, name='api_autocomplete'),
     path('api/options/', views.api_get_options, name='api_get_options'),
+    path('api/metrics/', views.metrics_endpoint, name='metrics'),
     
     # Regular views
     path('', views.home, name='home'),
@@ -1,65 +1,181 @@
-import wikipedia
 import os
-import json
 import time
 import re
 import logging
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 from typing import Dict, List, Union, Optional, Any
-import groq
 from django.conf import settings
-# import google.generativeai as genai
-from google import genai
-from google.genai import types
-from PIL import Image
-from io import BytesIO
-import base64
-from dotenv import load_dotenv
+from . import bubbles, cpu_pool, metrics
+from .bubbles import PLACEHOLDER_DIALOG
+from .persistence import get_persister
+from .archive import get_archive
+from .aliases import get_aliases
+from .search_index import RecentResults, get_search_index
+from .autocomplete import get_title_index
+from .jobs import JobCancelled
+from .routing import get_router
 
 logger = logging.getLogger(__name__)
 
-# Load environment variables from .env file in the comic directory
-load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+# The upstream client libraries (wikipedia, groq, google-genai) take most of a worker's
+# import time, so they are imported on first use rather than with this module
+_import_lock = threading.Lock()
+_env_loaded = False
 
-# Monkey patch groq client initialization to prevent proxies issues
-original_init = groq.Client.__init__
 
-def patched_init(self, *args, **kwargs):
-    # Remove 'proxies' from kwargs if present
-    if 'proxies' in kwargs:
-        del kwargs['proxies']
-    # Call the original __init__ without proxies
-    return original_init(self, *args, **kwargs)
+def load_env() -> None:
+    """Load environment variables from the .env file in the comic directory, once per process"""
+    global _env_loaded
+    if not _env_loaded:
+        with _import_lock:
+            if not _env_loaded:
+                from dotenv import load_dotenv
+
+                load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+                _env_loaded = True
+
+
+def get_groq():
+    """
+    Import the groq module, with its client patched to drop the `proxies` argument
+
+    The patch prevents proxies issues and is applied at most once, however often this is called.
+    """
+    import groq
+
+    with _import_lock:
+        original_init = groq.Client.__init__
+        if not getattr(original_init, 'drops_proxies', False):
+            def patched_init(self, *args, **kwargs):
+                # Remove 'proxies' from kwargs if present
+                kwargs.pop('proxies', None)
+                # Call the original __init__ without proxies
+                return original_init(self, *args, **kwargs)
+
+            patched_init.drops_proxies = True
+            groq.Client.__init__ = patched_init
+    return groq
+
+
+# Monotonic deadline of the page fetch running on this thread, if it is bounded
+_fetch_deadline = threading.local()
+
+
+def fetch_time_left() -> Optional[float]:
+    """Seconds left for the page fetch running on this thread, or None if it is unbounded"""
+    deadline = getattr(_fetch_deadline, 'at', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class _DeadlineRequests:
+    """Stands in for `requests` inside the wikipedia package, whose API calls are sent without a timeout"""
+
+    def __getattr__(self, name: str) -> Any:
+        import requests
+
+        return getattr(requests, name)
+
+    def get(self, url: str, **kwargs) -> Any:
+        import requests
+
+        remaining = fetch_time_left()
+        if remaining is not None:
+            if remaining <= 0:
+                raise TimeoutError("Wikipedia fetch ran out of time")
+            kwargs.setdefault('timeout', remaining)
+        try:
+            return requests.get(url, **kwargs)
+        except requests.Timeout as e:
+            raise TimeoutError(f"Wikipedia request timed out: {str(e)}") from e
+
+
+def get_wikipedia():
+    """
+    Import the wikipedia module, with its HTTP requests bounded by the calling thread's fetch deadline
+
+    The patch is applied at most once, however often this is called.
+    """
+    import importlib
+    import wikipedia
+
+    api = importlib.import_module('wikipedia.wikipedia')
+    with _import_lock:
+        if not isinstance(api.requests, _DeadlineRequests):
+            api.requests = _DeadlineRequests()
+    return wikipedia
+
+
+SCENE_PATTERN = re.compile(r'Scene \d+:.*?(?=Scene \d+:|$)', re.DOTALL)
+
+
+def split_scene_prompts(scenes_text: str) -> List[str]:
+    """
+    Split an LLM response into individual "Scene N:" prompts
+    
+    Args:
+        scenes_text: Raw scene prompt text returned by the model
+        
+    Returns:
+        List of stripped scene prompts in the order they appear
+    """
+    return [match.strip() for match in SCENE_PATTERN.findall(scenes_text)]
+
+
+def parse_storyline_sections(storyline: str) -> Dict[str, str]:
+    """
+    Split a markdown storyline into its sections
+    
+    Args:
+        storyline: Storyline in the "# Title" / "## Section" format requested from the model
+        
+    Returns:
+        Ordered mapping of section heading to section text; the top-level heading is stored under "title"
+    """
+    storyline_sections = {}
+    current_section = None
+    for line in storyline.split('\n'):
+        if line.startswith('# '):
+            current_section = 'title'
+            storyline_sections[current_section] = line[2:]
+        elif line.startswith('## '):
+            current_section = line[3:]
+            storyline_sections[current_section] = ''
+        elif current_section and line.strip():
+            storyline_sections[current_section] += line + '\n'
+    return storyline_sections
+
+
+# Live searches run here so a slow Wikipedia can be abandoned in favour of local results
+_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='wikipedia-search')
+_recent_searches = RecentResults()
 
-# Apply the monkey patch
-groq.Client.__init__ = patched_init
 
 class WikipediaExtractor:
-    def __init__(self, data_dir: str = "data", language: str = "en"):
+    def __init__(self, data_dir: str = "data", language: str = "en", backend: Any = None):
         """
         Initialize the Wikipedia extractor
         
         Args:
             data_dir: Directory to store extracted data
             language: Wikipedia language code
+            backend: Object exposing the `wikipedia` module API (search, suggest, page, set_lang).
+                Defaults to the real `wikipedia` module; load tests inject an offline fake.
         """
         self.data_dir = data_dir
+        if backend is None:
+            backend = get_wikipedia()
+        self.wiki = backend
         self.create_project_structure()
-        wikipedia.set_lang(language)
+        self.wiki.set_lang(language)
         logger.info(f"WikipediaExtractor initialized with data directory: {data_dir}, language: {language}")
 
     def create_project_structure(self) -> None:
         """Create necessary directories for the project"""
         try:
-            if not os.path.exists(self.data_dir):
-                os.makedirs(self.data_dir)
-                logger.info(f"Created data directory: {self.data_dir}")
-            
-            images_dir = os.path.join(self.data_dir, "images")
-            if not os.path.exists(images_dir):
-                os.makedirs(images_dir)
-                logger.info(f"Created images directory: {images_dir}")
+            # exist_ok: concurrent extractors may create the same directories at once
+            os.makedirs(os.path.join(self.data_dir, "images"), exist_ok=True)
         except Exception as e:
             logger.error(f"Failed to create project structure: {str(e)}")
             raise RuntimeError(f"Failed to create project structure: {str(e)}")
@@ -79,7 +195,11 @@ class WikipediaExtractor:
 
     def search_wikipedia(self, query: str, results_limit: int = 15, retries: int = 3) -> Union[List[str], str]:
         """
-        Search Wikipedia for a given query and return search results
+        Search for a given query in the local article index and on Wikipedia and return search results
+        
+        Local matches come first. An exact title match in the local index is answered immediately,
+        together with any recent upstream results for the query; otherwise the live search is given
+        COMIC_SEARCH_UPSTREAM_TIMEOUT seconds before the local results are returned on their own.
         
         Args:
             query: Search query
@@ -95,13 +215,53 @@ class WikipediaExtractor:
         query = query.strip()
         logger.info(f"Searching Wikipedia for: {query}")
         
+        try:
+            local = [title for title, _ in get_search_index(self.data_dir).search(query, results_limit)]
+        except Exception as e:
+            logger.error(f"Local search failed: {str(e)}")
+            local = []
+        
+        known = bool(local) and local[0].casefold() == query.casefold()
+        cached = _recent_searches.get(query)
+        metrics.record_cache('search', known)
+        if known:
+            if cached is None:
+                # Refresh upstream results in the background for the next search
+                _search_pool.submit(self._search_upstream, query, results_limit, retries)
+            return self._merge_results(local, cached or [], results_limit)
+        
+        future = _search_pool.submit(self._search_upstream, query, results_limit, retries)
+        try:
+            upstream = future.result(timeout=getattr(settings, 'COMIC_SEARCH_UPSTREAM_TIMEOUT', 1.5))
+        except FutureTimeoutError:
+            metrics.UPSTREAM_ERRORS.inc(service='wikipedia')
+            logger.warning(f"Wikipedia search timed out for {query}; returning {len(local)} local results")
+            upstream = cached
+        
+        if isinstance(upstream, list):
+            return self._merge_results(local, upstream, results_limit)
+        return local or upstream or "Wikipedia search is taking too long. Please try again."
+    
+    @staticmethod
+    def _merge_results(local: List[str], upstream: List[str], results_limit: int) -> List[str]:
+        """Local results followed by upstream results not already listed"""
+        seen = set()
+        merged = []
+        for title in local + upstream:
+            if title.casefold() not in seen:
+                seen.add(title.casefold())
+                merged.append(title)
+        return merged[:results_limit]
+    
+    def _search_upstream(self, query: str, results_limit: int, retries: int) -> Union[List[str], str]:
+        """Live Wikipedia search; successful result lists are remembered for the query"""
         attempt = 0
         while attempt < retries:
             try:
-                search_results = wikipedia.search(query, results=results_limit)
+                search_results = self.wiki.search(query, results=results_limit)
                 
                 if not search_results:
-                    suggestions = wikipedia.suggest(query)
+                    suggestions = self.wiki.suggest(query)
                     if suggestions:
                         logger.info(f"No results found. Suggesting: {suggestions}")
                         return f"No exact results found. Did you mean: {suggestions}?"
@@ -109,48 +269,96 @@ class WikipediaExtractor:
                     return "No results found for your search."
                 
                 logger.info(f"Found {len(search_results)} results for query: {query}")
+                _recent_searches.put(query, search_results)
+                get_title_index(self.data_dir).add(search_results)
                 return search_results
                 
+            except TimeoutError:
+                metrics.UPSTREAM_ERRORS.inc(service='wikipedia')
+                raise
             except ConnectionError as e:
+                metrics.UPSTREAM_ERRORS.inc(service='wikipedia')
                 attempt += 1
                 wait_time = 2 ** attempt  # Exponential backoff
+                time_left = fetch_time_left()
+                if time_left is not None and wait_time >= time_left:
+                    raise TimeoutError(f"No time left to retry the Wikipedia fetch: {str(e)}")
                 logger.warning(f"Connection error (attempt {attempt}/{retries}): {str(e)}. Retrying in {wait_time} seconds...")
                 time.sleep(wait_time)
             except Exception as e:
+                metrics.UPSTREAM_ERRORS.inc(service='wikipedia')
                 logger.error(f"Search error: {str(e)}")
                 return f"An error occurred while searching: {str(e)}"
         
         return "Failed to connect to Wikipedia after multiple attempts. Please check your internet connection."
 
-    def get_page_info(self, title: str, retries: int = 3) -> Dict[str, Any]:
+    def get_page_info(self, title: str, retries: int = 3, timeout: Optional[float] = None) -> Dict[str, Any]:
         """
         Get detailed information about a specific Wikipedia page
         
         Args:
             title: Page title to retrieve
             retries: Number of retries on network failure
+            timeout: Seconds the whole fetch may take, retries included (None waits indefinitely).
+                Each Wikipedia request gets the time that is left, so a fetch its job gave up on ends too.
             
         Returns:
             Dictionary containing page information or error details
+            
+        Raises:
+            TimeoutError: The fetch did not finish within `timeout`
         """
+        _fetch_deadline.at = time.monotonic() + timeout if timeout is not None else None
+        try:
+            return self._fetch_page_info(title, retries)
+        finally:
+            _fetch_deadline.at = None
+
+    def _fetch_page_info(self, title: str, retries: int) -> Dict[str, Any]:
+        """`get_page_info` without the deadline bookkeeping"""
         logger.info(f"Getting page info for: {title}")
         
+        # Redirects, suggestions and disambiguation pages seen before are resolved without a fetch
+        aliases = get_aliases(self.data_dir)
+        alias = aliases.resolve(title)
+        metrics.record_cache('alias', alias is not None)
+        if alias and 'options' in alias:
+            logger.info(f"'{title}' is a known disambiguation page. Returning options.")
+            return {
+                "error": "Disambiguation Error",
+                "options": alias['options'][:15],
+                "message": "Multiple matches found. Please be more specific."
+            }
+        lookup = alias['title'] if alias else title
+        
+        archived = self._get_archived_page(lookup)
+        if archived:
+            logger.info(f"Serving archived page info for: {title}")
+            return archived
+        
+        from wikipedia.exceptions import DisambiguationError, PageError
+
         attempt = 0
         while attempt < retries:
             try:
                 try:
-                    page = wikipedia.page(title, auto_suggest=False)
-                except wikipedia.DisambiguationError as e:
+                    page = self.wiki.page(lookup, auto_suggest=False)
+                except DisambiguationError as e:
                     logger.info(f"Disambiguation error for '{title}'. Returning options.")
+                    get_title_index(self.data_dir).add(e.options)
+                    aliases.add_disambiguation(title, e.options)
                     return {
                         "error": "Disambiguation Error",
                         "options": e.options[:15],
                         "message": "Multiple matches found. Please be more specific."
                     }
-                except wikipedia.PageError:
+                except PageError:
+                    if lookup != title:
+                        # The article the alias pointed to was renamed or deleted
+                        aliases.forget(title)
                     try:
                         logger.info(f"Exact page '{title}' not found. Trying with auto-suggest.")
-                        page = wikipedia.page(title)
+                        page = self.wiki.page(title)
                     except Exception as inner_e:
                         logger.error(f"Page retrieval error: {str(inner_e)}")
                         return {
@@ -158,30 +366,39 @@ class WikipediaExtractor:
                             "message": f"Page '{title}' does not exist."
                         }
                 
+                # references, links and images are not used anywhere and each costs extra API requests
                 page_info = {
                     "title": page.title,
                     "url": page.url,
                     "content": page.content,
                     "summary": page.summary,
-                    "references": page.references,
                     "categories": page.categories,
-                    "links": page.links,
-                    "images": page.images,
+                    "revision_id": getattr(page, "revision_id", None),
                     "timestamp": datetime.now().isoformat()
                 }
                 
-                # Save the extracted data
+                # Save the extracted data (written in the background)
                 self._save_extracted_data(page_info)
+                get_title_index(self.data_dir).add([page.title])
+                aliases.add(title, page.title)
                 
                 logger.info(f"Successfully retrieved page info for: {title}")
                 return page_info
                 
+            except TimeoutError:
+                metrics.UPSTREAM_ERRORS.inc(service='wikipedia')
+                raise
             except ConnectionError as e:
+                metrics.UPSTREAM_ERRORS.inc(service='wikipedia')
                 attempt += 1
                 wait_time = 2 ** attempt  # Exponential backoff
+                time_left = fetch_time_left()
+                if time_left is not None and wait_time >= time_left:
+                    raise TimeoutError(f"No time left to retry the Wikipedia fetch: {str(e)}")
                 logger.warning(f"Connection error (attempt {attempt}/{retries}): {str(e)}. Retrying in {wait_time} seconds...")
                 time.sleep(wait_time)
             except Exception as e:
+                metrics.UPSTREAM_ERRORS.inc(service='wikipedia')
                 logger.error(f"Unexpected error getting page info: {str(e)}")
                 return {
                     "error": "General Error",
@@ -193,40 +410,167 @@ class WikipediaExtractor:
             "message": "Failed to connect to Wikipedia after multiple attempts. Please check your internet connection."
         }
         
+    def _get_archived_page(self, title: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a recently fetched page in the article archive
+        
+        Args:
+            title: Canonical page title
+            
+        Returns:
+            Page information if archived within COMIC_ARTICLE_MAX_AGE seconds (0 disables), otherwise None
+        """
+        max_age = getattr(settings, 'COMIC_ARTICLE_MAX_AGE', 86400)
+        if max_age <= 0:
+            return None
+        try:
+            article = get_archive(self.data_dir).get(title)
+        except Exception as e:
+            logger.error(f"Article archive lookup failed: {str(e)}")
+            return None
+        fresh = article is not None and time.time() - article.pop('stored_at') <= max_age
+        metrics.record_cache('article', fresh)
+        if not fresh:
+            return None
+        get_archive(self.data_dir).record_access(title)
+        return article
+
     def _save_extracted_data(self, page_info: Dict[str, Any]) -> None:
         """
-        Save extracted data to a JSON file
+        Queue extracted data for the article archive; the write-behind persister stores it
         
         Args:
             page_info: Dictionary containing page information
         """
         try:
-            safe_title = self.sanitize_filename(page_info["title"])
-            filename = f"{self.data_dir}/{safe_title}_data.json"
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(page_info, f, ensure_ascii=False, indent=2)
-                
-            logger.info(f"Saved extracted data to: {filename}")
+            get_persister(self.data_dir).submit(page_info)
         except Exception as e:
-            logger.error(f"Failed to save extracted data: {str(e)}")
+            logger.error(f"Failed to queue extracted data: {str(e)}")
 
 class StoryGenerator:
-    def __init__(self, api_key: str = None):
+    # llama3-8b-8192 (first in the default routes) shares an 8192-token window between prompt and completion
+    MODEL_CONTEXT_TOKENS = 8192
+    # Rough English tokenization ratios used to size the completion budget
+    TOKENS_PER_WORD = 1.35
+    CHARS_PER_TOKEN = 4
+    # A formatted scene prompt (visual description, two dialog lines, style) is ~180 words
+    TOKENS_PER_SCENE = 260
+    MIN_COMPLETION_TOKENS = 512
+
+    def __init__(self, api_key: str = None, client: Any = None, job: Any = None):
         """
         Initialize the Groq story generator
         
         Args:
             api_key: Groq API key (optional, will use environment variable if not provided)
+            client: Pre-built chat completions client (optional, used instead of a Groq client)
+            job: JobContext whose cancellation and deadlines apply to every request (optional)
         """
+        load_env()
         self.api_key = api_key or os.getenv('GROQ_API_KEY')
+        self.job = job
+        # Token usage per generation stage, filled from each Groq response
+        self.usage: Dict[str, Dict[str, Any]] = {}
+        if client is not None:
+            self.client = client
+            logger.info("StoryGenerator initialized with injected client")
+            return
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable is not set")
             
         # Initialize client with the patched init method (no proxy handling needed)
-        self.client = groq.Client(api_key=self.api_key)
+        self.client = get_groq().Client(api_key=self.api_key)
         logger.info("StoryGenerator initialized with Groq client")
 
+    def _create_completion(self, stage: str, **kwargs) -> Any:
+        """Send a chat completion request to the stage's models (see comic/routing.py), bounded by the job's deadlines"""
+        def create(model, timeout):
+            if timeout is not None:
+                return self.client.chat.completions.create(model=model, timeout=timeout, **kwargs)
+            return self.client.chat.completions.create(model=model, **kwargs)
+        return get_router().call(stage, create, job=self.job)
+
+    def _prompt_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(len(m['content']) for m in messages) // self.CHARS_PER_TOKEN
+
+    def _fit_to_context(self, messages: List[Dict[str, str]], text: str) -> List[Dict[str, str]]:
+        """
+        Shorten the article or storyline text in the last message until MIN_COMPLETION_TOKENS fit after the prompt
+        
+        Args:
+            messages: Chat messages; the last one contains `text`
+            text: The variable-length input embedded in the last message
+            
+        Returns:
+            The messages, with `text` cut short if the prompt was too long
+        """
+        excess = self._prompt_tokens(messages) + self.MIN_COMPLETION_TOKENS - self.MODEL_CONTEXT_TOKENS
+        if excess <= 0:
+            return messages
+        keep = len(text) - excess * self.CHARS_PER_TOKEN - 3
+        if keep <= 0:
+            raise ValueError("Prompt does not fit the model context window")
+        logger.info(f"Prompt too long for the context window, truncating input from {len(text)} to {keep} chars")
+        shortened = dict(messages[-1], content=messages[-1]['content'].replace(text, text[:keep] + "...", 1))
+        return messages[:-1] + [shortened]
+
+    def _completion_budget(self, wanted_tokens: int, messages: List[Dict[str, str]]) -> int:
+        """
+        Size max_tokens for a request
+        
+        Args:
+            wanted_tokens: Tokens the expected output needs
+            messages: Chat messages, used to estimate how much of the context window the prompt takes
+            
+        Returns:
+            Completion budget that fits next to the prompt in the model context window
+            
+        Raises:
+            ValueError: Not even MIN_COMPLETION_TOKENS fit; the request would fail upstream (see `_fit_to_context`)
+        """
+        available = self.MODEL_CONTEXT_TOKENS - self._prompt_tokens(messages)
+        if available < self.MIN_COMPLETION_TOKENS:
+            raise ValueError(f"Prompt leaves only {available} of the {self.MODEL_CONTEXT_TOKENS}-token context window")
+        return max(min(wanted_tokens, available), self.MIN_COMPLETION_TOKENS)
+
+    def _record_usage(self, stage: str, response: Any, max_tokens: int) -> bool:
+        """
+        Record token usage for a stage and detect truncation
+        
+        Args:
+            stage: Generation stage name (storyline or prompts)
+            response: Groq chat completion response
+            max_tokens: Completion budget the request was sent with
+            
+        Returns:
+            True if the response was cut off by the max_tokens budget
+        """
+        usage = getattr(response, 'usage', None)
+        finish_reason = getattr(response.choices[0], 'finish_reason', None)
+        truncated = finish_reason == 'length'
+        record = {
+            'model': getattr(response, 'model', None),
+            'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+            'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+            'total_tokens': getattr(usage, 'total_tokens', 0) or 0,
+            'max_tokens': max_tokens,
+            'finish_reason': finish_reason,
+            'truncated': truncated
+        }
+        self.usage[stage] = record
+        metrics.LLM_TOKENS.inc(record['prompt_tokens'], stage=stage, kind='prompt')
+        metrics.LLM_TOKENS.inc(record['completion_tokens'], stage=stage, kind='completion')
+        if truncated:
+            metrics.LLM_TRUNCATIONS.inc(stage=stage)
+            logger.warning(f"{stage} response truncated at max_tokens={max_tokens} "
+                           f"({record['completion_tokens']} completion tokens)")
+        return truncated
+
+    @property
+    def truncated_stages(self) -> List[str]:
+        """Stages whose last response hit the max_tokens budget"""
+        return [stage for stage, record in self.usage.items() if record['truncated']]
+
     def generate_comic_storyline(self, title: str, content: str, target_length: str = "medium") -> str:
         """
         Generate a comic storyline from Wikipedia content
@@ -296,25 +640,34 @@ class StoryGenerator:
         [Suggestions for important visual elements to include in the comic]
         """
         
+        messages = [
+            {"role": "system", "content": "You are an expert comic book writer and historian who creates engaging, accurate, and visually compelling storylines based on real information."},
+            {"role": "user", "content": prompt}
+        ]
         try:
+            messages = self._fit_to_context(messages, content)
+            # Markdown headings and the character list add roughly a quarter on top of the story itself
+            max_tokens = self._completion_budget(int(word_count * self.TOKENS_PER_WORD * 1.25), messages)
+            
             # Generate storyline using Groq
-            response = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are an expert comic book writer and historian who creates engaging, accurate, and visually compelling storylines based on real information."},
-                    {"role": "user", "content": prompt}
-                ],
-                model="llama3-8b-8192",  # Using Llama 3 model
+            response = self._create_completion(
+                'storyline',
+                messages=messages,
                 temperature=0.7,
-                max_tokens=4000,
+                max_tokens=max_tokens,
                 top_p=0.9
             )
             
             storyline = response.choices[0].message.content
+            self._record_usage('storyline', response, max_tokens)
             logger.info(f"Successfully generated comic storyline for: {title}")
             
             return storyline
             
+        except JobCancelled:
+            raise
         except Exception as e:
+            metrics.UPSTREAM_ERRORS.inc(service='groq')
             logger.error(f"Failed to generate storyline: {str(e)}")
             return f"Error generating storyline: {str(e)}"
 
@@ -397,28 +750,33 @@ class StoryGenerator:
         SCENE DESCRIPTIONS MUST BE EXTREMELY DETAILED to ensure the image generator can create accurate images.
         """
         
+        messages = [
+            {"role": "system", "content": "You are an expert comic book artist and writer who creates detailed, engaging scene descriptions for comic panels with consistent characters and storylines. You always ensure dialog is grammatically correct and include specific dialog text for each scene."},
+            {"role": "user", "content": prompt}
+        ]
         try:
+            messages = self._fit_to_context(messages, storyline)
+            max_tokens = self._completion_budget(num_scenes * self.TOKENS_PER_SCENE + 200, messages)
+            
             # Generate scene prompts using Groq
-            response = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are an expert comic book artist and writer who creates detailed, engaging scene descriptions for comic panels with consistent characters and storylines. You always ensure dialog is grammatically correct and include specific dialog text for each scene."},
-                    {"role": "user", "content": prompt}
-                ],
-                model="llama3-8b-8192",  # Using Llama 3 model
+            response = self._create_completion(
+                'prompts',
+                messages=messages,
                 temperature=0.7,
-                max_tokens=4000,
+                max_tokens=max_tokens,
                 top_p=0.9
             )
             
             scenes_text = response.choices[0].message.content
+            truncated = self._record_usage('prompts', response, max_tokens)
             
             # Process the text to extract individual scene prompts
-            scene_prompts = []
-            scene_pattern = re.compile(r'Scene \d+:.*?(?=Scene \d+:|$)', re.DOTALL)
-            matches = scene_pattern.findall(scenes_text)
+            scene_prompts = split_scene_prompts(scenes_text)
             
-            for match in matches:
-                scene_prompts.append(match.strip())
+            # A cut-off response ends mid-scene; drop the partial scene so it is padded like a missing one
+            if truncated and scene_prompts and len(scene_prompts) <= num_scenes:
+                dropped = scene_prompts.pop()
+                logger.warning(f"Dropped partial scene after truncation: {dropped[:60]}...")
             
             # If we didn't get enough scenes, pad with generic ones that include dialog
             while len(scene_prompts) < num_scenes:
@@ -447,25 +805,38 @@ class StoryGenerator:
             logger.info(f"Successfully generated {len(validated_prompts)} scene prompts")
             return validated_prompts
             
+        except JobCancelled:
+            raise
         except Exception as e:
+            metrics.UPSTREAM_ERRORS.inc(service='groq')
             logger.error(f"Failed to generate scene prompts: {str(e)}")
             return [f"Error generating scene prompt: {str(e)}"]
 
 class ComicImageGenerator:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, client: Any = None, job: Any = None):
         """
         Initialize the Comic Image Generator
         
         Args:
             api_key: Google Gemini API key (optional, will use environment variable if not provided)
+            client: Pre-built Gemini client (optional, used instead of creating one)
+            job: JobContext whose cancellation and deadlines apply to every request (optional)
         """
+        load_env()
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        self.job = job
+        self.logger = logging.getLogger(__name__)
+        if client is not None:
+            self.client = client
+            logger.info("ComicImageGenerator initialized with injected client")
+            return
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY environment variable is not set")
             
+        from google import genai
+
         client = genai.Client(api_key=self.api_key)
         self.client = client
-        self.logger = logging.getLogger(__name__)
         logger.info("ComicImageGenerator initialized with Gemini API")
 
     def _extract_dialog_from_prompt(self, scene_prompt: str) -> list:
@@ -490,7 +861,7 @@ class ComicImageGenerator:
         
         # If still no dialog, add a generic one
         if not dialog_lines:
-            dialog_lines.append(("Character", "This is an important moment in our story."))
+            dialog_lines.append(PLACEHOLDER_DIALOG)
             logger.warning("No dialog found in scene prompt, using generic dialog")
         
         return dialog_lines
@@ -518,7 +889,7 @@ class ComicImageGenerator:
             - Create a high-quality, detailed comic panel with clear characters and setting.
             - Accurately represent the scene exactly as described.
             - Ensure all dialogue is grammatically correct and fits the tone of the scene.
-            - Leave appropriate space for dialogue bubbles as part of the composition.
+            - Leave appropriate space near the top of the panel for dialogue bubbles, which are added afterwards.
             """
             
             return enhanced_prompt
@@ -537,11 +908,33 @@ class ComicImageGenerator:
         Returns:
             Boolean indicating success
         """
+        image_bytes = self.render_comic_image(prompt, scene_number)
+        if image_bytes is None:
+            return False
         try:
             # Ensure the directory exists
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            with open(output_path, 'wb') as f:
+                f.write(image_bytes)
+            self.logger.info(f"Saved image for scene {scene_number} at {output_path}")
+            return True
+        except OSError as e:
+            self.logger.error(f"Error saving image for scene {scene_number}: {str(e)}")
+            return False
+
+    def render_comic_image(self, prompt, scene_number):
+        """
+        Generate a comic image based on a scene prompt and return it as PNG bytes
+        
+        Args:
+            prompt: Textual description of the scene
+            scene_number: Scene number for logging
             
-            self.logger.info(f"Generating image for scene {scene_number} at {output_path}")
+        Returns:
+            PNG image bytes, or None on failure
+        """
+        try:
+            self.logger.info(f"Generating image for scene {scene_number}")
             
             # Extract dialog lines before enhancing the prompt
             dialog_lines = self._extract_dialog_from_prompt(prompt)
@@ -551,27 +944,39 @@ class ComicImageGenerator:
             
             self.logger.info(f"Using enhanced prompt: {enhanced_prompt[:100]}...")
 
-            # Using Gemini API for image generation
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash-exp-image-generation",
-                contents=[enhanced_prompt],
-                config=types.GenerateContentConfig(
-                    response_modalities=['TEXT', 'IMAGE']
+            # Using Gemini API for image generation, on the image stage's models (see comic/routing.py)
+            from google.genai import types
+
+            def generate(model, timeout):
+                return self.client.models.generate_content(
+                    model=model,
+                    contents=[enhanced_prompt],
+                    config=types.GenerateContentConfig(
+                        response_modalities=['TEXT', 'IMAGE'],
+                        http_options=types.HttpOptions(timeout=int(timeout * 1000)) if timeout else None
+                    )
                 )
-            )
+            response = get_router().call('image', generate, job=self.job)
 
             # Process the response
             for part in response.candidates[0].content.parts:
                 if part.inline_data is not None:
-                    # Save the image
-                    image = Image.open(BytesIO(part.inline_data.data))
-                    image.save(output_path)
-                    self.logger.info(f"Successfully generated and saved image for scene {scene_number}")
-                    return True
+                    self.logger.info(f"Successfully generated image for scene {scene_number}")
+                    if getattr(part.inline_data, 'mime_type', None) == 'image/png':
+                        png_bytes = part.inline_data.data
+                    else:
+                        # Other formats are converted so every stored panel is a PNG
+                        png_bytes = cpu_pool.run('encode', cpu_pool.convert_to_png, part.inline_data.data)
+                    if getattr(settings, 'COMIC_SPEECH_BUBBLES', True):
+                        png_bytes = bubbles.composite(png_bytes, dialog_lines)
+                    return png_bytes
 
             self.logger.error("No image data found in Gemini response")
-            return False
+            return None
 
+        except JobCancelled:
+            raise
         except Exception as e:
+            metrics.UPSTREAM_ERRORS.inc(service='gemini')
             self.logger.error(f"Error generating image for scene {scene_number}: {str(e)}", exc_info=True)
-            return False
\ No newline at end of file
+            return None
\ No newline at end of file
@@ -1,19 +1,31 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 import os
 import json
+import hashlib
+import threading
+import time
 from datetime import datetime
 from .models import ComicStore
-from .utils import WikipediaExtractor, StoryGenerator, ComicImageGenerator
+from .utils import WikipediaExtractor, StoryGenerator, ComicImageGenerator, parse_storyline_sections
+from .autocomplete import get_title_index
+from .aliases import get_aliases
+from .media_store import get_media_store
+from .composer import DEFAULT_COLUMNS, DEFAULT_ROWS, LAYOUTS, get_composer
+from . import jobs, metrics, prefetch, scheduler, status_store
+from .jobs import JobCancelled
 import logging
-import threading
-from django.core.cache import cache
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -21,12 +33,118 @@ logger = logging.getLogger(__name__)
 generation_status = {}
 
 def update_status(request_id, status_data):
-    cache.set(f'comic_status_{request_id}', status_data, timeout=3600)  # 1 hour timeout
+    # Coalesced, monotonic write to the shared status backend (see status_store)
+    status_store.get_writer().write(request_id, status_data)
 
 def get_status(request_id):
-    return cache.get(f'comic_status_{request_id}')
+    status_data = status_store.get_writer().read(request_id)
+    metrics.record_cache('status', status_data is not None)
+    return status_data
+
+def new_request_id(title):
+    """Build a unique request ID; the random suffix keeps same-second requests for one title apart"""
+    return f"{title.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+def start_generation(title, options, client='', priority=scheduler.INTERACTIVE, prefetched=None):
+    """
+    Create a comic and queue its generation on the job scheduler
+    
+    The comic exists from the start, so clients can fetch it (and long-poll for scenes) while panels
+    are still being rendered.
+    
+    Args:
+        title: Wikipedia article title
+        options: Generation options as passed to generate_comic_async
+        client: Requester key for fair sharing between clients
+        priority: scheduler.INTERACTIVE or scheduler.BATCH
+        prefetched: Claimed prefetch.Speculation whose storyline the job uses instead of generating one
+        
+    Returns:
+        Tuple of (request_id, comic_id)
+    """
+    request_id = new_request_id(title)
+    comic_id = ComicStore.create_comic(title=title, wikipedia_url='', storyline='', options=options)
+    # Written before submitting so a fast worker's STARTED is never overwritten by QUEUED
+    update_status(request_id, {
+        'status': 'QUEUED',
+        'comic_id': comic_id,
+        'message': 'Waiting for a free worker...',
+        'progress': 0
+    })
+    job = jobs.start_job(request_id, interactive=priority == scheduler.INTERACTIVE)
+    job.comic_id = comic_id
+    scheduler.get_scheduler().submit(
+        request_id, generate_comic_async, (request_id, title, settings.HF_TOKEN, options, comic_id, job, prefetched),
+        client=client, priority=priority, cost=scheduler.expected_cost(options)
+    )
+    return request_id, comic_id
+
+def reuse_generated(title, options):
+    """
+    Serve a generation request from an already completed comic with the same title and options
+    
+    A title known to redirect (see comic/aliases.py) matches the comics of its canonical article.
+    
+    Returns:
+        Tuple of (request_id, comic_id) with a COMPLETED status written, or None if there is no such comic
+    """
+    comic_id = ComicStore.find_completed(get_aliases().canonical(title), options)
+    metrics.record_cache('comic_reuse', comic_id is not None)
+    if comic_id is None:
+        return None
+    request_id = new_request_id(title)
+    update_status(request_id, {
+        'status': 'COMPLETED',
+        'comic_id': comic_id,
+        'message': 'Comic generation completed!',
+        'progress': 100,
+        'reused': True
+    })
+    return request_id, comic_id
+
+def cancel_generation(request_id, reason='cancelled'):
+    """
+    Cancel a queued or running generation job
+    
+    A queued job is dropped from the scheduler and ends here; a running one stops at its next check
+    or upstream wait and keeps the scenes finished so far. A job owned by another worker is sent a
+    cancel request through the status backend, which it picks up at its next check.
+    
+    Args:
+        request_id: Job to cancel
+        reason: Recorded on the comic and in the status message
+        
+    Returns:
+        False if no such job is queued or running
+    """
+    job = jobs.get_job(request_id)
+    if job is None:
+        status_data = get_status(request_id)
+        if not status_data or status_data.get('status') in status_store.TERMINAL_STATES:
+            return False
+        status_store.get_writer().request_cancel(request_id, reason)
+        return True
+    if not job.cancel(reason):
+        return True
+    if scheduler.get_scheduler().remove(request_id):
+        ComicStore.update_status(job.comic_id, 'cancelled', reason)
+        update_status(request_id, {
+            'status': 'CANCELLED',
+            'comic_id': job.comic_id,
+            'message': f'Generation cancelled ({reason}) before it started',
+            'progress': 0
+        })
+        jobs.finish_job(request_id)
+    return True
+
+def _client_id(request):
+    """Fair-share key for a request: the user if logged in, otherwise the remote address"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return request.META.get('REMOTE_ADDR', '')
 
-def generate_comic_async(request_id, title, hf_token, options=None):
+def generate_comic_async(request_id, title, hf_token, options=None, comic_id=None, job=None, prefetched=None):
     """
     Asynchronously generate a comic from a Wikipedia article.
     
@@ -35,6 +153,9 @@ def generate_comic_async(request_id, title, hf_token, options=None):
         title: Wikipedia article title
         hf_token: Hugging Face API token for image generation
         options: Dictionary of optional parameters (comic_style, target_length, num_scenes)
+        comic_id: Comic created by start_generation; scenes are added to it as they finish
+        job: JobContext from start_generation carrying cancellation and deadlines
+        prefetched: Speculative storyline for this title and target_length (see comic/prefetch.py)
     """
     if options is None:
         options = {}
@@ -45,153 +166,227 @@ def generate_comic_async(request_id, title, hf_token, options=None):
     age_group = options.get('age_group', 'general')
     education_level = options.get('education_level', 'standard')
     
+    if comic_id is None:
+        comic_id = ComicStore.create_comic(title=title, wikipedia_url='', storyline='', options={
+            'comic_style': comic_style,
+            'target_length': target_length,
+            'num_scenes': num_scenes,
+            'age_group': age_group,
+            'education_level': education_level
+        })
+    if job is None:
+        job = jobs.start_job(request_id)
+        job.comic_id = comic_id
+    job.begin()
+    
+    # Per-stage durations, returned with every status update
+    timings = metrics.JobTimings()
+    metrics.JOBS_STARTED.inc()
+    
     try:
         update_status(request_id, {
             'status': 'STARTED',
+            'comic_id': comic_id,
             'message': 'Starting comic generation...',
-            'progress': 0
+            'progress': 0,
+            'timings': timings.as_dict()
         })
         
         logger.info(f"Starting comic generation for title: {title}")
         
         # Get Wikipedia content
-        wiki = WikipediaExtractor()
-        page_info = wiki.get_page_info(title)
+        with timings.stage('fetch'):
+            wiki = WikipediaExtractor()
+            page_info = job.call('fetch', lambda timeout: wiki.get_page_info(title, timeout=timeout))
         if not page_info or 'error' in page_info:
             error_msg = page_info.get('message', 'Failed to fetch Wikipedia content') if page_info else 'Failed to fetch Wikipedia content'
             logger.error(f"Wikipedia error: {error_msg}")
+            ComicStore.update_status(comic_id, 'failed', error_msg)
+            _record_job_outcome('failed', timings)
             update_status(request_id, {
                 'status': 'ERROR',
+                'comic_id': comic_id,
                 'message': error_msg,
-                'progress': 0
+                'progress': 0,
+                'timings': timings.as_dict()
             })
             return False
 
-        # Create comic entry in memory
-        comic_id = ComicStore.create_comic(
-            title=page_info['title'],
-            wikipedia_url=page_info['url'],
-            storyline=''  # Will be updated later
-        )
+        # The comic was created at job start under the requested title; record the article it resolved to
+        with timings.stage('persistence'):
+            ComicStore.update_comic(comic_id, {
+                'title': page_info['title'],
+                'wikipedia_url': page_info['url']
+            })
         
         update_status(request_id, {
             'status': 'IN_PROGRESS',
+            'comic_id': comic_id,
             'message': 'Generating storyline...',
-            'progress': 10
+            'progress': 10,
+            'timings': timings.as_dict()
         })
 
-        # Sanitize title for file paths
-        sanitized_title = "".join(c for c in page_info['title'] if c.isalnum() or c in (' ', '-', '_'))
-        
-        # Create media directories
-        media_root = settings.MEDIA_ROOT
-        comic_scenes_dir = os.path.join(media_root, 'comic_scenes', sanitized_title)
-        os.makedirs(comic_scenes_dir, exist_ok=True)
-        
-        # Generate storyline
-        story_generator = StoryGenerator(settings.GROQ_API_KEY)
-        storyline = story_generator.generate_comic_storyline(
-            title=page_info['title'],
-            content=page_info['content'],
-            target_length=target_length
-        )
+        # Generate storyline, unless one was generated while the options page was open
+        with timings.stage('storyline'):
+            story_generator = StoryGenerator(settings.GROQ_API_KEY, job=job)
+            storyline = prefetched.wait(job) if prefetched is not None else None
+            if storyline is not None:
+                story_generator.usage.update(prefetched.usage)
+                logger.info(f"Using prefetched storyline for {title}")
+            else:
+                storyline = story_generator.generate_comic_storyline(
+                    title=page_info['title'],
+                    content=page_info['content'],
+                    target_length=target_length
+                )
         
-        # Update comic with storyline
-        ComicStore.update_comic(comic_id, {'storyline': storyline})
+        # Update comic with the storyline, parsed into sections once so views and the API never re-parse it
+        storyline_sections = parse_storyline_sections(storyline)
+        with timings.stage('persistence'):
+            ComicStore.update_comic(comic_id, {
+                'storyline': storyline,
+                'storyline_sections': storyline_sections
+            })
         
         update_status(request_id, {
             'status': 'IN_PROGRESS',
+            'comic_id': comic_id,
             'message': 'Creating scene prompts...',
-            'progress': 30
+            'progress': 30,
+            'timings': timings.as_dict()
         })
         
         # Generate scene prompts
-        scene_prompts = story_generator.generate_scene_prompts(
-            title=page_info['title'],
-            storyline=storyline,
-            comic_style=comic_style,
-            num_scenes=num_scenes,
-            age_group=age_group,
-            education_level=education_level
-        )
+        job.check()
+        with timings.stage('prompts'):
+            scene_prompts = story_generator.generate_scene_prompts(
+                title=page_info['title'],
+                storyline=storyline,
+                comic_style=comic_style,
+                num_scenes=num_scenes,
+                age_group=age_group,
+                education_level=education_level
+            )
         
-        # Store scene prompts
-        ComicStore.update_comic(comic_id, {'scene_prompts': scene_prompts})
+        # Store scene prompts and the LLM token usage of both stages
+        token_usage = dict(story_generator.usage)
+        truncated_stages = story_generator.truncated_stages
+        with timings.stage('persistence'):
+            ComicStore.update_comic(comic_id, {
+                'scene_prompts': scene_prompts,
+                'expected_scenes': len(scene_prompts),
+                'token_usage': token_usage,
+                'truncated_stages': truncated_stages
+            })
         
         update_status(request_id, {
             'status': 'IN_PROGRESS',
+            'comic_id': comic_id,
             'message': 'Generating comic images...',
-            'progress': 40
+            'progress': 40,
+            'timings': timings.as_dict(),
+            'token_usage': token_usage,
+            'truncated_stages': truncated_stages
         })
         
         # Initialize image generator
-        image_generator = ComicImageGenerator()  # Using default API key
+        image_generator = ComicImageGenerator(job=job)  # Using default API key
+        media_store = get_media_store()
         
         total_scenes = len(scene_prompts)
         for i, prompt in enumerate(scene_prompts, 1):
+            job.check()
             update_status(request_id, {
                 'status': 'IN_PROGRESS',
+                'comic_id': comic_id,
                 'message': f'Generating scene {i} of {total_scenes}...',
-                'progress': 40 + (i * 60 // total_scenes)
+                'progress': 40 + (i * 60 // total_scenes),
+                'timings': timings.as_dict()
             })
             
-            scene_filename = f"scene_{i}.png"
-            scene_path = os.path.join(comic_scenes_dir, scene_filename)
-            relative_path = os.path.join('comic_scenes', sanitized_title, scene_filename)
-            
             # Generate the image
-            success = image_generator.generate_comic_image(
-                prompt=prompt,
-                output_path=scene_path,
-                scene_number=i
-            )
+            with timings.stage('image', scene=i):
+                image_bytes = image_generator.render_comic_image(prompt=prompt, scene_number=i)
             
-            if success:
-                # Save scene to memory
-                ComicStore.add_scene(
-                    comic_id=comic_id,
-                    scene_number=i,
-                    prompt=prompt,
-                    image_path=relative_path
-                )
+            if image_bytes is not None:
+                # Store the panel by content hash and the scene in memory
+                with timings.stage('persistence'):
+                    image_hash, relative_path = media_store.put(image_bytes)
+                    ComicStore.add_scene(
+                        comic_id=comic_id,
+                        scene_number=i,
+                        prompt=prompt,
+                        image_path=relative_path,
+                        image_hash=image_hash
+                    )
                 logger.info(f"Successfully saved scene {i}")
             else:
                 logger.error(f"Failed to generate scene {i}")
         
         # Update comic status
-        ComicStore.update_status(comic_id, 'completed')
+        with timings.stage('persistence'):
+            ComicStore.update_status(comic_id, 'completed')
         
-        logger.info(f"Comic generation completed for {title}")
+        logger.info(f"Comic generation completed for {title} in {timings.elapsed():.1f}s")
+        _record_job_outcome('completed', timings)
+        get_title_index(wiki.data_dir).record_generation(page_info['title'])
         update_status(request_id, {
             'status': 'COMPLETED',
+            'comic_id': comic_id,
             'message': 'Comic generation completed!',
             'progress': 100,
-            'comic_id': comic_id
+            'timings': timings.as_dict(),
+            'token_usage': token_usage,
+            'truncated_stages': truncated_stages
         })
         return True
         
+    except JobCancelled as e:
+        # Keep what was generated; the comic stays readable with the scenes finished so far
+        scenes_done = len(ComicStore.get_scenes(comic_id))
+        logger.info(f"Comic generation for {title} cancelled ({e.reason}) after {scenes_done} scenes")
+        ComicStore.update_status(comic_id, 'cancelled', e.reason)
+        _record_job_outcome('cancelled', timings)
+        update_status(request_id, {
+            'status': 'CANCELLED',
+            'comic_id': comic_id,
+            'message': f'Generation cancelled ({e.reason}) after {scenes_done} scene(s)',
+            'progress': 0,
+            'timings': timings.as_dict()
+        })
+        return False
+        
     except Exception as e:
         logger.error(f"Error in generate_comic_async: {str(e)}", exc_info=True)
-        if 'comic_id' in locals():
-            ComicStore.update_status(comic_id, 'failed', str(e))
+        ComicStore.update_status(comic_id, 'failed', str(e))
+        _record_job_outcome('failed', timings)
         update_status(request_id, {
             'status': 'ERROR',
+            'comic_id': comic_id,
             'message': str(e),
-            'progress': 0
+            'progress': 0,
+            'timings': timings.as_dict()
         })
         return False
+    finally:
+        if prefetched is not None:
+            prefetched.job.cancel('unused')
+        jobs.finish_job(request_id)
+        status_store.get_writer().forget(request_id)
+
+def _record_job_outcome(outcome, timings):
+    metrics.JOBS.inc(outcome=outcome)
+    metrics.JOB_SECONDS.observe(timings.elapsed(), outcome=outcome)
 
 def home(request):
     """Home page with search form"""
-    # Get comics that have already been generated
-    comics = ComicStore.get_all_comics()
-    
     # Pass the 6 most recent completed comics to the template
-    recent_comics = [comic for comic in comics if comic.get('status') == 'completed']
-    recent_comics = sorted(recent_comics, key=lambda x: x.get('created_at', ''), reverse=True)[:6]
+    recent_comics, _ = ComicStore.list_comics(limit=6, status='completed')
     
     return render(request, 'comic/home.html', {
-        'recent_comics': recent_comics
+        'recent_comics': recent_comics,
+        'MEDIA_URL': settings.MEDIA_URL
     })
 
 def search_wikipedia(request):
@@ -237,6 +432,13 @@ def comic_options(request):
         'summary': page_info['summary']
     }
     
+    # Use the time the user spends choosing options to write the storyline for the default length
+    if getattr(settings, 'COMIC_PREFETCH', True):
+        prefetch.get_prefetcher().start(
+            request.session, page_info['title'], 'medium',
+            lambda speculation: _prefetch_storyline(speculation, page_info), client=_client_id(request)
+        )
+    
     return render(request, 'comic/options.html', {
         'page_info': page_info,
         'comic_styles': [
@@ -248,6 +450,19 @@ def comic_options(request):
         'education_levels': ['basic', 'standard', 'advanced']
     })
 
+def _prefetch_storyline(speculation, page_info):
+    """Speculation body: generate the storyline the options page's article will most likely need"""
+    story_generator = StoryGenerator(settings.GROQ_API_KEY, job=speculation.job)
+    storyline = story_generator.generate_comic_storyline(
+        title=page_info['title'],
+        content=page_info['content'],
+        target_length=speculation.target_length
+    )
+    # Failures come back as text; a failed speculation is simply not used
+    if storyline.startswith('Error generating storyline'):
+        storyline = None
+    speculation.finish(storyline, story_generator.usage)
+
 def generate_comic(request):
     """Handles comic generation request"""
     if request.method == 'POST':
@@ -266,9 +481,6 @@ def generate_comic(request):
         age_group = request.POST.get('age_group', 'general')
         education_level = request.POST.get('education_level', 'standard')
         
-        # Generate a unique request ID
-        request_id = f"{title.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
         # Start async generation
         options = {
             'comic_style': comic_style,
@@ -277,13 +489,11 @@ def generate_comic(request):
             'age_group': age_group,
             'education_level': education_level
         }
-        
-        thread = threading.Thread(
-            target=generate_comic_async,
-            args=(request_id, title, settings.HF_TOKEN, options)
-        )
-        thread.daemon = True
-        thread.start()
+        reused = reuse_generated(title, options)
+        if reused:
+            return redirect('check_status', request_id=reused[0])
+        prefetched = prefetch.get_prefetcher().claim(request.session, title, target_length)
+        request_id, comic_id = start_generation(title, options, client=_client_id(request), prefetched=prefetched)
         
         # Redirect to status page
         return redirect('check_status', request_id=request_id)
@@ -307,21 +517,12 @@ def view_comic(request, comic_id):
             
         # Get scenes
         scenes = ComicStore.get_scenes(comic_id)
+        _touch_panels(scenes)
         
-        # Parse storyline to extract key information
-        storyline_sections = {}
-        if comic.get('storyline'):
-            lines = comic['storyline'].split('\n')
-            current_section = None
-            for line in lines:
-                if line.startswith('# '):
-                    current_section = 'title'
-                    storyline_sections[current_section] = line[2:]
-                elif line.startswith('## '):
-                    current_section = line[3:]
-                    storyline_sections[current_section] = ''
-                elif current_section and line.strip():
-                    storyline_sections[current_section] += line + '\n'
+        # Storyline sections are parsed when the storyline is generated
+        storyline_sections = comic.get('storyline_sections')
+        if storyline_sections is None:
+            storyline_sections = parse_storyline_sections(comic['storyline']) if comic.get('storyline') else {}
         
         return render(request, 'comic/view_comic.html', {
             'comic': comic,
@@ -368,20 +569,33 @@ def api_generate_comic(request):
         'age_group': request.data.get('age_group', 'general'),
         'education_level': request.data.get('education_level', 'standard')
     }
+    priority = request.data.get('priority', scheduler.INTERACTIVE)
+    if priority not in scheduler.PRIORITIES:
+        return Response({'error': f"priority must be one of: {', '.join(scheduler.PRIORITIES)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
     
-    # Generate a unique request ID
-    request_id = f"{title.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    # A resubmission (e.g. with different options) stops the job it replaces
+    replaces = request.data.get('replaces')
+    if replaces:
+        cancel_generation(replaces, 'replaced')
     
-    # Start async generation
-    thread = threading.Thread(
-        target=generate_comic_async,
-        args=(request_id, title, settings.HF_TOKEN, options)
-    )
-    thread.daemon = True
-    thread.start()
+    # Popular comics (e.g. pre-generated ones) are served as they are unless `fresh` asks for a new one
+    reused = None if request.data.get('fresh') else reuse_generated(title, options)
+    if reused:
+        return Response({
+            'request_id': reused[0],
+            'comic_id': reused[1],
+            'reused': True,
+            'message': 'Comic already generated'
+        })
+    
+    # Queue generation; the comic can be fetched right away and fills in scene by scene
+    request_id, comic_id = start_generation(title, options, client=_client_id(request), priority=priority)
     
     return Response({
         'request_id': request_id,
+        'comic_id': comic_id,
+        'reused': False,
         'message': 'Comic generation started'
     })
 
@@ -391,46 +605,288 @@ def api_check_status(request, request_id):
     status_data = get_status(request_id)
     if not status_data:
         return Response({'error': 'Status not found'}, status=status.HTTP_404_NOT_FOUND)
-    return Response(status_data)
+    
+    # Polling shows the client is still waiting; a job whose client stops polling is cancelled.
+    # The job may run in another worker, which reads the poll from the status backend
+    job = jobs.get_job(request_id)
+    if job is not None:
+        job.heartbeat()
+    elif status_data.get('status') not in status_store.TERMINAL_STATES:
+        status_store.get_writer().record_poll(request_id)
+    
+    updated_at = status_data.get('updated_at', 0)
+    etag = _make_etag('status', request_id, updated_at)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(updated_at) or None)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, updated_at)
+    return _with_validators(Response(status_data), etag, updated_at)
+
+@api_view(['POST'])
+@csrf_exempt
+def api_cancel_generation(request, request_id):
+    """API endpoint to cancel a queued or running comic generation"""
+    status_data = get_status(request_id)
+    if not status_data:
+        return Response({'error': 'Status not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not cancel_generation(request_id):
+        return Response({'error': f"Generation already ended with status {status_data.get('status')}"},
+                        status=status.HTTP_409_CONFLICT)
+    return Response({
+        'request_id': request_id,
+        'comic_id': status_data.get('comic_id'),
+        'message': 'Cancellation requested'
+    }, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+def api_list_comics(request):
+    """API endpoint to list comic summaries, newest first, with cursor pagination and filters"""
+    params = request.query_params
+    try:
+        limit = min(max(int(params.get('limit', 20)), 1), 100)
+        created_after = _parse_iso_param(params.get('created_after'))
+        created_before = _parse_iso_param(params.get('created_before'))
+        results, next_cursor = ComicStore.list_comics(
+            limit=limit,
+            cursor=params.get('cursor'),
+            status=params.get('status'),
+            style=params.get('style'),
+            title_prefix=params.get('title_prefix'),
+            created_after=created_after,
+            created_before=created_before
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'results': results,
+        'next_cursor': next_cursor
+    })
+
+def _parse_iso_param(value):
+    """Normalize an ISO date/datetime query parameter to the format comics store timestamps in"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid ISO timestamp: {value}")
 
 @api_view(['GET'])
 def api_get_comic(request, comic_id):
-    """API endpoint to get comic data"""
+    """
+    API endpoint to get comic data, including comics still being generated
+    
+    `?wait_for_scenes=n` long-polls: the response is held until the comic has more than n scenes or
+    stops generating, for at most `timeout` seconds (default and cap COMIC_LONG_POLL_SECONDS). Each
+    held request occupies a server thread, so at most COMIC_LONG_POLL_MAX_WAITERS are held at once;
+    past that the request gets a 503 with Retry-After.
+    """
     try:
         # Get comic from in-memory store
         comic = ComicStore.get_comic(comic_id)
         if not comic:
             return Response({'error': 'Comic not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get scenes
+        # Reading a comic in progress counts as polling its job
+        job = jobs.get_job_for_comic(comic_id) if comic['status'] == 'pending' else None
+        if job is not None:
+            job.heartbeat()
+        
+        wait_for_scenes = request.query_params.get('wait_for_scenes')
+        if wait_for_scenes is not None:
+            max_wait = getattr(settings, 'COMIC_LONG_POLL_SECONDS', 25)
+            try:
+                count = int(wait_for_scenes)
+                timeout = min(float(request.query_params.get('timeout', max_wait)), max_wait)
+            except ValueError:
+                return Response({'error': 'wait_for_scenes must be an integer and timeout a number'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if timeout > 0:
+                if not _long_poll_slots().acquire(blocking=False):
+                    response = Response({'error': 'Too many long-polling requests, retry shortly'},
+                                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                    response['Retry-After'] = '1'
+                    return response
+                try:
+                    ComicStore.wait_for_scenes(comic_id, count, timeout)
+                finally:
+                    _long_poll_slots().release()
+        
+        # The representation depends on the requested sections (normalized to the comic's own headings)
+        # and the host of the absolute image URLs; only the sections are part of the cache key
+        sections = _requested_sections(request.query_params.get('sections'), comic.get('storyline_sections') or {})
+        variant = sections if isinstance(sections, str) or sections is None else '|'.join(sections)
+        base_url = request.build_absolute_uri('/').rstrip('/')
         scenes = ComicStore.get_scenes(comic_id)
+        _touch_panels(scenes)
+        version = _make_etag('comic', comic_id, comic['updated_at'], len(scenes), variant)
+        etag = _make_etag(version, base_url)
+        last_modified = datetime.fromisoformat(comic['updated_at']).timestamp()
         
-        # Format scene data
-        scene_data = []
-        for scene in scenes:
-            scene_data.append({
-                'scene_number': scene['scene_number'],
-                'prompt': scene['prompt'],
-                'image_url': request.build_absolute_uri(settings.MEDIA_URL + str(scene['image']))
-            })
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if not_modified is not None:
+            return _with_validators(not_modified, etag, last_modified)
         
-        # Format comic data
-        comic_data = {
-            'id': comic['_id'],
-            'title': comic['title'],
-            'storyline': comic['storyline'],
-            'status': comic['status'],
-            'scenes': scene_data,
-            'created_at': comic['created_at'],
-            'updated_at': comic['updated_at']
-        }
+        payload = ComicStore.get_cached_payload(comic_id, variant, version)
+        metrics.record_cache('comic_payload', payload is not None)
+        if payload is None:
+            payload = JSONRenderer().render(_build_comic_data(comic, scenes, sections, BASE_URL_PLACEHOLDER))
+            ComicStore.cache_payload(comic_id, variant, version, payload)
+        payload = payload.replace(BASE_URL_PLACEHOLDER.encode('ascii'), json.dumps(base_url)[1:-1].encode('utf-8'))
         
-        return Response(comic_data)
+        return _with_validators(HttpResponse(payload, content_type='application/json'), etag, last_modified)
         
     except Exception as e:
         logger.error(f"Error in api_get_comic: {str(e)}", exc_info=True)
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+def api_get_comic_pages(request, comic_id):
+    """API endpoint to get a comic as composed pages with panel coordinate maps"""
+    comic = ComicStore.get_comic(comic_id)
+    if not comic:
+        return Response({'error': 'Comic not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    layout = request.query_params.get('layout', 'grid')
+    if layout not in LAYOUTS:
+        return Response({'error': f"layout must be one of: {', '.join(LAYOUTS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        columns = int(request.query_params.get('columns', DEFAULT_COLUMNS[layout]))
+        rows = int(request.query_params.get('rows', DEFAULT_ROWS[layout]))
+    except ValueError:
+        return Response({'error': 'columns and rows must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    if not (1 <= columns <= 4 and 1 <= rows <= 15):
+        return Response({'error': 'columns must be 1-4 and rows 1-15'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    scenes = ComicStore.get_scenes(comic_id)
+    composer = get_composer()
+    etag = _make_etag('pages', comic_id, composer.key(scenes, layout, columns, rows),
+                      f"{request.scheme}://{request.get_host()}")
+    last_modified = datetime.fromisoformat(comic['updated_at']).timestamp()
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified)
+    
+    try:
+        composition = composer.compose(scenes, layout, columns, rows)
+    except Exception as e:
+        logger.error(f"Error composing pages for comic {comic_id}: {str(e)}", exc_info=True)
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    media_store = get_media_store()
+    pages = []
+    for page in composition['pages']:
+        media_store.touch(page['image'])
+        pages.append({
+            'page': page['page'],
+            'image_url': request.build_absolute_uri(settings.MEDIA_URL + page['image']),
+            'width': page['width'],
+            'height': page['height'],
+            'panels': [{key: panel[key] for key in ('scene_number', 'x', 'y', 'width', 'height')}
+                       for panel in page['panels']]
+        })
+    return _with_validators(Response({
+        'id': comic_id,
+        'layout': layout,
+        'columns': columns,
+        'rows': rows,
+        'reading_order': 'right-to-left' if layout == 'manga' else 'left-to-right',
+        'pages': pages
+    }), etag, last_modified)
+
+_long_poll_semaphore = None
+_long_poll_lock = threading.Lock()
+
+
+def _long_poll_slots():
+    """Process-wide semaphore bounding held long-polls to COMIC_LONG_POLL_MAX_WAITERS"""
+    global _long_poll_semaphore
+    with _long_poll_lock:
+        if _long_poll_semaphore is None:
+            _long_poll_semaphore = threading.BoundedSemaphore(getattr(settings, 'COMIC_LONG_POLL_MAX_WAITERS', 32))
+        return _long_poll_semaphore
+
+
+def _touch_panels(scenes):
+    """Mark a comic's panels as recently used so garbage collection evicts them last"""
+    media_store = get_media_store()
+    for scene in scenes:
+        media_store.touch(scene['image'])
+
+# Stands in for scheme://host in cached payloads, which are shared by every host the API is served on
+BASE_URL_PLACEHOLDER = '__COMIC_BASE_URL__'
+
+def _media_url(base_url, path):
+    """Absolute URL of a media file; MEDIA_URL may already be absolute (e.g. a CDN)"""
+    url = settings.MEDIA_URL + str(path)
+    return url if '://' in url else base_url + url
+
+def _requested_sections(requested, storyline_sections):
+    """
+    Normalize `?sections=`
+    
+    Returns:
+        None for the full storyline, 'none' to skip it, or the requested headings the comic has, in storyline order
+    """
+    if requested is None or requested == 'none':
+        return requested
+    wanted = {name.strip() for name in requested.split(',')}
+    return tuple(heading for heading in storyline_sections if heading in wanted)
+
+def _build_comic_data(comic, scenes, sections, base_url):
+    """Build the api_get_comic payload for a comic, with the sections from _requested_sections"""
+    # Format scene data
+    scene_data = []
+    for scene in scenes:
+        scene_data.append({
+            'scene_number': scene['scene_number'],
+            'prompt': scene['prompt'],
+            'image_url': _media_url(base_url, scene['image']),
+            'image_hash': scene.get('image_hash')
+        })
+    
+    # Format comic data
+    storyline_sections = comic.get('storyline_sections') or {}
+    comic_data = {
+        'id': comic['_id'],
+        'title': comic['title'],
+        'status': comic['status'],
+        'section_headings': list(storyline_sections),
+        'scenes': scene_data,
+        # Scenes still to come while the comic is pending (the requested count until prompts exist)
+        'expected_scenes': comic.get('expected_scenes', comic.get('num_scenes')),
+        'created_at': comic['created_at'],
+        'updated_at': comic['updated_at']
+    }
+    
+    # ?sections=Overview,Act 1: ... returns only those structured sections (and no raw storyline);
+    # ?sections=none skips the storyline entirely
+    if sections is None:
+        comic_data['storyline'] = comic['storyline']
+        comic_data['storyline_sections'] = _format_sections(storyline_sections)
+    elif sections != 'none':
+        comic_data['storyline_sections'] = _format_sections(
+            {heading: storyline_sections[heading] for heading in sections}
+        )
+    return comic_data
+
+def _make_etag(*parts):
+    """Strong ETag derived from the values that identify a representation"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:20]
+    return f'"{digest}"'
+
+def _with_validators(response, etag, last_modified):
+    """Attach ETag and Last-Modified to a response; clients must revalidate before reusing it"""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def _format_sections(storyline_sections):
+    """Serialize storyline sections as an ordered list for the JSON API"""
+    return [{'heading': heading, 'content': text.rstrip('\n')} for heading, text in storyline_sections.items()]
+
 @api_view(['POST'])
 def api_search_wikipedia(request):
     """API endpoint to search Wikipedia"""
@@ -461,3 +917,19 @@ def api_get_options(request):
     }
     
     return Response(options)
+
+@require_GET
+def api_autocomplete(request):
+    """Title completions for `?q=` from the local title index, most generated first"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 25)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    response = JsonResponse({'query': query, 'results': get_title_index().complete(query, limit)})
+    response['Cache-Control'] = 'max-age=60'
+    return response
+
+def metrics_endpoint(request):
+    """Prometheus scrape endpoint for the generation pipeline metrics of this process"""
+    return HttpResponse(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -33,20 +33,19 @@ const LandingPage = () => {
     setGlobalComicStyle(comicStyle);
   }, [comicStyle, setGlobalComicStyle]);
 
-  // Function to search Wikipedia
+  // Function to fetch title suggestions (served from the server's local title index)
   const handleSearch = async (searchTerm) => {
     try {
       setIsSearching(true);
-      const response = await axios.post(`${API_BASE_URL}/api/search/`, {
-        query: searchTerm
+      const response = await axios.get(`${API_BASE_URL}/api/autocomplete/`, {
+        params: { q: searchTerm }
       });
       
       if (response.data.results) {
         setSearchResults(response.data.results);
       }
     } catch (err) {
-      console.error('Search error:', err);
-      setError('Failed to search Wikipedia');
+      console.error('Autocomplete error:', err);
     } finally {
       setIsSearching(false);
     }
@@ -55,10 +54,12 @@ const LandingPage = () => {
   // Debounce search function
   useEffect(() => {
     const timeoutId = setTimeout(() => {
-      if (topic && topic.length >= 3) {
+      if (topic && topic.length >= 2) {
         handleSearch(topic);
+      } else {
+        setSearchResults([]);
       }
-    }, 500);
+    }, 150);
 
     return () => clearTimeout(timeoutId);
   }, [topic]);